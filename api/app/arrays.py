@@ -0,0 +1,35 @@
+import numpy as np
+
+
+class GrowableArray:
+    """Array that rows are appended to in amortised constant time.
+
+    Rows are written into spare capacity, which doubles whenever it runs out, instead of concatenating a new array
+    for every append. :attr:`array` is a view of the rows appended so far. Rows are never changed once appended, so a
+    view taken by a concurrent reader stays valid while more rows are added.
+    """
+
+    def __init__(self, initial: np.ndarray, min_capacity: int = 64):
+        # The initial rows are only copied once the first rows are appended, so e.g. a memory-mapped array stays
+        # mapped until then
+        self._data = initial
+        self._size = len(initial)
+        self.min_capacity = min_capacity
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._data[: self._size]
+
+    def extend(self, rows: np.ndarray):
+        rows = np.asarray(rows, dtype=self._data.dtype)
+        size = self._size + len(rows)
+        if size > len(self._data):
+            capacity = max(size, 2 * len(self._data), self.min_capacity)
+            data = np.empty((capacity,) + self._data.shape[1:], dtype=self._data.dtype)
+            data[: self._size] = self._data[: self._size]
+            self._data = data
+        self._data[self._size : size] = rows
+        self._size = size
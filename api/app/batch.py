@@ -0,0 +1,36 @@
+from typing import Any, Iterable, Optional, Union
+
+from app.metrics import weaviate_call
+from app.models import BATCH_CONCURRENCY
+
+
+def vector_input(vectors: Optional[Union[dict[str, list[float]], list[float]]]):
+    """Convert the ``vector`` entry of an exported object, a map from vector name to vector like in datastew's JSONL
+    files or a single vector, into the form Weaviate expects for insertion."""
+    if not vectors:
+        return None
+    if isinstance(vectors, dict) and set(vectors) == {"default"}:
+        return vectors["default"]
+    return vectors
+
+
+@weaviate_call("insert_batch")
+def insert_batch(
+    collection,
+    objects: Iterable[dict[str, Any]],
+    batch_size: Optional[int] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> list[tuple[str, str]]:
+    """Write objects through Weaviate's batcher and wait until all of them have been sent.
+
+    Each object is a dict of ``add_object`` arguments (``properties``, ``uuid``, ``references``, ``vector``). Without
+    a ``batch_size`` the dynamic batcher is used. Returns ``(uuid, error message)`` for every object that failed.
+    """
+    if batch_size is None:
+        batcher = collection.batch.dynamic()
+    else:
+        batcher = collection.batch.fixed_size(batch_size=batch_size, concurrent_requests=concurrency)
+    with batcher as batch:
+        for obj in objects:
+            batch.add_object(**obj)
+    return [(str(failed.object_.uuid), failed.message) for failed in collection.batch.failed_objects]
@@ -0,0 +1,186 @@
+import csv
+import io
+import time
+from typing import Optional, Sequence
+
+from datastew.repository.model import Concept, Mapping
+from weaviate.classes.query import Filter, QueryReference
+from weaviate.util import generate_uuid5
+
+from app.batch import insert_batch
+from app.models import BATCH_CONCURRENCY, EMBEDDING_BATCH_SIZE, WeaviateClient, vectorizer_registry
+
+# Upper bound for the number of concept IDs in a single ``contains_any`` filter
+CONCEPT_LOOKUP_SIZE = 1000
+
+
+def read_mapping_csv(
+    data: bytes, concept_id_field: str = "concept_id", text_field: str = "text"
+) -> list[tuple[str, str]]:
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    if not reader.fieldnames or not {concept_id_field, text_field} <= set(reader.fieldnames):
+        raise ValueError(f"Missing required column(s): '{concept_id_field}' and/or '{text_field}'.")
+    return [(row[concept_id_field], row[text_field]) for row in reader]
+
+
+def resolve_concepts(client: WeaviateClient, concept_ids: Sequence[str]) -> dict[str, tuple[str, dict]]:
+    """Look up concepts by their concept ID. Returns the UUID and a description of every concept that exists."""
+    collection = client.client.collections.get("Concept")
+    unique_ids = list(dict.fromkeys(concept_ids))
+    concepts = {}
+    for start in range(0, len(unique_ids), CONCEPT_LOOKUP_SIZE):
+        ids = unique_ids[start : start + CONCEPT_LOOKUP_SIZE]
+        response = collection.query.fetch_objects(
+            filters=Filter.by_property("conceptID").contains_any(ids),
+            return_properties=["conceptID", "prefLabel"],
+            return_references=QueryReference(link_on="hasTerminology", return_properties=["name"]),
+            limit=len(ids),
+        )
+        for obj in response.objects:
+            try:
+                terminology = obj.references["hasTerminology"].objects[0]
+                terminology = {"id": str(terminology.uuid), "name": str(terminology.properties["name"])}
+            except (KeyError, IndexError, TypeError, AttributeError):
+                terminology = {"id": None, "name": "unknown"}
+            concept_id = str(obj.properties["conceptID"])
+            concept = {"id": concept_id, "name": str(obj.properties["prefLabel"]), "terminology": terminology}
+            concepts[concept_id] = (str(obj.uuid), concept)
+    return concepts
+
+
+def existing_uuids(collection, uuids: Sequence[str]) -> set[str]:
+    """The UUIDs among ``uuids`` that are already stored in ``collection``."""
+    existing = set()
+    for start in range(0, len(uuids), CONCEPT_LOOKUP_SIZE):
+        chunk = list(uuids[start : start + CONCEPT_LOOKUP_SIZE])
+        response = collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(chunk), return_properties=[], limit=len(chunk)
+        )
+        existing.update(str(obj.uuid) for obj in response.objects)
+    return existing
+
+
+def mapping_uuid(text: str, model_name: Optional[str]) -> str:
+    """The UUID datastew's ``store`` gives the mapping of ``text``; ``model_name`` is ``None`` if Weaviate vectorizes
+    the text."""
+    properties = {"text": text}
+    if model_name is not None:
+        properties["hasSentenceEmbedder"] = model_name
+    return str(generate_uuid5(properties))
+
+
+def store_mapping(client: WeaviateClient, concept: Concept, text: str, model: str) -> Optional[Mapping]:
+    """Embed ``text`` and store it as a mapping of ``concept``, unless it already has a mapping for the model, which
+    datastew's ``store`` would skip silently. Returns the stored mapping, or ``None`` if it existed."""
+    model_name = None if client.use_weaviate_vectorizer else vectorizer_registry.get(model).model_name
+    if existing_uuids(client.client.collections.get("Mapping"), [mapping_uuid(text, model_name)]):
+        return None
+    if model_name is None:
+        mapping = Mapping(concept, text)
+    else:
+        mapping = Mapping(concept, text, list(vectorizer_registry.get(model).get_embedding(text)), model_name)
+    client.store(mapping)
+    return mapping
+
+
+def _check_items(
+    items: Sequence[tuple[str, str]], concepts: dict, model_name: Optional[str], results: list[dict]
+) -> tuple[dict[int, dict], dict[str, int]]:
+    """Validate the items and assign their mapping UUIDs, marking failed and repeated items in ``results``.
+
+    Returns the mapping properties per item and, per UUID, the first item that has it.
+    """
+    # Same UUID as datastew's ``store``, so that bulk and single writes of a mapping do not duplicate each other
+    properties, first = {}, {}
+    for index, (concept_id, text) in enumerate(items):
+        if concept_id not in concepts:
+            results[index].update(status="failed", error=f"Concept {concept_id} does not exist")
+        elif not text or not text.strip():
+            results[index].update(status="failed", error="Empty text")
+        else:
+            properties[index] = {"text": text}
+            if model_name is not None:
+                properties[index]["hasSentenceEmbedder"] = model_name
+            uuid = str(generate_uuid5(properties[index]))
+            results[index]["id"] = uuid
+            if uuid in first:
+                results[index].update(status="skipped", error=f"Same text as item {first[uuid]}")
+            else:
+                first[uuid] = index
+    return properties, first
+
+
+def _embed_texts(model: str, texts: list[str]) -> list[list[float]]:
+    embedding_model = vectorizer_registry.get(model)
+    embeddings = []
+    for offset in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        batch = embedding_model.get_embeddings(texts[offset : offset + EMBEDDING_BATCH_SIZE])
+        embeddings.extend(list(embedding) for embedding in batch)
+    return embeddings
+
+
+def create_mappings_bulk(
+    client: WeaviateClient,
+    items: Sequence[tuple[str, str]],
+    model: str,
+    batch_size: Optional[int] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    on_stored=None,
+) -> dict:
+    """Create mappings for many ``(concept_id, text)`` pairs at once.
+
+    Concepts are resolved with batched lookups, texts are embedded in batches of ``EMBEDDING_BATCH_SIZE`` and the
+    mappings are written through the Weaviate batcher. Like datastew's ``store``, a text that already has a mapping
+    for the model is skipped rather than re-pointed to another concept, and so are repeated texts of the request.
+    ``on_stored(model_name, embeddings, texts, concepts)`` is called once with all mappings written; model name and
+    embeddings are ``None`` if Weaviate vectorizes the texts. Returns a status per item, in request order.
+    """
+    start = time.perf_counter()
+    collection = client.client.collections.get("Mapping")
+    concepts = resolve_concepts(client, [concept_id for concept_id, _ in items])
+    model_name = None if client.use_weaviate_vectorizer else vectorizer_registry.get(model).model_name
+    results = [{"concept_id": concept_id, "text": text, "status": "created"} for concept_id, text in items]
+    properties, first = _check_items(items, concepts, model_name, results)
+    existing = existing_uuids(collection, list(first))
+    for uuid in existing:
+        results[first[uuid]].update(status="skipped", error="A mapping for this text and model already exists")
+    valid = [index for uuid, index in first.items() if uuid not in existing]
+
+    embeddings: list = [None] * len(valid)
+    if model_name is not None and valid:
+        embeddings = _embed_texts(model, [items[index][1] for index in valid])
+
+    objects = [
+        {
+            "properties": properties[index],
+            "uuid": results[index]["id"],
+            "references": {"hasConcept": concepts[items[index][0]][0]},
+            "vector": embedding,
+        }
+        for index, embedding in zip(valid, embeddings)
+    ]
+    failed = insert_batch(collection, objects, batch_size, concurrency)
+    for uuid, message in failed:
+        results[first[uuid]].update(status="failed", error=message)
+
+    stored = [
+        (index, embedding) for index, embedding in zip(valid, embeddings) if results[index]["status"] == "created"
+    ]
+    if on_stored is not None and stored:
+        on_stored(
+            model_name,
+            [embedding for _, embedding in stored],
+            [items[index][1] for index, _ in stored],
+            [concepts[items[index][0]][1] for index, _ in stored],
+        )
+
+    elapsed = time.perf_counter() - start
+    counts = {status: sum(result["status"] == status for result in results) for status in ("created", "skipped")}
+    return {
+        "created": counts["created"],
+        "skipped": counts["skipped"],
+        "failed": len(results) - counts["created"] - counts["skipped"],
+        "elapsed": elapsed,
+        "throughput": counts["created"] / elapsed if elapsed > 0 else 0.0,
+        "results": results,
+    }
@@ -0,0 +1,71 @@
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from anyio import CapacityLimiter, to_thread
+
+from app.models import CONCURRENCY_LIMITS
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_limiters: dict[str, CapacityLimiter] = {}
+
+
+def get_limiter(name: str) -> CapacityLimiter:
+    # Created lazily because a CapacityLimiter has to be bound to the running event loop.
+    if name not in _limiters:
+        _limiters[name] = CapacityLimiter(CONCURRENCY_LIMITS.get(name, CONCURRENCY_LIMITS["default"]))
+    return _limiters[name]
+
+
+async def run_blocking(func: Callable[..., T], *args, limiter: str = "default", **kwargs) -> T:
+    """Run a blocking Weaviate, embedding or parsing call in a worker thread.
+
+    Every endpoint group gets its own :class:`CapacityLimiter`, so that e.g. a few large dictionary uploads cannot
+    occupy all worker threads while cheap metadata requests are waiting.
+    """
+    return await to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=get_limiter(limiter))
+
+
+def ordered_map(executor: Executor, func: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[R]:
+    """Lazy, bounded counterpart of ``executor.map``.
+
+    Keeps up to ``window`` calls in flight and yields their results in the order of ``items``, which are only consumed
+    as results are taken. Chaining several of these connects the stages of a pipeline with bounded buffers.
+    """
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # The consumer stopped early or a call failed
+        for future in pending:
+            future.cancel()
+
+
+class RateLimiter:
+    """Spaces out work so that on average no more than ``rate`` units per second are acquired, shared by all threads.
+    A rate of 0 disables the limit."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units: float = 1):
+        if self.rate <= 0 or units <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + units / self.rate
+        if start > now:
+            time.sleep(start - now)
@@ -0,0 +1,186 @@
+"""Reads of whole collections with Weaviate's cursor API, for cursor-based pagination and streaming exports.
+
+Weaviate reads objects after a given UUID in UUID order at a constant cost per page, while offset pagination gets
+slower the deeper it goes and is capped by ``QUERY_MAXIMUM_RESULTS``. The cursor cannot be combined with filters, so
+filters are applied to the pages as they are read.
+"""
+
+import io
+from typing import Callable, Iterable, Iterator, Optional
+
+import orjson
+from datastew.repository.model import Concept, Mapping, Terminology
+from fastapi import Request
+from weaviate.classes.query import QueryReference
+
+from app.models import ObjectSchema
+
+AFTER_DESCRIPTION = (
+    "Return the objects following this UUID in UUID order, read with Weaviate's cursor instead of an offset. Pass an "
+    "empty value for the first page; the URL of the next page is sent in the Link header."
+)
+
+# Objects per JSONL chunk and rows per Parquet row group of an export
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_PROPERTIES = {
+    ObjectSchema.TERMINOLOGY: ["name"],
+    ObjectSchema.CONCEPT: ["conceptID", "prefLabel"],
+    ObjectSchema.MAPPING: ["text", "hasSentenceEmbedder"],
+}
+EXPORT_REFERENCES = {ObjectSchema.CONCEPT: "hasTerminology", ObjectSchema.MAPPING: "hasConcept"}
+
+_TERMINOLOGY_REFERENCE = QueryReference(link_on="hasTerminology", return_properties=["name"])
+CONCEPT_REFERENCES = _TERMINOLOGY_REFERENCE
+MAPPING_REFERENCES = QueryReference(
+    link_on="hasConcept", return_properties=["conceptID", "prefLabel"], return_references=_TERMINOLOGY_REFERENCE
+)
+
+
+def fetch_page(
+    collection, after: Optional[str], limit: int, keep: Optional[Callable] = None, **query
+) -> tuple[list, Optional[str]]:
+    """Up to ``limit`` objects after the UUID ``after`` that pass ``keep``, and the cursor of the next page, which is
+    ``None`` once the collection has been read to the end."""
+    objects = []
+    while True:
+        response = collection.query.fetch_objects(after=after or None, limit=limit, **query)
+        for obj in response.objects:
+            after = str(obj.uuid)
+            if keep is None or keep(obj):
+                objects.append(obj)
+                if len(objects) == limit:
+                    return objects, after
+        if len(response.objects) < limit:
+            return objects, None
+
+
+def next_page_link(request: Request, after: str) -> str:
+    """``Link`` header value pointing to the page after ``after``."""
+    return f'<{request.url.include_query_params(after=after)}>; rel="next"'
+
+
+def _reference(obj, name: str):
+    try:
+        return obj.references[name].objects[0]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def terminology_name(obj, object_type: ObjectSchema) -> Optional[str]:
+    """Name of the terminology an object belongs to, read from the references returned with it."""
+    if object_type == ObjectSchema.MAPPING:
+        obj = _reference(obj, "hasConcept")
+    if obj is not None and object_type != ObjectSchema.TERMINOLOGY:
+        obj = _reference(obj, "hasTerminology")
+    return str(obj.properties["name"]) if obj is not None else None
+
+
+def to_concept(obj) -> Concept:
+    terminology = _reference(obj, "hasTerminology")
+    return Concept(
+        Terminology(str(terminology.properties["name"]), str(terminology.uuid)) if terminology else None,
+        str(obj.properties["prefLabel"]),
+        str(obj.properties["conceptID"]),
+        str(obj.uuid),
+    )
+
+
+def to_mapping(obj, use_weaviate_vectorizer: bool) -> Mapping:
+    """The datastew mapping of an object read with :data:`MAPPING_REFERENCES`, as returned by ``get_mappings``."""
+    concept = _reference(obj, "hasConcept")
+    return Mapping(
+        to_concept(concept) if concept is not None else None,
+        str(obj.properties["text"]),
+        next(iter((obj.vector or {}).values()), None),
+        None if use_weaviate_vectorizer else str(obj.properties["hasSentenceEmbedder"]),
+        str(obj.uuid),
+    )
+
+
+def export_records(objects: Iterable, object_type: ObjectSchema) -> Iterator[dict]:
+    """Objects in the JSONL structure of datastew, which the JSONL import reads."""
+    collection_name = object_type.value.capitalize()
+    reference = EXPORT_REFERENCES.get(object_type)
+    for obj in objects:
+        record = {"class": collection_name, "id": str(obj.uuid), "properties": obj.properties}
+        if reference is not None:
+            referenced = _reference(obj, reference)
+            record["references"] = {reference: str(referenced.uuid) if referenced is not None else None}
+        if obj.vector:
+            record["vector"] = obj.vector
+        yield record
+
+
+def _chunks(records: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_jsonl(records: Iterable[dict], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+    for chunk in _chunks(records, chunk_size):
+        yield b"".join(orjson.dumps(record, option=option) for record in chunk)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file whose content is taken out after every row group."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_parquet(
+    records: Iterable[dict], object_type: ObjectSchema, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Write records as a Parquet file with one row group per ``chunk_size`` objects, yielding the bytes of each row
+    group as soon as it is written. Properties and the reference become columns; vectors are a map from vector name
+    to vector."""
+    # pyarrow is only needed for exports and takes a while to import
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    reference = EXPORT_REFERENCES.get(object_type)
+    fields = [pa.field("id", pa.string())] + [pa.field(name, pa.string()) for name in EXPORT_PROPERTIES[object_type]]
+    if reference is not None:
+        fields.append(pa.field(reference, pa.string()))
+    if object_type == ObjectSchema.MAPPING:
+        fields.append(pa.field("vectors", pa.map_(pa.string(), pa.list_(pa.float32()))))
+    schema = pa.schema(fields)
+
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for chunk in _chunks(records, chunk_size):
+            columns = {"id": [record["id"] for record in chunk]}
+            for name in EXPORT_PROPERTIES[object_type]:
+                columns[name] = [record["properties"].get(name) for record in chunk]
+            if reference is not None:
+                columns[reference] = [record["references"][reference] for record in chunk]
+            if object_type == ObjectSchema.MAPPING:
+                columns["vectors"] = [list((record.get("vector") or {}).items()) for record in chunk]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.take()
+    yield sink.take()
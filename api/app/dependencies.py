@@ -1,10 +1,78 @@
-from app.models import WeaviateClient
+from typing import Optional, Sequence
 
+from app.jobs import JobStore
+from app.models import (
+    JOB_DB_PATH,
+    LEXICAL_INDEX_TERMINOLOGIES,
+    LOCAL_INDEX_DIR,
+    LOCAL_INDEX_TERMINOLOGIES,
+    METADATA_CACHE_TTL,
+    RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL,
+    VISUALIZATION_DIR,
+    VISUALIZATION_FIT_SAMPLE,
+    VISUALIZATION_MAX_POINTS,
+    WEAVIATE_POOL_SIZE,
+    WeaviateClient,
+)
+from app.lexical_index import LexicalIndexRegistry
+from app.local_index import LocalIndexRegistry
+from app.metadata_cache import MetadataCache
+from app.pool import WeaviateClientPool
+from app.projection import ProjectionService
+from app.result_cache import ResultCache
+
+client_pool = WeaviateClientPool(WeaviateClient, size=WEAVIATE_POOL_SIZE)
+job_store = JobStore(JOB_DB_PATH)
+metadata_cache = MetadataCache(METADATA_CACHE_TTL)
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+local_index = LocalIndexRegistry(LOCAL_INDEX_TERMINOLOGIES, LOCAL_INDEX_DIR)
+
+
+def load_terminologies():
+    with client_pool.connection() as client:
+        return client.get_all_terminologies()
+
+
+def terminology_names() -> list[str]:
+    """Names of the stored terminologies, from the metadata cache."""
+    terminologies, _ = metadata_cache.get_or_load("terminologies", load_terminologies)
+    return [terminology["name"] for terminology in terminologies]
 
-async def get_client():
-    with WeaviateClient() as client:
-        yield client
 
+lexical_index = LexicalIndexRegistry(LEXICAL_INDEX_TERMINOLOGIES, terminology_names)
+projection_service = ProjectionService(VISUALIZATION_DIR, VISUALIZATION_FIT_SAMPLE, VISUALIZATION_MAX_POINTS)
 
-def get_client_instance() -> WeaviateClient:
-    return WeaviateClient()
+
+def on_mapping_stored(model_name: Optional[str], embedding: Optional[list[float]], text: str, concept: dict):
+    """Keep the in-process views of the mappings in sync with a mapping written through the API. Model name and
+    embedding are ``None`` if the text was vectorized by Weaviate."""
+    on_mappings_stored(model_name, [embedding], [text], [concept])
+
+
+def on_mappings_stored(
+    model_name: Optional[str],
+    embeddings: Sequence[Optional[list[float]]],
+    texts: Sequence[str],
+    concepts: Sequence[dict],
+):
+    """Like :func:`on_mapping_stored` for many mappings of one model, which are added to the indexes in one go."""
+    for terminology in {concept["terminology"]["name"] for concept in concepts}:
+        result_cache.invalidate(terminology)
+    for text, concept in zip(texts, concepts):
+        lexical_index.add(text, concept)
+    embedded = [
+        (embedding, text, concept)
+        for embedding, text, concept in zip(embeddings, texts, concepts)
+        if embedding is not None
+    ]
+    if embedded:
+        vectors, texts, concepts = (list(column) for column in zip(*embedded))
+        terminologies = [concept["terminology"]["name"] for concept in concepts]
+        projection_service.add_many(model_name, vectors, texts, terminologies)
+        local_index.add_many(model_name, vectors, texts, concepts)
+
+
+def get_client():
+    with client_pool.connection() as client:
+        yield client
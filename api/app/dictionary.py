@@ -0,0 +1,80 @@
+import csv
+import io
+import itertools
+from typing import BinaryIO, Iterable, Iterator, Union
+
+from openpyxl import load_workbook
+
+# Maps user supplied extensions to constants (also breaks the CodeQL taint chain for file suffixes)
+SUPPORTED_EXTENSIONS = {
+    ".csv": ".csv",
+    ".tsv": ".tsv",
+    ".xlsx": ".xlsx",
+}
+
+Row = tuple[str, str]
+
+
+def _csv_rows(file: BinaryIO, delimiter: str) -> Iterator[list[str]]:
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text, delimiter=delimiter)
+    finally:
+        # Do not close the underlying file together with the wrapper
+        text.detach()
+
+
+def _xlsx_rows(file: BinaryIO) -> Iterator[tuple]:
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _project(rows: Iterable, variable_field: str, description_field: str) -> Iterator[Row]:
+    rows = iter(rows)
+    header = ["" if name is None else str(name) for name in next(rows, [])]
+    missing = [field for field in (variable_field, description_field) if field not in header]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+    variable_index, description_index = header.index(variable_field), header.index(description_field)
+    for row in rows:
+        description = row[description_index] if description_index < len(row) else None
+        if description is None or not str(description).strip():
+            continue
+        variable = row[variable_index] if variable_index < len(row) else None
+        yield "" if variable is None else str(variable), str(description)
+
+
+def iter_dictionary_rows(
+    data: Union[bytes, BinaryIO], file_extension: str, variable_field: str, description_field: str
+) -> Iterator[Row]:
+    """Stream the ``(variable, description)`` rows of a data dictionary.
+
+    CSV and TSV files are read with the csv module and XLSX files in openpyxl's read-only mode, so only the current
+    row is held in memory and only the variable and description columns are kept. ``data`` is either the file content
+    or a binary file object, e.g. the spooled file of an upload. Rows without a description are skipped. Raises a
+    ``ValueError`` if the extension is not supported or one of the columns is missing.
+    """
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file extension: {file_extension}")
+    file = io.BytesIO(data) if isinstance(data, bytes) else data
+    if SUPPORTED_EXTENSIONS[file_extension] == ".xlsx":
+        rows = _xlsx_rows(file)
+    else:
+        rows = _csv_rows(file, "\t" if SUPPORTED_EXTENSIONS[file_extension] == ".tsv" else ",")
+    return _project(rows, variable_field, description_field)
+
+
+def iter_dictionary_chunks(
+    data: Union[bytes, BinaryIO],
+    file_extension: str,
+    variable_field: str,
+    description_field: str,
+    chunk_size: int = 64,
+) -> Iterator[list[Row]]:
+    """Parse a data dictionary incrementally into chunks of ``(variable, description)`` rows."""
+    rows = iter_dictionary_rows(data, file_extension, variable_field, description_field)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        yield chunk
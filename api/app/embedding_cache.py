@@ -0,0 +1,217 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from datastew.embedding import Vectorizer
+
+Embedding = list[float]
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class MemoryEmbeddingStore:
+    """In-process LRU store of at most ``max_bytes``. Vectors are kept as packed float32 bytes, about an eighth of the
+    memory of a list of Python floats."""
+
+    # Approximate memory of an entry besides its vector: the key, the bytes object and the slot in the ordered dict
+    ENTRY_OVERHEAD = 250
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Embedding]:
+        blob = self._entries.get(key)
+        if blob is None:
+            return None
+        self._entries.move_to_end(key)
+        vector = array("f")
+        vector.frombytes(blob)
+        return vector.tolist()
+
+    def put(self, key: str, embedding: Embedding):
+        blob = array("f", embedding).tobytes()
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size_bytes -= len(previous) + self.ENTRY_OVERHEAD
+        self._entries[key] = blob
+        self.size_bytes += len(blob) + self.ENTRY_OVERHEAD
+        while self.size_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted) + self.ENTRY_OVERHEAD
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+
+class SQLiteEmbeddingStore:
+    """On-disk embedding store that survives restarts. Vectors are stored as packed float32 blobs. The connection is
+    used by one thread at a time."""
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._size = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, Embedding]:
+        found = {}
+        with self._lock:
+            for offset in range(0, len(keys), 500):
+                chunk = keys[offset : offset + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+                )
+        return found
+
+    def put_many(self, entries: dict[str, Embedding]):
+        now = time.time()
+        rows = [(key, array("f", embedding).tobytes(), now) for key, embedding in entries.items()]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._size += len(entries)
+            if self._size > self.max_size:
+                self._connection.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (self._size - int(self.max_size * 0.9),),
+                )
+                self._size = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM embeddings")
+            self._size = 0
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache keyed by (model name, normalized text).
+
+    Lookups go to an in-process LRU tier of ``memory_bytes`` first and fall back to an optional on-disk tier; disk
+    hits are promoted into memory. The disk tier is read and written outside the lock of the memory tier, so that
+    memory hits do not wait for disk I/O.
+    """
+
+    def __init__(self, memory_bytes: int = 128 * 1024**2, disk: Optional[SQLiteEmbeddingStore] = None):
+        self.memory = MemoryEmbeddingStore(memory_bytes)
+        self.disk = disk
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> list[Optional[Embedding]]:
+        keys = [cache_key(model, text) for text in texts]
+        with self._lock:
+            embeddings = [self.memory.get(key) for key in keys]
+        missing = [key for key, embedding in zip(keys, embeddings) if embedding is None]
+        found = self.disk.get_many(missing) if missing and self.disk is not None else {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if embeddings[i] is None and key in found:
+                    embeddings[i] = found[key]
+                    self.memory.put(key, found[key])
+            self.disk_hits += len(found)
+            hit_count = sum(embedding is not None for embedding in embeddings)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return embeddings
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Embedding]):
+        entries = {cache_key(model, text): list(embedding) for text, embedding in zip(texts, embeddings)}
+        with self._lock:
+            for key, embedding in entries.items():
+                self.memory.put(key, embedding)
+        if self.disk is not None:
+            self.disk.put_many(entries)
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_size": len(self.memory),
+                "memory_bytes": self.memory.size_bytes,
+                "disk_size": len(self.disk) if self.disk is not None else None,
+            }
+
+
+class CachedVectorizer:
+    """Drop-in replacement for :class:`Vectorizer` that serves repeated texts from an :class:`EmbeddingCache`."""
+
+    def __init__(self, vectorizer: Vectorizer, cache: EmbeddingCache):
+        self.vectorizer = vectorizer
+        self.cache = cache
+
+    @property
+    def model_name(self) -> str:
+        return self.vectorizer.model_name
+
+    def get_embedding(self, text: str) -> Embedding:
+        embedding = self.cache.get_many(self.model_name, [text])[0]
+        if embedding is None:
+            embedding = list(self.vectorizer.get_embedding(text))
+            self.cache.put_many(self.model_name, [text], [embedding])
+        return embedding
+
+    def get_embeddings(self, texts: Sequence[str], *args, **kwargs) -> list[Embedding]:
+        embeddings = self.cache.get_many(self.model_name, texts)
+        missing: dict[str, list[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(texts[i], []).append(i)
+        if missing:
+            missing_texts = list(missing)
+            computed = [list(e) for e in self.vectorizer.get_embeddings(missing_texts, *args, **kwargs)]
+            self.cache.put_many(self.model_name, missing_texts, computed)
+            for text, embedding in zip(missing_texts, computed):
+                for i in missing[text]:
+                    embeddings[i] = embedding
+        return embeddings
+
+    def __getattr__(self, name):
+        return getattr(self.vectorizer, name)
@@ -0,0 +1,295 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import Any, Optional
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# Columns added to the jobs table later on, which job databases created before them lack
+ADDED_COLUMNS = {
+    "skipped": "INTEGER NOT NULL DEFAULT 0",
+    "worker_host": "TEXT",
+    "worker_pid": "INTEGER",
+    "heartbeat_at": "REAL",
+}
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite-backed queue of import jobs shared between the API and the worker processes.
+
+    A job carries its parameters, progress counters and a JSON checkpoint from which an interrupted job resumes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                checkpoint TEXT,
+                fetched INTEGER NOT NULL DEFAULT 0,
+                embedded INTEGER NOT NULL DEFAULT 0,
+                written INTEGER NOT NULL DEFAULT 0,
+                skipped INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                total INTEGER,
+                error TEXT,
+                worker TEXT,
+                worker_host TEXT,
+                worker_pid INTEGER,
+                heartbeat_at REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            )
+            """
+        )
+        columns = {row["name"] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in columns:
+                try:
+                    self._connection.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+                except sqlite3.OperationalError:
+                    # Added by another process in the meantime
+                    pass
+        self._lock = threading.Lock()
+
+    def create(self, kind: str, params: dict[str, Any]) -> dict:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), JobStatus.QUEUED.value, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def updated_since(self, since: float) -> list[dict]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM jobs WHERE updated_at > ? ORDER BY updated_at", (since,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def list_kind(self, kind: str) -> list[dict]:
+        """All jobs of ``kind``, oldest first."""
+        with self._lock:
+            rows = self._connection.execute("SELECT * FROM jobs WHERE kind = ? ORDER BY created_at", (kind,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def list(self, limit: int = 50, offset: int = 0) -> list[dict]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count_by_status(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status.value: 0 for status in JobStatus}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """Atomically hand the oldest queued job to ``worker``, which is expected to be the calling process."""
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND cancel_requested = 0 ORDER BY created_at LIMIT 1",
+                    (JobStatus.QUEUED.value,),
+                ).fetchone()
+                if row:
+                    self._connection.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, worker_host = ?, worker_pid = ?, heartbeat_at = ?, "
+                        "started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ?",
+                        (JobStatus.RUNNING.value, worker, os.uname().nodename, os.getpid(), now, now, now, row["id"]),
+                    )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row else None
+
+    def update_progress(
+        self,
+        job_id: str,
+        fetched: int = 0,
+        embedded: int = 0,
+        written: int = 0,
+        skipped: int = 0,
+        failed: int = 0,
+        total: Optional[int] = None,
+        checkpoint: Optional[dict] = None,
+    ) -> bool:
+        """Add to the progress counters and optionally store a new checkpoint. Returns whether cancellation was
+        requested for the job."""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET fetched = fetched + ?, embedded = embedded + ?, written = written + ?, "
+                "skipped = skipped + ?, failed = failed + ?, total = COALESCE(?, total), "
+                "checkpoint = COALESCE(?, checkpoint), updated_at = ? WHERE id = ?",
+                (
+                    fetched,
+                    embedded,
+                    written,
+                    skipped,
+                    failed,
+                    total,
+                    json.dumps(checkpoint) if checkpoint is not None else None,
+                    time.time(),
+                    job_id,
+                ),
+            )
+            row = self._connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def heartbeat(self, job_id: str):
+        """Record that the worker of a running job is still alive."""
+        with self._lock:
+            self._connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def finish(self, job_id: str, status: JobStatus, error: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+                (status.value, error, now, now, job_id),
+            )
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?", (now, job_id)
+            )
+            # Queued jobs are never picked up again, so they can be cancelled right away
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (JobStatus.CANCELLED.value, now, job_id, JobStatus.QUEUED.value),
+            )
+        return self.get(job_id)
+
+    def resume(self, job_id: str) -> Optional[dict]:
+        """Queue a failed or cancelled job again; it continues from its last checkpoint."""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, cancel_requested = 0, error = NULL, finished_at = NULL, updated_at = ? "
+                "WHERE id = ? AND status IN (?, ?)",
+                (JobStatus.QUEUED.value, time.time(), job_id, JobStatus.FAILED.value, JobStatus.CANCELLED.value),
+            )
+        return self.get(job_id)
+
+    def requeue(self, job_id: str):
+        """Put a running job back into the queue, e.g. because its worker is shutting down."""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, worker_pid = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                (JobStatus.QUEUED.value, time.time(), job_id, JobStatus.RUNNING.value),
+            )
+
+    def requeue_stale(self, stale_after: float) -> int:
+        """Queue running jobs again whose worker process is gone, e.g. because it crashed.
+
+        A job is requeued once its worker has not sent a heartbeat for ``stale_after`` seconds and, if the worker ran
+        on this host, its process no longer exists. Jobs of live workers are never taken over, however long a single
+        step takes.
+        """
+        host = os.uname().nodename
+        with self._lock:
+            cutoff = time.time() - stale_after
+            rows = self._connection.execute(
+                "SELECT id, worker_host, worker_pid FROM jobs "
+                "WHERE status = ? AND COALESCE(heartbeat_at, updated_at) < ?",
+                (JobStatus.RUNNING.value, cutoff),
+            ).fetchall()
+            stale = [
+                row["id"]
+                for row in rows
+                if row["worker_host"] != host or row["worker_pid"] is None or not process_alive(row["worker_pid"])
+            ]
+            requeued = 0
+            for job_id in stale:
+                cursor = self._connection.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, worker_pid = NULL WHERE id = ? AND status = ? "
+                    "AND COALESCE(heartbeat_at, updated_at) < ?",
+                    (JobStatus.QUEUED.value, job_id, JobStatus.RUNNING.value, cutoff),
+                )
+                requeued += cursor.rowcount
+        return requeued
+
+    def close(self):
+        self._connection.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["checkpoint"] = json.loads(job["checkpoint"]) if job["checkpoint"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        started_at = job["started_at"]
+        elapsed = (job["finished_at"] or job["updated_at"]) - started_at if started_at else 0
+        job["throughput"] = job["written"] / elapsed if elapsed > 0 else 0.0
+        return job
+
+
+class JobProgress:
+    """Handle passed to a running job for reporting progress and checking for cancellation."""
+
+    def __init__(self, store: JobStore, job: dict):
+        self.store = store
+        self.job = job
+
+    @property
+    def params(self) -> dict:
+        return self.job["params"]
+
+    @property
+    def checkpoint(self) -> Optional[dict]:
+        return self.job["checkpoint"]
+
+    def update(self, **progress):
+        if self.store.update_progress(self.job["id"], **progress):
+            raise JobCancelled(self.job["id"])
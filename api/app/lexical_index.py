@@ -0,0 +1,242 @@
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+from weaviate.classes.query import QueryReference
+
+from app.embedding_cache import normalize_text
+from app.local_index import mapping_concept
+from app.models import WeaviateClient, logger
+
+_TOKEN = re.compile(r"\w+")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class LexicalIndex:
+    """Exact lookup and BM25 ranking over the mappings of one terminology.
+
+    Exact keys are the normalized mapping text, concept label and concept ID (with and without its prefix, e.g.
+    ``HP:0001250`` and ``0001250``). BM25 scores are computed over the tokens of the mapping texts. Documents are only
+    added, without a lock: a document is stored before any key or posting refers to it, so a concurrent search
+    either sees all it needs of a document or does not find it.
+    """
+
+    def __init__(self, documents: Iterable[dict] = ()):
+        self.documents: list[dict] = []
+        self._keys: set[tuple[str, str, str]] = set()
+        self._exact: dict[str, list[int]] = {}
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths: list[int] = []
+        self._total_length = 0
+        for document in documents:
+            self.add(document["text"], document["concept"])
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, text: str, concept: dict):
+        key = (concept["terminology"]["id"], concept["id"], text)
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        doc = len(self.documents)
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        self.documents.append({"concept": concept, "text": text})
+        self._lengths.append(length)
+        self._total_length += length
+        concept_id = str(concept["id"])
+        for exact_key in {text, concept["name"], concept_id, concept_id.rpartition(":")[2]}:
+            self._exact.setdefault(normalize_text(exact_key), []).append(doc)
+        for token, frequency in counts.items():
+            self._postings.setdefault(token, []).append((doc, frequency))
+
+    def exact(self, text: str, limit: int) -> list[dict]:
+        """Mappings whose text, concept label or concept ID equals ``text``, one per concept."""
+        results, concepts = [], set()
+        for doc in self._exact.get(normalize_text(text), ()):
+            document = self.documents[doc]
+            concept = (document["concept"]["terminology"]["id"], document["concept"]["id"])
+            if concept in concepts:
+                continue
+            concepts.add(concept)
+            results.append({**document, "similarity": 1.0})
+            if len(results) >= limit:
+                break
+        return results
+
+    def search(self, text: str, limit: int) -> list[tuple[dict, float]]:
+        """The ``limit`` best mappings by BM25 score.
+
+        Tokens that occur in more than a tenth of the mappings are skipped if the query has rarer tokens, as they
+        hardly change the ranking but their postings are long.
+        """
+        count = len(self._lengths)
+        if not count:
+            return []
+        average_length = self._total_length / count
+        postings = sorted((self._postings[token] for token in set(tokenize(text)) if token in self._postings), key=len)
+        scores: dict[int, float] = {}
+        for i, token_postings in enumerate(postings):
+            frequency = len(token_postings)
+            if i and frequency > count / 10:
+                break
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for doc, term_frequency in token_postings:
+                norm = term_frequency + K1 * (1 - B + B * self._lengths[doc] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * term_frequency * (K1 + 1) / norm
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self.documents[doc], score) for doc, score in top]
+
+
+class LexicalIndexRegistry:
+    """Lexical indexes of terminologies for the hybrid search mode.
+
+    Indexes of ``terminologies`` are built on startup. Any other terminology is built in the background the first
+    time it is requested; until it is ready, :meth:`get` returns ``None`` and the caller falls back to vector search.
+    Every build scans the whole Mapping collection, so requested names that ``known_terminologies`` does not return
+    are not built. Failed builds and unknown names are retried after ``retry_after`` seconds at the earliest, or once
+    all indexes are rebuilt after an import. Mappings added while a build runs are added to the new indexes too.
+    """
+
+    def __init__(
+        self,
+        terminologies: Iterable[str],
+        known_terminologies: Optional[Callable[[], Iterable[str]]] = None,
+        retry_after: float = 300,
+    ):
+        self.terminologies = set(terminologies)
+        self.known_terminologies = known_terminologies
+        self.retry_after = retry_after
+        self._indexes: dict[str, LexicalIndex] = {}
+        self._pending: set[str] = set()
+        self._failed: dict[str, float] = {}
+        # Terminologies being built and the mappings added to them meanwhile
+        self._building: set[str] = set()
+        self._added: list[tuple[str, dict]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[str] = None
+
+    @property
+    def building(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def get(self, terminology: str) -> Optional[LexicalIndex]:
+        index = self._indexes.get(terminology)
+        if index is None:
+            self.build_in_background([terminology])
+        return index
+
+    def status(self) -> dict:
+        with self._lock:
+            sizes = {terminology: len(index) for terminology, index in self._indexes.items()}
+        return {"building": self.building, "error": self.error, "indexes": sizes}
+
+    def add(self, text: str, concept: dict):
+        with self._lock:
+            terminology = concept["terminology"]["name"]
+            if terminology in self._building:
+                self._added.append((text, concept))
+            index = self._indexes.get(terminology)
+            if index is not None:
+                index.add(text, concept)
+
+    def build(self, client: WeaviateClient, terminologies: Iterable[str]):
+        terminologies = set(terminologies)
+        with self._lock:
+            self._building = terminologies
+        try:
+            self._build(client, terminologies)
+        finally:
+            with self._lock:
+                self._building, self._added = set(), []
+
+    def _build(self, client: WeaviateClient, terminologies: set[str]):
+        indexes = {terminology: LexicalIndex() for terminology in terminologies}
+        objects = client.client.collections.get("Mapping").iterator(
+            return_properties=["text"],
+            return_references=QueryReference(
+                link_on="hasConcept",
+                return_properties=["conceptID", "prefLabel"],
+                return_references=QueryReference(link_on="hasTerminology", return_properties=["name"]),
+            ),
+        )
+        for obj in objects:
+            concept = mapping_concept(obj)
+            if concept is not None and concept["terminology"]["name"] in terminologies:
+                indexes[concept["terminology"]["name"]].add(str(obj.properties.get("text", "")), concept)
+        with self._lock:
+            # Mappings the scan may have missed; those it has read are skipped
+            for text, concept in self._added:
+                indexes[concept["terminology"]["name"]].add(text, concept)
+            self._indexes.update(indexes)
+
+    def build_in_background(self, terminologies: Optional[Iterable[str]] = None) -> bool:
+        """Queue a build of ``terminologies``, by default of all configured and already built ones. Returns False if
+        there is nothing to build."""
+        now = time.monotonic()
+        with self._lock:
+            if terminologies is None:
+                terminologies = self.terminologies | set(self._indexes)
+                self._failed.clear()
+            else:
+                terminologies = {
+                    terminology
+                    for terminology in terminologies
+                    if terminology not in self._indexes and now >= self._failed.get(terminology, 0)
+                }
+            terminologies -= self._pending
+            if not terminologies:
+                return False
+            self._pending |= terminologies
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_builds, name="lexical-index-build", daemon=True)
+                self._thread.start()
+        return True
+
+    def _run_builds(self):
+        while True:
+            with self._lock:
+                terminologies, self._pending = self._pending, set()
+                if not terminologies:
+                    self._thread = None
+                    return
+            try:
+                terminologies = self._existing(terminologies)
+                if terminologies:
+                    with WeaviateClient() as client:
+                        self.build(client, terminologies)
+                self.error = None
+            except Exception as e:
+                logger.error(f"Failed to build the lexical indexes of {sorted(terminologies)}: {e}")
+                self.error = str(e)
+                self._retry_later(terminologies)
+
+    def _existing(self, terminologies: set[str]) -> set[str]:
+        """The configured and stored terminologies among ``terminologies``."""
+        if self.known_terminologies is None:
+            return terminologies
+        existing = terminologies & (self.terminologies | set(self.known_terminologies()))
+        if existing != terminologies:
+            logger.info(f"Not building lexical indexes of unknown terminologies {sorted(terminologies - existing)}")
+            self._retry_later(terminologies - existing)
+        return existing
+
+    def _retry_later(self, terminologies: Iterable[str]):
+        now = time.monotonic()
+        with self._lock:
+            # Expired entries are dropped, so that requests with arbitrary names do not grow the dict without bound
+            self._failed = {terminology: until for terminology, until in self._failed.items() if until > now}
+            self._failed.update({terminology: now + self.retry_after for terminology in terminologies})
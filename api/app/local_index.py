@@ -0,0 +1,243 @@
+import json
+import os
+import re
+import threading
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from weaviate.classes.query import QueryReference
+
+from app.arrays import GrowableArray
+from app.models import WeaviateClient, logger
+from app.projection import mapping_vectors
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+def mapping_concept(obj) -> Optional[dict]:
+    try:
+        concept = obj.references["hasConcept"].objects[0]
+        terminology = concept.references["hasTerminology"].objects[0]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+    return {
+        "id": str(concept.properties["conceptID"]),
+        "name": str(concept.properties["prefLabel"]),
+        "terminology": {"id": str(terminology.uuid), "name": str(terminology.properties["name"])},
+    }
+
+
+class LocalIndex:
+    """Exact cosine similarity search over the mappings of one terminology and model.
+
+    The normalized vectors are kept as a float32 matrix, optionally memory-mapped from disk. Mappings added after the
+    matrix was built are appended to a small in-memory matrix that is searched alongside it.
+    """
+
+    def __init__(self, vectors: np.ndarray, rows: list[dict]):
+        self.vectors = vectors
+        self.rows = rows
+        self._extra = GrowableArray(np.empty((0, vectors.shape[1]), dtype=np.float32))
+        self.extra_rows: list[dict] = []
+        self._texts = {row["text"] for row in rows}
+
+    def __len__(self) -> int:
+        return len(self.rows) + len(self._extra)
+
+    @property
+    def extra(self) -> np.ndarray:
+        return self._extra.array
+
+    def add(self, vector: Sequence[float], text: str, concept: dict):
+        self.add_many([vector], [text], [concept])
+
+    def add_many(self, vectors: Sequence[Sequence[float]], texts: Sequence[str], concepts: Sequence[dict]):
+        # Mapping UUIDs are derived from text and model, so Weaviate keeps the first mapping stored for a text
+        new = []
+        for i, text in enumerate(texts):
+            if text not in self._texts:
+                self._texts.add(text)
+                new.append(i)
+        if not new:
+            return
+        # Rows are appended before the vectors, so that a concurrent search finds a row for every vector it sees
+        self.extra_rows.extend({"concept": concepts[i], "text": texts[i]} for i in new)
+        self._extra.extend(_normalize(np.asarray([vectors[i] for i in new], dtype=np.float32)))
+
+    def search(self, embedding: Sequence[float], limit: int) -> list[dict]:
+        query = _normalize(np.asarray([embedding], dtype=np.float32))[0]
+        extra, extra_rows = self.extra, self.extra_rows
+        scores = np.concatenate([self.vectors @ query, extra @ query])
+        k = min(limit, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        results = []
+        for i in top:
+            row = self.rows[i] if i < len(self.rows) else extra_rows[i - len(self.rows)]
+            results.append({**row, "similarity": float(scores[i])})
+        return results
+
+    def save(self, path: str):
+        # Write next to the old files and swap, as the old matrix may still be memory-mapped and searched
+        with open(f"{path}.npy.tmp", "wb") as file:
+            np.save(file, np.concatenate([self.vectors, self.extra]))
+        with open(f"{path}.json.tmp", "w") as file:
+            json.dump(self.rows + self.extra_rows, file)
+        os.replace(f"{path}.npy.tmp", f"{path}.npy")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LocalIndex":
+        vectors = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        with open(f"{path}.json") as file:
+            rows = json.load(file)
+        return cls(vectors, rows)
+
+
+class LocalIndexRegistry:
+    """In-process search indexes for a configured set of heavily queried terminologies, one per model.
+
+    Indexes are built in a background thread by streaming the Mapping collection once and, if a ``directory`` is
+    given, stored there and memory-mapped. Mappings added while a build runs are kept and added to the new indexes
+    once they replace the old ones. Searches for a terminology and model without a loaded index return ``None`` so
+    that the caller falls back to Weaviate.
+    """
+
+    def __init__(self, terminologies: Iterable[str], directory: Optional[str] = None):
+        self.terminologies = set(terminologies)
+        self.directory = directory
+        self._indexes: dict[tuple[str, str], LocalIndex] = {}
+        self._lock = threading.Lock()
+        # Mappings added during a build, None while no build is running
+        self._pending: Optional[list[tuple]] = None
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.terminologies)
+
+    @property
+    def building(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def get(self, terminology: str, model: str) -> Optional[LocalIndex]:
+        return self._indexes.get((terminology, model))
+
+    def status(self) -> dict:
+        with self._lock:
+            sizes = {f"{terminology}/{model}": len(index) for (terminology, model), index in self._indexes.items()}
+        return {"building": self.building, "error": self.error, "indexes": sizes}
+
+    def add(self, model: str, vector: Sequence[float], text: str, concept: dict):
+        self.add_many(model, [vector], [text], [concept])
+
+    def add_many(self, model: str, vectors: Sequence[Sequence[float]], texts: Sequence[str], concepts: Sequence[dict]):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((model, vectors, texts, concepts))
+            self._add_many(model, vectors, texts, concepts)
+
+    def _add_many(self, model: str, vectors: Sequence[Sequence[float]], texts: Sequence[str], concepts: Sequence[dict]):
+        by_terminology: dict[str, list[int]] = {}
+        for i, concept in enumerate(concepts):
+            by_terminology.setdefault(concept["terminology"]["name"], []).append(i)
+        for terminology, items in by_terminology.items():
+            index = self._indexes.get((terminology, model))
+            if index is not None and index.vectors.shape[1] == len(vectors[items[0]]):
+                index.add_many([vectors[i] for i in items], [texts[i] for i in items], [concepts[i] for i in items])
+
+    def _replace(self, indexes: dict[tuple[str, str], LocalIndex]):
+        with self._lock:
+            self._indexes = indexes
+            # Mappings the build may have missed; those it has read are skipped by their text
+            for pending in self._pending or []:
+                self._add_many(*pending)
+
+    def build(self, client: WeaviateClient):
+        with self._lock:
+            self._pending = []
+        try:
+            self._build(client)
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _build(self, client: WeaviateClient):
+        vectors: dict[tuple[str, str], list[Sequence[float]]] = {}
+        rows: dict[tuple[str, str], list[dict]] = {}
+        terminology_reference = QueryReference(link_on="hasTerminology", return_properties=["name"])
+        objects = client.client.collections.get("Mapping").iterator(
+            include_vector=True,
+            return_properties=["text", "hasSentenceEmbedder"],
+            return_references=QueryReference(
+                link_on="hasConcept",
+                return_properties=["conceptID", "prefLabel"],
+                return_references=terminology_reference,
+            ),
+        )
+        for obj in objects:
+            concept = mapping_concept(obj)
+            if concept is None or concept["terminology"]["name"] not in self.terminologies:
+                continue
+            for model, vector in mapping_vectors(obj):
+                key = (concept["terminology"]["name"], model)
+                vectors.setdefault(key, []).append(vector)
+                rows.setdefault(key, []).append({"concept": concept, "text": str(obj.properties.get("text", ""))})
+        self._replace(
+            {key: LocalIndex(_normalize(np.asarray(vectors[key], dtype=np.float32)), rows[key]) for key in rows}
+        )
+        if self.directory:
+            self.save()
+            self.load()
+
+    def build_in_background(self) -> bool:
+        """Start a build with a dedicated connection. Returns False if a build is already running."""
+        with self._lock:
+            if self.building or not self.enabled:
+                return False
+            self._thread = threading.Thread(target=self._run_build, name="local-index-build", daemon=True)
+            self._thread.start()
+        return True
+
+    def load(self) -> bool:
+        """Load the stored indexes from ``directory``. Returns False if none have been stored yet."""
+        if not self.directory or not os.path.exists(os.path.join(self.directory, "indexes.json")):
+            return False
+        with open(os.path.join(self.directory, "indexes.json")) as file:
+            names = json.load(file)
+        indexes = {
+            (entry["terminology"], entry["model"]): LocalIndex.load(os.path.join(self.directory, entry["name"]))
+            for entry in names
+            if entry["terminology"] in self.terminologies
+        }
+        self._replace(indexes)
+        return True
+
+    def save(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            entries = []
+            for terminology, model in self._indexes:
+                name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{terminology}__{model}")
+                self._indexes[(terminology, model)].save(os.path.join(self.directory, name))
+                entries.append({"terminology": terminology, "model": model, "name": name})
+            with open(os.path.join(self.directory, "indexes.json"), "w") as file:
+                json.dump(entries, file)
+
+    def _run_build(self):
+        try:
+            with WeaviateClient() as client:
+                self.build(client)
+            self.error = None
+        except Exception as e:
+            logger.error(f"Failed to build the local search indexes: {e}")
+            self.error = str(e)
@@ -1,14 +1,132 @@
+import asyncio
+import contextlib
+import time
+from contextlib import asynccontextmanager
+
+from app.dependencies import (
+    client_pool,
+    job_store,
+    lexical_index,
+    local_index,
+    metadata_cache,
+    projection_service,
+    result_cache,
+)
+from app.jobs import JobStatus
+from app.metrics import REQUEST_LATENCY, render_metrics, server_timing_header, start_server_timing
+from app.models import (
+    IMPORT_WORKERS,
+    JOB_POLL_INTERVAL,
+    VECTOR_STORAGE,
+    WARMUP_MODELS,
+    VectorStorage,
+    embedding_cache,
+    logger,
+    vectorizer_registry,
+)
 from app.routers import (
     concepts,
+    exports,
     imports,
     mappings,
     models,
     terminologies,
     visualization,
 )
-from fastapi import FastAPI
+from app.storage import configure_vector_storage
+from app.worker import start_workers, stop_workers
+from fastapi import FastAPI, Request
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse
+from starlette.responses import RedirectResponse, Response
+
+
+def invalidate_after_jobs(jobs: list[dict]):
+    """Invalidate the cached metadata and search results that the given import jobs may have changed."""
+    if any(job["written"] for job in jobs):
+        metadata_cache.clear()
+    for job in jobs:
+        if not job["written"]:
+            continue
+        if job["kind"] == "migration":
+            # Only mappings of the migrated model change, which is not listed before the migration completes
+            if job["status"] == JobStatus.COMPLETED.value:
+                result_cache.clear()
+        elif "terminology_name" in job["params"]:
+            result_cache.invalidate(job["params"]["terminology_name"])
+        else:
+            # JSONL imports may touch any terminology
+            result_cache.clear()
+
+
+async def watch_import_jobs(interval: float):
+    """Invalidate the cached metadata and search results whenever an import job running in a worker process has
+    written objects, and rebuild the local search and lexical indexes and the DB visualization once such a job has
+    completed."""
+    since = time.time()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            jobs = await asyncio.to_thread(job_store.updated_since, since)
+        except Exception as e:
+            logger.warning(f"Failed to poll import jobs: {e}")
+            continue
+        if jobs:
+            since = jobs[-1]["updated_at"]
+        invalidate_after_jobs(jobs)
+        if any(job["written"] and job["status"] == JobStatus.COMPLETED.value for job in jobs):
+            local_index.build_in_background()
+            lexical_index.build_in_background()
+            projection_service.rebuild_in_background()
+
+
+async def prepare_models_and_storage():
+    try:
+        await asyncio.to_thread(vectorizer_registry.warm, WARMUP_MODELS)
+    except Exception as e:
+        logger.warning(f"Failed to warm up vectorizers {WARMUP_MODELS}: {e}")
+    await asyncio.to_thread(client_pool.open)
+    try:
+        with client_pool.connection() as client:
+            await asyncio.to_thread(configure_vector_storage, client, VectorStorage(VECTOR_STORAGE))
+    except Exception as e:
+        logger.warning(f"Failed to configure the vector storage: {e}")
+
+
+async def load_or_build_indexes():
+    """Load the stored DB visualization and local search indexes, building them in the background if there are none."""
+    try:
+        await asyncio.to_thread(projection_service.load)
+    except Exception as e:
+        logger.warning(f"Failed to load the stored DB visualization: {e}")
+    if not projection_service.models():
+        projection_service.rebuild_in_background()
+    try:
+        loaded = await asyncio.to_thread(local_index.load)
+    except Exception as e:
+        logger.warning(f"Failed to load the stored local search indexes: {e}")
+        loaded = False
+    if not loaded:
+        local_index.build_in_background()
+    lexical_index.build_in_background()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await prepare_models_and_storage()
+    await load_or_build_indexes()
+    workers = start_workers(IMPORT_WORKERS)
+    job_watcher = asyncio.create_task(watch_import_jobs(JOB_POLL_INTERVAL))
+    yield
+    job_watcher.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await job_watcher
+    await asyncio.to_thread(stop_workers, workers)
+    await asyncio.to_thread(projection_service.save)
+    await asyncio.to_thread(local_index.save)
+    client_pool.close()
+    vectorizer_registry.clear()
+
 
 app = FastAPI(
     title="KITSUNE",
@@ -19,7 +137,7 @@ app = FastAPI(
     "suggestions with each iteration. Models for the computation as well as databases for storage are "
     "meant to be configurable and extendable to adapt the tool for specific use-cases.</div>"
     "<div id=db-plot><h1>Current DB state</h1>"
-    "<p>Showing 2D Visualization of DB entries up to a limit of 1000 entries</p>"
+    "<p>Showing a 2D projection of the stored mapping embeddings</p>"
     '<a href="/visualization">Click here to view visualization</a></div>',
     version="0.0.3",
     terms_of_service="https://www.scai.fraunhofer.de/",
@@ -39,20 +157,49 @@ app = FastAPI(
             }
         }
     },
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    timings = start_server_timing()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(request.method, route.path if route else "unmatched", response.status_code).observe(elapsed)
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    job_counts = await asyncio.to_thread(job_store.count_by_status)
+    content, media_type = await asyncio.to_thread(render_metrics, job_counts)
+    return Response(content, media_type=media_type)
+
+
 @app.get("/version", tags=["info"])
 def get_current_version():
     return app.version
 
 
+@app.get(
+    "/cache", tags=["info"], description="Statistics of the search result and embedding caches and the lexical indexes."
+)
+def get_cache_stats():
+    return {"results": result_cache.stats(), "embeddings": embedding_cache.stats(), "lexical": lexical_index.status()}
+
+
 app.include_router(visualization.router)
 app.include_router(models.router)
 app.include_router(terminologies.router)
 app.include_router(concepts.router)
 app.include_router(mappings.router)
 app.include_router(imports.router)
+app.include_router(exports.router)
 
 origins = ["*"]
 
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
+
+from app.concurrency import run_blocking
+
+
+class MetadataCache:
+    """TTL cache for cheap, frequently polled reads such as counts and terminology/model listings.
+
+    Values are stored JSON-encoded together with an ETag. Concurrent misses for the same key are collapsed into a
+    single load, so an expiring entry does not cause a burst of identical Weaviate queries. Every invalidation bumps
+    the key's generation; values loaded before an invalidation are returned to their caller but not stored.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, Any, str]] = {}
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._generations: dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def generation(self, key: str) -> tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> tuple[Any, str]:
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1], entry[2]
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1], entry[2]
+            generation = self.generation(key)
+            value = jsonable_encoder(loader())
+            etag = '"' + hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest() + '"'
+            with self._lock:
+                if (self._epoch, self._generations.get(key, 0)) == generation:
+                    self._entries[key] = (time.monotonic() + self.ttl, value, etag)
+            return value, etag
+
+    def invalidate(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    async def response(self, request: Request, key: str, loader: Callable[[], Any]) -> Response:
+        """Serve ``key`` with ETag and Cache-Control headers, answering matching conditional requests with a 304."""
+        value, etag = await run_blocking(self.get_or_load, key, loader)
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={int(self.ttl)}"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return ORJSONResponse(value, headers=headers)
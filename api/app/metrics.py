@@ -0,0 +1,93 @@
+import functools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+T = TypeVar("T")
+
+REQUEST_LATENCY = Histogram("kitsune_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+STAGE_LATENCY = Histogram(
+    "kitsune_stage_duration_seconds", "Time spent in a stage of the mapping and import code paths", ["stage"]
+)
+EMBEDDING_BATCH_SIZE_HIST = Histogram(
+    "kitsune_embedding_batch_size",
+    "Number of texts per call to an embedding model",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+EMBEDDING_LATENCY = Histogram("kitsune_embedding_duration_seconds", "Latency of embedding model calls", ["model"])
+WEAVIATE_LATENCY = Histogram("kitsune_weaviate_duration_seconds", "Latency of Weaviate calls", ["operation"])
+IMPORT_JOBS = Gauge("kitsune_import_jobs", "Import jobs by status", ["status"], multiprocess_mode="livemostrecent")
+
+# Stage timings of the current request, reported in its Server-Timing header
+_server_timings: ContextVar[Optional[dict[str, float]]] = ContextVar("server_timings", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of a request or import job."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(name).observe(elapsed)
+        timings = _server_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def timed(name: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """Call ``func`` as stage ``name``, e.g. in a worker thread through ``run_blocking(timed, "embed", ...)``."""
+    with stage(name):
+        return func(*args, **kwargs)
+
+
+def weaviate_call(operation: str):
+    """Decorator recording count and latency of a Weaviate operation."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with WEAVIATE_LATENCY.labels(operation).time():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_server_timing() -> dict[str, float]:
+    timings: dict[str, float] = {}
+    _server_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={duration * 1000:.1f}" for name, duration in timings.items()]
+    return ", ".join(entries + [f"total;dur={total * 1000:.1f}"])
+
+
+def render_metrics(job_counts: dict[str, int]) -> tuple[bytes, str]:
+    """Render all metrics in the Prometheus text format.
+
+    If ``PROMETHEUS_MULTIPROC_DIR`` is set, the metrics of the import worker processes are included.
+    """
+    for status, count in job_counts.items():
+        IMPORT_JOBS.labels(status).set(count)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,18 +1,82 @@
+import json
 import logging
 import os
 from enum import Enum
 from urllib.parse import urlparse
 
-from datastew.embedding import Vectorizer
 from datastew.repository import WeaviateRepository
 from dotenv import load_dotenv
 
+from app.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore
+from app.metrics import weaviate_call
+from app.vectorizers import VectorizerRegistry
+
 load_dotenv()
 
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
 MODEL_NAME = os.getenv("MODEL_NAME", "sentence-transformers/all-MiniLM")
 HUGGING_FACE_API_KEY = os.getenv("HF_KEY", None)
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+VECTORIZER_CACHE_SIZE = int(os.getenv("VECTORIZER_CACHE_SIZE", 4))
+# Coalescing of concurrent single-text embedding calls: window in seconds and maximum batch size, optionally per model
+# as JSON, e.g. EMBEDDING_COALESCING='{"nomic-embed-text": [0.01, 64]}'. A maximum batch size of 1 disables it.
+EMBEDDING_COALESCING = {
+    "default": (
+        float(os.getenv("EMBEDDING_COALESCE_WINDOW", 0.005)),
+        int(os.getenv("EMBEDDING_COALESCE_MAX_BATCH", 32)),
+    ),
+    **{model: tuple(config) for model, config in json.loads(os.getenv("EMBEDDING_COALESCING", "{}")).items()},
+}
+# Memory of the embedding cache per process in MB, e.g. about 40,000 embeddings of 768 dimensions with the default
+EMBEDDING_CACHE_MB = float(os.getenv("EMBEDDING_CACHE_MB", 128))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", None)
+EMBEDDING_CACHE_DISK_SIZE = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", 1_000_000))
+WEAVIATE_POOL_SIZE = int(os.getenv("WEAVIATE_POOL_SIZE", 4))
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", 8))
+CONCURRENCY_LIMITS = {
+    "default": int(os.getenv("DEFAULT_CONCURRENCY", 32)),
+    "search": int(os.getenv("SEARCH_ENDPOINT_CONCURRENCY", 16)),
+    "dictionary": int(os.getenv("DICTIONARY_CONCURRENCY", 4)),
+    "write": int(os.getenv("WRITE_CONCURRENCY", 8)),
+}
+DICTIONARY_BATCH_SIZE = int(os.getenv("DICTIONARY_BATCH_SIZE", 64))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 4))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", 600))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 30))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", 1))
+OLS_API_URL = os.getenv("OLS_API_URL", "https://www.ebi.ac.uk/ols4/api")
+OLS_PAGE_SIZE = int(os.getenv("OLS_PAGE_SIZE", 500))
+OLS_CACHE_DIR = os.getenv("OLS_CACHE_DIR", "ols_cache")
+OLS_FETCH_CONCURRENCY = int(os.getenv("OLS_FETCH_CONCURRENCY", 4))
+OLS_FETCH_RETRIES = int(os.getenv("OLS_FETCH_RETRIES", 3))
+OLS_EMBED_BATCH_SIZE = int(os.getenv("OLS_EMBED_BATCH_SIZE", 256))
+OLS_EMBED_WORKERS = int(os.getenv("OLS_EMBED_WORKERS", 2))
+MIGRATION_EMBED_BATCH_SIZE = int(os.getenv("MIGRATION_EMBED_BATCH_SIZE", 512))
+MIGRATION_EMBED_WORKERS = int(os.getenv("MIGRATION_EMBED_WORKERS", 2))
+MIGRATION_RATE_LIMIT = float(os.getenv("MIGRATION_RATE_LIMIT", 0))
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", "uploads")
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 2))
+JSONL_CHUNK_BATCHES = int(os.getenv("JSONL_CHUNK_BATCHES", 10))
+VISUALIZATION_DIR = os.getenv("VISUALIZATION_DIR", "visualization")
+VISUALIZATION_FIT_SAMPLE = int(os.getenv("VISUALIZATION_FIT_SAMPLE", 10_000))
+VISUALIZATION_MAX_POINTS = int(os.getenv("VISUALIZATION_MAX_POINTS", 500_000))
+# Points of a projection sent to the plot page, and the largest page of points served at once
+VISUALIZATION_PLOT_POINTS = int(os.getenv("VISUALIZATION_PLOT_POINTS", 50_000))
+VISUALIZATION_TILE_SIZE = int(os.getenv("VISUALIZATION_TILE_SIZE", 65_536))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 100_000))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 3600))
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", 30))
+LOCAL_INDEX_TERMINOLOGIES = [name for name in os.getenv("LOCAL_INDEX_TERMINOLOGIES", "").split(",") if name]
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", None)
+LEXICAL_INDEX_TERMINOLOGIES = [name for name in os.getenv("LEXICAL_INDEX_TERMINOLOGIES", "").split(",") if name]
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", 0.3))
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "full")
+VECTOR_RESCORE_LIMIT = int(os.getenv("VECTOR_RESCORE_LIMIT", 200))
+WARMUP_MODELS = [model for model in os.getenv("WARMUP_MODELS", "nomic-embed-text").split(",") if model]
 logger = logging.getLogger("uvicorn.info")
 
 parsed_weaviate_url = urlparse(WEAVIATE_URL)
@@ -24,6 +88,14 @@ if parsed_ollama_url.hostname == "localhost":
 else:
     modified_ollama_url = OLLAMA_URL
 
+embedding_cache = EmbeddingCache(
+    memory_bytes=int(EMBEDDING_CACHE_MB * 1024**2),
+    disk=SQLiteEmbeddingStore(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_DISK_SIZE) if EMBEDDING_CACHE_PATH else None,
+)
+vectorizer_registry = VectorizerRegistry(
+    OLLAMA_URL, max_size=VECTORIZER_CACHE_SIZE, cache=embedding_cache, coalescing=EMBEDDING_COALESCING
+)
+
 
 class ObjectSchema(Enum):
     TERMINOLOGY = "terminology"
@@ -31,18 +103,93 @@ class ObjectSchema(Enum):
     MAPPING = "mapping"
 
 
+class ExportFormat(str, Enum):
+    JSONL = "jsonl"
+    PARQUET = "parquet"
+
+
+class VectorStorage(str, Enum):
+    """Compression of the vectors in the Mapping collection's HNSW index.
+
+    ``pq``, ``bq`` and ``sq`` are Weaviate's product, binary and scalar quantization. Weaviate keeps the full
+    precision vectors on disk; for ``bq`` and ``sq`` the ``rescore_limit`` closest candidates of the compressed
+    search are rescored with them before the final top-k is returned.
+    """
+
+    FULL = "full"
+    PQ = "pq"
+    BQ = "bq"
+    SQ = "sq"
+
+
+class SearchMode(str, Enum):
+    """``vector`` ranks by embedding similarity only. ``hybrid`` answers exact label, text or concept ID matches from
+    the lexical index without embedding the query and reranks the other results by a weighted sum of vector
+    similarity and BM25 score."""
+
+    VECTOR = "vector"
+    HYBRID = "hybrid"
+
+
 class WeaviateClient(WeaviateRepository):
     def __init__(self):
         super().__init__(
             mode="remote",
             path=str(parsed_weaviate_url.hostname),
             port=parsed_weaviate_url.port if parsed_weaviate_url.port else 80,
-            vectorizer=Vectorizer(MODEL_NAME, api_key=HUGGING_FACE_API_KEY, host=modified_ollama_url),
+            vectorizer=vectorizer_registry.get(
+                MODEL_NAME, host=modified_ollama_url, api_key=HUGGING_FACE_API_KEY, cached=False
+            ),
         )
 
+    def is_ready(self) -> bool:
+        try:
+            return self.client.is_ready()
+        except Exception:
+            return False
+
+    @weaviate_call("get_closest_mappings")
+    def get_closest_mappings(self, *args, **kwargs):
+        return super().get_closest_mappings(*args, **kwargs)
+
+    @weaviate_call("get_concept")
+    def get_concept(self, *args, **kwargs):
+        return super().get_concept(*args, **kwargs)
+
+    @weaviate_call("get_concepts")
+    def get_concepts(self, *args, **kwargs):
+        return super().get_concepts(*args, **kwargs)
+
+    @weaviate_call("get_terminology")
+    def get_terminology(self, *args, **kwargs):
+        return super().get_terminology(*args, **kwargs)
+
+    @weaviate_call("get_all_terminologies")
+    def get_all_terminologies(self, *args, **kwargs):
+        return super().get_all_terminologies(*args, **kwargs)
+
+    @weaviate_call("get_all_sentence_embedders")
+    def get_all_sentence_embedders(self, *args, **kwargs):
+        return super().get_all_sentence_embedders(*args, **kwargs)
+
+    @weaviate_call("get_mappings")
+    def get_mappings(self, *args, **kwargs):
+        return super().get_mappings(*args, **kwargs)
+
+    @weaviate_call("store")
+    def store(self, *args, **kwargs):
+        return super().store(*args, **kwargs)
+
+    @weaviate_call("count")
+    def count(self, collection: str) -> int:
+        return self.client.collections.get(collection).aggregate.over_all(total_count=True).total_count
+
+    def close(self):
+        if self.client:
+            self.client.close()
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if self.client:
-            self.client.close()
+        self.close()
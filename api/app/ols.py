@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import httpx
+
+from app.concurrency import ordered_map
+from app.metrics import stage
+from app.models import (
+    OLS_API_URL,
+    OLS_CACHE_DIR,
+    OLS_FETCH_CONCURRENCY,
+    OLS_FETCH_RETRIES,
+    OLS_PAGE_SIZE,
+    logger,
+)
+
+# OLS ontology IDs such as ``hp`` or ``efo``; anything else could escape the cache directory or the OLS API path
+TERMINOLOGY_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+class OLSTermCache:
+    """Compressed on-disk cache of the raw terms of OLS terminologies.
+
+    Each page of ``/ontologies/{id}/terms`` is stored as ``<directory>/<id>/<page>.json.gz`` together with an
+    ``index.json`` holding the page count, so a terminology is downloaded once and can be imported again, e.g. with
+    another model, without refetching. Missing pages are fetched with ``concurrency`` parallel requests and written
+    atomically, so an interrupted download continues with the pages it does not have yet.
+    """
+
+    def __init__(
+        self,
+        directory: str = OLS_CACHE_DIR,
+        api_url: str = OLS_API_URL,
+        page_size: int = OLS_PAGE_SIZE,
+        concurrency: int = OLS_FETCH_CONCURRENCY,
+        retries: int = OLS_FETCH_RETRIES,
+    ):
+        self.directory = directory
+        self.api_url = api_url
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.retries = retries
+
+    def _path(self, terminology_id: str, name: str = "") -> str:
+        """Path of ``name`` in the cache directory of a terminology, which must be a direct subdirectory of the cache
+        directory, as :meth:`clear` deletes it."""
+        directory = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(directory, terminology_id))
+        if not TERMINOLOGY_ID_PATTERN.match(terminology_id) or os.path.dirname(path) != directory:
+            raise ValueError(f"Invalid terminology ID: {terminology_id!r}")
+        return os.path.join(path, name) if name else path
+
+    def _write(self, path: str, content: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as file:
+            file.write(content)
+        os.replace(file.name, path)
+
+    def info(self, terminology_id: str) -> Optional[dict]:
+        """Page count and number of terms of a cached terminology, ``None`` if it is not cached with the current page
+        size."""
+        try:
+            with open(self._path(terminology_id, "index.json")) as file:
+                info = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return info if info.get("page_size") == self.page_size else None
+
+    def read_page(self, terminology_id: str, page: int) -> Optional[list[dict]]:
+        try:
+            with gzip.open(self._path(terminology_id, f"{page}.json.gz"), "rb") as file:
+                return json.loads(file.read())
+        except (OSError, EOFError, ValueError):
+            return None
+
+    def clear(self, terminology_id: str):
+        shutil.rmtree(self._path(terminology_id), ignore_errors=True)
+
+    def fetch_page(self, http: httpx.Client, terminology_id: str, page: int) -> tuple[list[dict], dict]:
+        """Download a page of terms, store it in the cache and return its terms and OLS' page information."""
+        for attempt in range(self.retries + 1):
+            try:
+                with stage("import_fetch"):
+                    response = http.get(
+                        f"{self.api_url}/ontologies/{terminology_id}/terms",
+                        params={"page": page, "size": self.page_size},
+                    )
+                    response.raise_for_status()
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                if attempt == self.retries or (status is not None and status < 500 and status != 429):
+                    raise
+                logger.warning(f"Fetching page {page} of {terminology_id} failed ({e}), retrying")
+                time.sleep(2**attempt)
+        data = response.json()
+        terms = data.get("_embedded", {}).get("terms", [])
+        self._write(self._path(terminology_id, f"{page}.json.gz"), gzip.compress(json.dumps(terms).encode(), 6))
+        return terms, data["page"]
+
+    def load_index(self, http: httpx.Client, terminology_id: str, refresh: bool = False) -> dict:
+        """Page count and number of terms of a terminology, downloading its first page unless it is cached. With
+        ``refresh``, or if it was cached with another page size, the cached terms are dropped first."""
+        info = None if refresh else self.info(terminology_id)
+        if info is None:
+            self.clear(terminology_id)
+            _, page_info = self.fetch_page(http, terminology_id, 0)
+            info = {
+                "page_size": self.page_size,
+                "total_pages": page_info["totalPages"],
+                "total_elements": page_info["totalElements"],
+            }
+            self._write(self._path(terminology_id, "index.json"), json.dumps(info).encode())
+        return info
+
+    def iter_pages(
+        self, http: httpx.Client, terminology_id: str, total_pages: int, start: int = 0
+    ) -> Iterator[tuple[int, list[dict]]]:
+        """Yield ``(page, terms)`` from page ``start`` on, in order. Cached pages are read from disk, missing ones are
+        downloaded concurrently ahead of the consumer."""
+
+        def load(page: int) -> list[dict]:
+            terms = self.read_page(terminology_id, page)
+            return terms if terms is not None else self.fetch_page(http, terminology_id, page)[0]
+
+        pages = range(start, total_pages)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ols-fetch") as executor:
+            yield from zip(pages, ordered_map(executor, load, pages, self.concurrency))
@@ -0,0 +1,95 @@
+import asyncio
+import contextlib
+from typing import Awaitable, Callable, Iterator, Sequence
+
+from app.concurrency import run_blocking
+from app.dictionary import Row
+from app.metrics import timed
+from app.models import PIPELINE_QUEUE_SIZE, SearchMode, WeaviateClient
+from app.search import SearchBatch
+
+# Marks the end of the stream in the stage queues
+_DONE = object()
+
+
+async def _run_step(func: Callable, *args):
+    """Run a blocking step of a stage in a worker thread.
+
+    A cancelled coroutine does not stop its worker thread, so if the stage is cancelled, the step is still waited for
+    before the cancellation goes on. Otherwise the Weaviate client could be reused while a search is still running.
+    """
+    step = asyncio.ensure_future(run_blocking(func, *args, limiter="dictionary"))
+    try:
+        return await asyncio.shield(step)
+    except asyncio.CancelledError:
+        # The stage may be cancelled again while it waits, e.g. by the pipeline after one of the stages stopped
+        while not step.done():
+            with contextlib.suppress(asyncio.CancelledError):
+                await asyncio.wait({step})
+        raise
+
+
+async def _ignore_total(total: int):
+    pass
+
+
+async def stream_dictionary_mappings(
+    chunks: Iterator[list[Row]],
+    client: WeaviateClient,
+    embedding_models: dict,
+    terminology_names: Sequence[str],
+    limit: int,
+    emit: Callable[[list[Row], list[list[dict]]], Awaitable[None]],
+    mode: SearchMode = SearchMode.VECTOR,
+    on_parsed: Callable[[int], Awaitable[None]] = _ignore_total,
+):
+    """Map a data dictionary as a staged pipeline: parse -> embed -> search -> emit.
+
+    Each stage works on micro-batches of rows and runs concurrently with the others. Stages are connected by bounded
+    queues, so a slow consumer (e.g. the websocket client) applies backpressure all the way up to the parser and the
+    number of rows held in memory does not depend on the size of the dictionary. Rows with cached results skip the
+    embed and search stages, and repeated descriptions within a micro-batch are embedded once per model and searched
+    once per terminology and model. In hybrid mode, descriptions with an exact lexical match skip them as well.
+    The rows are counted as they are parsed and, once the parser is done, ``on_parsed`` is awaited with the total.
+    Cancelling the returned coroutine stops all stages once their running steps are done.
+    """
+    parsed: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    embedded: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    searched: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    async def parse():
+        total = 0
+        while (rows := await _run_step(timed, "parse", next, chunks, _DONE)) is not _DONE:
+            total += len(rows)
+            await parsed.put(rows)
+        await parsed.put(_DONE)
+        await on_parsed(total)
+
+    async def embed():
+        while (rows := await parsed.get()) is not _DONE:
+            batch = SearchBatch(
+                [description for _, description in rows], terminology_names, embedding_models, limit, mode
+            )
+            await _run_step(batch.embed)
+            await embedded.put((rows, batch))
+        await embedded.put(_DONE)
+
+    async def search():
+        while (item := await embedded.get()) is not _DONE:
+            rows, batch = item
+            await _run_step(batch.search, client)
+            await searched.put((rows, batch.merged()))
+        await searched.put(_DONE)
+
+    async def send():
+        while (item := await searched.get()) is not _DONE:
+            await emit(*item)
+
+    tasks = [asyncio.create_task(stage()) for stage in (parse, embed, search, send)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Wait for the cancelled stages, and so for their running steps, before the caller reuses the client
+        await asyncio.gather(*tasks, return_exceptions=True)
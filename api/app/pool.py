@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from app.models import WeaviateClient, logger
+
+
+class WeaviateClientPool:
+    """Bounded pool of long-lived Weaviate connections shared by all requests.
+
+    Connections are opened lazily up to ``size``, health-checked when they have been idle for longer than
+    ``health_check_interval`` seconds or after a request failed, and transparently replaced when the check fails.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], WeaviateClient] = WeaviateClient,
+        size: int = 4,
+        timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+    ):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle: queue.LifoQueue[tuple[WeaviateClient, float]] = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._closed = True
+        self._lock = threading.Lock()
+
+    def open(self):
+        self._closed = False
+        try:
+            self.release(self.acquire())
+        except Exception as e:
+            logger.warning(f"Could not connect to Weaviate on startup: {e}")
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(client)
+
+    def acquire(self) -> WeaviateClient:
+        if self._closed:
+            raise RuntimeError("Weaviate client pool is closed")
+        try:
+            client, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve():
+                return self._connect()
+            try:
+                client, last_used = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No Weaviate connection available after {self.timeout} seconds")
+        if time.monotonic() - last_used > self.health_check_interval and not client.is_ready():
+            logger.info("Replacing unhealthy Weaviate connection")
+            self._discard(client)
+            self._reserve(force=True)
+            return self._connect()
+        return client
+
+    def release(self, client: WeaviateClient, check_health: bool = False):
+        if self._closed or (check_health and not client.is_ready()):
+            self._discard(client)
+            return
+        self._idle.put_nowait((client, time.monotonic()))
+
+    @contextmanager
+    def connection(self) -> Iterator[WeaviateClient]:
+        client = self.acquire()
+        failed = False
+        try:
+            yield client
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(client, check_health=failed)
+
+    def _reserve(self, force: bool = False) -> bool:
+        with self._lock:
+            if force or self._created < self.size:
+                self._created += 1
+                return True
+            return False
+
+    def _connect(self) -> WeaviateClient:
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _discard(self, client: WeaviateClient):
+        with self._lock:
+            self._created -= 1
+        try:
+            client.close()
+        except Exception as e:
+            logger.debug(f"Error while closing Weaviate connection: {e}")
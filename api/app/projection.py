@@ -0,0 +1,286 @@
+import json
+import os
+import re
+import threading
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+from weaviate.classes.query import QueryReference
+
+from app.arrays import GrowableArray
+from app.models import WeaviateClient, logger
+
+
+class ModelProjection:
+    """2D PCA projection of all mappings embedded with one model.
+
+    Coordinates are kept as a compact float32 array; the fitted mean and components are kept as well, so that new
+    mappings can be projected without fitting again. New points are appended to spare capacity of the arrays. The
+    points can be a sample of the mappings, ``total`` is the number of mappings they stand for.
+    """
+
+    def __init__(
+        self,
+        mean: np.ndarray,
+        components: np.ndarray,
+        coords: np.ndarray,
+        terminology_index: np.ndarray,
+        terminologies: list[str],
+        texts: list[str],
+        total: Optional[int] = None,
+    ):
+        self.mean = mean
+        self.components = components
+        self._coords = GrowableArray(coords)
+        self._terminology_index = GrowableArray(terminology_index)
+        self.terminologies = terminologies
+        self.texts = texts
+        self.total = len(coords) if total is None else total
+
+    def __len__(self) -> int:
+        return len(self._coords)
+
+    @property
+    def coords(self) -> np.ndarray:
+        return self._coords.array
+
+    @property
+    def terminology_index(self) -> np.ndarray:
+        return self._terminology_index.array
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        return ((vectors - self.mean) @ self.components).astype(np.float32)
+
+    def add(self, vector: list[float], text: str, terminology: str):
+        self.add_many([vector], [text], [terminology])
+
+    def add_many(
+        self,
+        vectors: Sequence[list[float]],
+        texts: Sequence[str],
+        terminologies: Sequence[str],
+        max_points: Optional[int] = None,
+    ):
+        """Project and append new mappings. Beyond ``max_points`` points, mappings are only counted in ``total``,
+        like those the builder leaves out."""
+        self.total += len(vectors)
+        if max_points is not None:
+            room = max(max_points - len(self), 0)
+            vectors, texts, terminologies = vectors[:room], texts[:room], terminologies[:room]
+        if not len(vectors):
+            return
+        for terminology in terminologies:
+            if terminology not in self.terminologies:
+                self.terminologies.append(terminology)
+        # Coordinates are appended last, as readers take the number of points from them
+        self._terminology_index.extend([self.terminologies.index(terminology) for terminology in terminologies])
+        self.texts.extend(texts)
+        self._coords.extend(self.project(np.asarray(vectors, dtype=np.float32)))
+
+    def save(self, path: str):
+        np.savez(
+            f"{path}.npz",
+            mean=self.mean,
+            components=self.components,
+            coords=self.coords,
+            terminology_index=self.terminology_index,
+        )
+        with open(f"{path}.json", "w") as file:
+            json.dump({"terminologies": self.terminologies, "texts": self.texts, "total": self.total}, file)
+
+    @classmethod
+    def load(cls, path: str) -> "ModelProjection":
+        arrays = np.load(f"{path}.npz")
+        with open(f"{path}.json") as file:
+            meta = json.load(file)
+        return cls(
+            arrays["mean"],
+            arrays["components"],
+            arrays["coords"],
+            arrays["terminology_index"],
+            meta["terminologies"],
+            meta["texts"],
+            meta.get("total"),
+        )
+
+
+class _ProjectionBuilder:
+    # Mappings are iterated in UUID order, which is effectively random, so the first ``fit_sample`` vectors are a
+    # uniform sample to fit on and the first ``max_points`` a uniform sample to display.
+    def __init__(self, fit_sample: int, max_points: int, flush_size: int = 4096):
+        self.fit_sample = fit_sample
+        self.max_points = max_points
+        self.flush_size = flush_size
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.pending: list[list[float]] = []
+        self.coords: list[np.ndarray] = []
+        self.terminologies: dict[str, int] = {}
+        self.terminology_index: list[int] = []
+        self.texts: list[str] = []
+        self.total = 0
+
+    def add(self, vector: list[float], text: str, terminology: str):
+        self.total += 1
+        if len(self.texts) >= self.max_points:
+            return
+        self.texts.append(text)
+        self.terminology_index.append(self.terminologies.setdefault(terminology, len(self.terminologies)))
+        self.pending.append(vector)
+        if self.components is None and len(self.pending) >= self.fit_sample:
+            self._fit()
+        if self.components is not None and len(self.pending) >= self.flush_size:
+            self._flush()
+
+    def finish(self) -> ModelProjection:
+        if self.components is None:
+            self._fit()
+        self._flush()
+        return ModelProjection(
+            self.mean,
+            self.components,
+            np.concatenate(self.coords) if self.coords else np.empty((0, 2), dtype=np.float32),
+            np.asarray(self.terminology_index, dtype=np.uint16),
+            list(self.terminologies),
+            self.texts,
+            self.total,
+        )
+
+    def _fit(self):
+        vectors = np.asarray(self.pending, dtype=np.float32)
+        self.mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = np.zeros((vectors.shape[1], 2), dtype=np.float32)
+        self.components[:, : min(2, len(vt))] = vt[:2].T
+
+    def _flush(self):
+        if self.pending:
+            vectors = np.asarray(self.pending, dtype=np.float32)
+            self.coords.append(((vectors - self.mean) @ self.components).astype(np.float32))
+            self.pending = []
+
+
+def mapping_terminology(obj) -> str:
+    try:
+        concept = obj.references["hasConcept"].objects[0]
+        return concept.references["hasTerminology"].objects[0].properties["name"]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return "unknown"
+
+
+def mapping_vectors(obj) -> Iterator[tuple[str, list[float]]]:
+    vectors = obj.vector if isinstance(obj.vector, dict) else {"default": obj.vector}
+    for name, vector in vectors.items():
+        if not vector:
+            continue
+        # Unnamed vectors are labelled with the sentence embedder, named vectors carry the model in their name
+        yield (obj.properties.get("hasSentenceEmbedder") or name) if name == "default" else name, vector
+
+
+class ProjectionService:
+    """Computes and serves 2D projections of the mapping embeddings, one per model.
+
+    Projections are (re)built in a background thread by streaming the Mapping collection once, persisted as compact
+    array files in ``directory`` and extended incrementally when new mappings are stored through the API, up to
+    ``max_points`` points per model.
+    """
+
+    def __init__(self, directory: str, fit_sample: int = 10_000, max_points: int = 500_000):
+        self.directory = directory
+        self.fit_sample = fit_sample
+        self.max_points = max_points
+        self._projections: dict[str, ModelProjection] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stale = False
+        self.error: Optional[str] = None
+
+    @property
+    def building(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def models(self) -> list[str]:
+        with self._lock:
+            return sorted(self._projections)
+
+    def status(self) -> dict:
+        with self._lock:
+            points = {model: len(projection) for model, projection in self._projections.items()}
+        return {"building": self.building, "error": self.error, "points": points}
+
+    def get(self, model: str) -> Optional[ModelProjection]:
+        with self._lock:
+            return self._projections.get(model)
+
+    def load(self):
+        if not os.path.exists(os.path.join(self.directory, "models.json")):
+            return
+        with open(os.path.join(self.directory, "models.json")) as file:
+            models = json.load(file)
+        with self._lock:
+            for model, name in models.items():
+                self._projections[model] = ModelProjection.load(os.path.join(self.directory, name))
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            names = {model: re.sub(r"[^A-Za-z0-9_.-]", "_", model) for model in self._projections}
+            for model, projection in self._projections.items():
+                projection.save(os.path.join(self.directory, names[model]))
+            with open(os.path.join(self.directory, "models.json"), "w") as file:
+                json.dump(names, file)
+
+    def rebuild(self, client: WeaviateClient):
+        builders: dict[str, _ProjectionBuilder] = {}
+        collection = client.client.collections.get("Mapping")
+        terminology_reference = QueryReference(link_on="hasTerminology", return_properties=["name"])
+        objects = collection.iterator(
+            include_vector=True,
+            return_properties=["text", "hasSentenceEmbedder"],
+            return_references=QueryReference(
+                link_on="hasConcept", return_properties=["prefLabel"], return_references=terminology_reference
+            ),
+        )
+        for obj in objects:
+            terminology = mapping_terminology(obj)
+            for model, vector in mapping_vectors(obj):
+                builder = builders.setdefault(model, _ProjectionBuilder(self.fit_sample, self.max_points))
+                builder.add(vector, obj.properties.get("text", ""), terminology)
+        projections = {model: builder.finish() for model, builder in builders.items()}
+        with self._lock:
+            self._projections = projections
+        self.save()
+
+    def rebuild_in_background(self) -> bool:
+        """Start a rebuild with a dedicated connection. Returns False if a rebuild is already running, which then
+        runs once more so that it includes mappings written in the meantime."""
+        with self._lock:
+            if self.building:
+                self._stale = True
+                return False
+            self._thread = threading.Thread(target=self._run_rebuild, name="projection-rebuild", daemon=True)
+            self._thread.start()
+        return True
+
+    def add(self, model: str, vector: list[float], text: str, terminology: str):
+        self.add_many(model, [vector], [text], [terminology])
+
+    def add_many(self, model: str, vectors: Sequence[list[float]], texts: Sequence[str], terminologies: Sequence[str]):
+        with self._lock:
+            projection = self._projections.get(model)
+            if projection is not None and vectors and len(projection.mean) == len(vectors[0]):
+                projection.add_many(vectors, texts, terminologies, self.max_points)
+
+    def _run_rebuild(self):
+        try:
+            with WeaviateClient() as client:
+                while True:
+                    self.rebuild(client)
+                    with self._lock:
+                        if not self._stale:
+                            break
+                        self._stale = False
+            self.error = None
+        except Exception as e:
+            logger.error(f"Failed to build the DB visualization: {e}")
+            self.error = str(e)
@@ -0,0 +1,72 @@
+from typing import Iterable, Iterator
+
+import msgpack
+import orjson
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def iter_compact_records(rows: Iterable[dict]) -> Iterator[dict]:
+    """Convert dictionary mapping results into records that reference terminologies and concepts by index.
+
+    A ``terminology`` or ``concept`` record is yielded before the first ``row`` record that refers to it, so the
+    records can be consumed as a stream. Every mapping of a row becomes ``[concept index, text, similarity]``, followed
+    by the similarity per model if several models were searched.
+    """
+    terminologies: dict[str, int] = {}
+    concepts: dict[tuple[str, str], int] = {}
+    for row in rows:
+        mappings = []
+        for mapping in row["mappings"]:
+            concept, terminology = mapping["concept"], mapping["concept"]["terminology"]
+            terminology_index = terminologies.get(terminology["id"])
+            if terminology_index is None:
+                terminology_index = terminologies[terminology["id"]] = len(terminologies)
+                yield {"type": "terminology", "index": terminology_index, **terminology}
+            concept_index = concepts.get((terminology["id"], concept["id"]))
+            if concept_index is None:
+                concept_index = concepts[(terminology["id"], concept["id"])] = len(concepts)
+                yield {
+                    "type": "concept",
+                    "index": concept_index,
+                    "id": concept["id"],
+                    "name": concept["name"],
+                    "terminology": terminology_index,
+                }
+            compact = [concept_index, mapping["text"], mapping["similarity"]]
+            if "scores" in mapping:
+                compact.append(mapping["scores"])
+            mappings.append(compact)
+        yield {"type": "row", "variable": row["variable"], "description": row["description"], "mappings": mappings}
+
+
+def compact_mapping_results(rows: Iterable[dict]) -> dict:
+    """Dictionary mapping results with terminologies and concepts deduplicated into lookup tables."""
+    compact: dict[str, list] = {"terminologies": [], "concepts": [], "rows": []}
+    tables = {"terminology": "terminologies", "concept": "concepts", "row": "rows"}
+    for record in iter_compact_records(rows):
+        table = tables[record.pop("type")]
+        record.pop("index", None)
+        compact[table].append(record)
+    return compact
+
+
+def mapping_results_response(request: Request, rows: list[dict]) -> Response:
+    """Serialize dictionary mapping results in the format requested by the ``Accept`` header.
+
+    ``application/x-ndjson`` and ``application/msgpack`` select the compact formats of :func:`iter_compact_records`
+    and :func:`compact_mapping_results`; anything else gets the nested JSON list.
+    """
+    accept = request.headers.get("accept", "")
+    headers = {"Vary": "Accept"}
+    if NDJSON_MEDIA_TYPE in accept:
+        content = b"".join(orjson.dumps(record) + b"\n" for record in iter_compact_records(rows))
+        return Response(content, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        return Response(
+            msgpack.packb(compact_mapping_results(rows)), media_type=MSGPACK_MEDIA_TYPES[0], headers=headers
+        )
+    return ORJSONResponse(rows, headers=headers)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from app.embedding_cache import normalize_text
+
+Key = tuple[str, str, int, str]
+
+
+class ResultCache:
+    """LRU/TTL cache of closest-mapping results, keyed by terminology, model, limit and normalized query text.
+
+    Entries are tracked per terminology so that a write only invalidates the results of the terminology it touched.
+    Every invalidation bumps the terminology's generation; results computed before an invalidation are not stored.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Key, tuple[float, list[dict]]] = OrderedDict()
+        self._by_terminology: dict[str, set[Key]] = {}
+        self._generations: dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, terminology: str) -> tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations.get(terminology, 0)
+
+    def get_many(self, texts: Sequence[str], terminology: str, model: str, limit: int) -> list[Optional[list[dict]]]:
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            for text in texts:
+                key = (terminology, model, limit, normalize_text(text))
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    self._remove(key)
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    results.append(entry[1])
+        return results
+
+    def put_many(
+        self,
+        texts: Sequence[str],
+        terminology: str,
+        model: str,
+        limit: int,
+        results: Sequence[list[dict]],
+        generation: tuple[int, int],
+    ):
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if (self._epoch, self._generations.get(terminology, 0)) != generation:
+                return
+            for text, result in zip(texts, results):
+                key = (terminology, model, limit, normalize_text(text))
+                self._entries[key] = (expires, result)
+                self._entries.move_to_end(key)
+                self._by_terminology.setdefault(terminology, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, terminology: str) -> int:
+        with self._lock:
+            self._generations[terminology] = self._generations.get(terminology, 0) + 1
+            keys = self._by_terminology.pop(terminology, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._by_terminology.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "terminologies": {terminology: len(keys) for terminology, keys in self._by_terminology.items()},
+            }
+
+    def _remove(self, key: Key):
+        self._entries.pop(key, None)
+        keys = self._by_terminology.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_terminology[key[0]]
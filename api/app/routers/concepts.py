@@ -1,30 +1,56 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
-from datastew.embedding import Vectorizer
-from datastew.repository.model import Concept, Mapping
-from fastapi import APIRouter, Depends, HTTPException
+from datastew.repository.model import Concept
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
-from app.dependencies import get_client
-from app.models import OLLAMA_URL, WeaviateClient
+from app.bulk import store_mapping
+from app.concurrency import run_blocking
+from app.cursor import AFTER_DESCRIPTION, CONCEPT_REFERENCES, fetch_page, next_page_link, to_concept
+from app.dependencies import client_pool, get_client, metadata_cache, on_mapping_stored
+from app.models import WeaviateClient
+from app.search import concept_to_dict
 
-router = APIRouter(prefix="/concepts", tags=["concepts"], dependencies=[Depends(get_client)])
+router = APIRouter(prefix="/concepts", tags=["concepts"])
 
 
 @router.get("/")
-async def get_all_concepts(client: Annotated[WeaviateClient, Depends(get_client)], limit: int = 10, offset: int = 0):
-    return client.get_concepts(limit=limit, offset=offset).items
+async def get_all_concepts(
+    request: Request,
+    response: Response,
+    client: Annotated[WeaviateClient, Depends(get_client)],
+    limit: int = Query(10, gt=0),
+    offset: int = 0,
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
+):
+    if after is None:
+        concepts = await run_blocking(client.get_concepts, limit=limit, offset=offset)
+        return concepts.items
+    concepts, next_after = await run_blocking(_concepts_after, client, after, limit)
+    if next_after is not None:
+        response.headers["Link"] = next_page_link(request, next_after)
+    return concepts
+
+
+def _concepts_after(client: WeaviateClient, after: str, limit: int) -> tuple[list[Concept], Optional[str]]:
+    collection = client.client.collections.get("Concept")
+    objects, next_after = fetch_page(collection, after, limit, return_references=CONCEPT_REFERENCES)
+    return [to_concept(obj) for obj in objects], next_after
+
+
+def _count_concepts() -> int:
+    with client_pool.connection() as client:
+        return client.count("Concept")
 
 
 @router.get("/total-number")
-async def get_total_number_of_concepts(client: Annotated[WeaviateClient, Depends(get_client)]):
-    concept = client.client.collections.get("Concept")
-    return concept.aggregate.over_all(total_count=True).total_count
+async def get_total_number_of_concepts(request: Request):
+    return await metadata_cache.response(request, "concepts:total-number", _count_concepts)
 
 
 @router.get("/{id}")
 async def get_concept(id: str, client: Annotated[WeaviateClient, Depends(get_client)]):
     try:
-        concept = client.get_concept(id)
+        concept = await run_blocking(client.get_concept, id)
         return concept
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to get concept with id {id}: {str(e)}")
@@ -35,9 +61,10 @@ async def create_concept(
     id: str, concept_name: str, terminology_name: str, client: Annotated[WeaviateClient, Depends(get_client)]
 ):
     try:
-        terminology = client.get_terminology(terminology_name)
+        terminology = await run_blocking(client.get_terminology, terminology_name)
         concept = Concept(terminology, concept_name, id)
-        client.store(concept)
+        await run_blocking(client.store, concept, limiter="write")
+        metadata_cache.invalidate("concepts:total-number")
         return {"message": f"Concept {id} created successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create concept: {str(e)}")
@@ -53,17 +80,21 @@ async def create_concept_and_attach_mapping(
     model: str = "sentence-transformers/all-mpnet-base-v2",
 ):
     try:
-        terminology = client.get_terminology(terminology_name)
-        concept = Concept(terminology, concept_name, id)
-        client.store(concept)
-        if client.use_weaviate_vectorizer:
-            mapping = Mapping(concept, text)
-        else:
-            embedding_model = Vectorizer(model, host=OLLAMA_URL)
-            embedding = embedding_model.get_embedding(text)
-            model_name = embedding_model.model_name
-            mapping = Mapping(concept, text, list(embedding), model_name)
-        client.store(mapping)
+        await run_blocking(
+            _create_concept_and_attach_mapping, client, id, concept_name, terminology_name, text, model, limiter="write"
+        )
+        metadata_cache.invalidate("concepts:total-number", "mappings:total-number", "models")
         return {"message": f"Concept {id} created successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create concept: {str(e)}")
+
+
+def _create_concept_and_attach_mapping(
+    client: WeaviateClient, id: str, concept_name: str, terminology_name: str, text: str, model: str
+):
+    terminology = client.get_terminology(terminology_name)
+    concept = Concept(terminology, concept_name, id)
+    client.store(concept)
+    mapping = store_mapping(client, concept, text, model)
+    if mapping is not None:
+        on_mapping_stored(mapping.sentence_embedder, mapping.embedding, text, concept_to_dict(concept))
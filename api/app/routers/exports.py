@@ -0,0 +1,69 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from app.cursor import (
+    CONCEPT_REFERENCES,
+    MAPPING_REFERENCES,
+    export_records,
+    iter_jsonl,
+    iter_parquet,
+    terminology_name,
+)
+from app.dependencies import client_pool
+from app.models import ExportFormat, ObjectSchema
+from app.responses import NDJSON_MEDIA_TYPE
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+MEDIA_TYPES = {ExportFormat.JSONL: NDJSON_MEDIA_TYPE, ExportFormat.PARQUET: "application/vnd.apache.parquet"}
+
+
+def _export(
+    object_type: ObjectSchema,
+    export_format: ExportFormat,
+    terminology: Optional[str],
+    model: Optional[str],
+    include_vectors: bool,
+):
+    with client_pool.connection() as client:
+        include_vector = include_vectors and object_type == ObjectSchema.MAPPING
+        if include_vector and model and client.use_weaviate_vectorizer:
+            include_vector = [model.replace("-", "_").replace("/", "_")]
+        objects = client.client.collections.get(object_type.value.capitalize()).iterator(
+            include_vector=include_vector,
+            return_references={ObjectSchema.CONCEPT: CONCEPT_REFERENCES, ObjectSchema.MAPPING: MAPPING_REFERENCES}.get(
+                object_type
+            ),
+        )
+        if terminology is not None:
+            objects = (obj for obj in objects if terminology_name(obj, object_type) == terminology)
+        if model is not None and object_type == ObjectSchema.MAPPING and not client.use_weaviate_vectorizer:
+            objects = (obj for obj in objects if obj.properties.get("hasSentenceEmbedder") == model)
+        records = export_records(objects, object_type)
+        if export_format == ExportFormat.PARQUET:
+            yield from iter_parquet(records, object_type)
+        else:
+            yield from iter_jsonl(records)
+
+
+@router.get(
+    "/{object_type}",
+    description="Stream all terminologies, concepts or mappings, optionally of one terminology and model, as JSONL "
+    "in the structure read by PUT /imports/jsonl or as a Parquet file. Objects are read with Weaviate's cursor and "
+    "written as they arrive, so exports of any size take constant memory.",
+)
+def export_objects(
+    object_type: ObjectSchema,
+    format: ExportFormat = ExportFormat.JSONL,
+    terminology_name: Optional[str] = Query(None, description="Only export objects of this terminology"),
+    model: Optional[str] = Query(None, description="Only export mappings of this model"),
+    include_vectors: bool = Query(True, description="Include the vectors of mappings"),
+):
+    filename = f"{terminology_name or 'all'}-{object_type.value}.{format.value}"
+    return StreamingResponse(
+        _export(object_type, format, terminology_name, model, include_vectors),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
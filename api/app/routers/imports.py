@@ -1,42 +1,192 @@
-from app.dependencies import get_client
-from app.models import ObjectSchema
-from app.tasks.import_tasks import (
-    import_jsonl_task,
-    import_ols_terminology_task,
-    import_snomed_ct_task,
+import os
+import shutil
+import tempfile
+from typing import Annotated, Optional
+
+from app.concurrency import run_blocking
+from app.dependencies import get_client, job_store
+from app.models import (
+    BATCH_CONCURRENCY,
+    JOB_UPLOAD_DIR,
+    MIGRATION_EMBED_BATCH_SIZE,
+    MIGRATION_EMBED_WORKERS,
+    MIGRATION_RATE_LIMIT,
+    OLS_EMBED_BATCH_SIZE,
+    OLS_EMBED_WORKERS,
+    VECTOR_RESCORE_LIMIT,
+    ObjectSchema,
+    VectorStorage,
+    WeaviateClient,
 )
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
-from starlette.background import BackgroundTasks
+from app.ols import TERMINOLOGY_ID_PATTERN
+from app.routers.models import migrating_models
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+router = APIRouter(prefix="/imports", tags=["imports"])
+
+# Endpoints queueing an import check out a connection, so that imports are refused while Weaviate is unavailable. Job
+# status endpoints are polled and only read the job store, so they must not take connections from searches.
+WEAVIATE_DEPENDENCIES = [Depends(get_client)]
+
+STORAGE_DESCRIPTION = "Quantization of the Mapping collection's vector index, applied to the whole collection"
+RESCORE_DESCRIPTION = "Candidates rescored with full precision vectors for bq and sq storage"
+REFRESH_DESCRIPTION = "Download the terms from OLS again instead of importing them from the term cache"
+
 
-router = APIRouter(prefix="/imports", tags=["imports"], dependencies=[Depends(get_client)])
+def _ols_import_params(
+    refresh: bool = Query(False, description=REFRESH_DESCRIPTION),
+    embed_batch_size: int = Query(OLS_EMBED_BATCH_SIZE, gt=0, description="Terms per embedding request"),
+    embed_workers: int = Query(OLS_EMBED_WORKERS, gt=0, description="Concurrent embedding requests"),
+    batch_size: Optional[int] = Query(None, gt=0, description="Fixed batch size, dynamic batching if omitted"),
+    concurrency: int = Query(BATCH_CONCURRENCY, gt=0, description="Concurrent batch requests"),
+) -> dict:
+    return {
+        "refresh": refresh,
+        "embed_batch_size": embed_batch_size,
+        "embed_workers": embed_workers,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+    }
 
 
-@router.put("/terminology", description="Import a terminology from OLS.")
+@router.put(
+    "/terminology",
+    dependencies=WEAVIATE_DEPENDENCIES,
+    description="Import a terminology from OLS. The terms are cached on disk, so importing the terminology again, "
+    "e.g. with another model, does not download it again.",
+)
 async def import_terminology(
-    background_tasks: BackgroundTasks,
-    terminology_id: str,
+    terminology_id: str = Query(..., pattern=TERMINOLOGY_ID_PATTERN.pattern, description="ID of the ontology in OLS"),
     model: str = "sentence-transformers/all-mpnet-base-v2",
+    storage: VectorStorage = Query(VectorStorage.FULL, description=STORAGE_DESCRIPTION),
+    rescore_limit: int = Query(VECTOR_RESCORE_LIMIT, gt=0, description=RESCORE_DESCRIPTION),
+    ols_params: dict = Depends(_ols_import_params),
 ):
-    background_tasks.add_task(import_ols_terminology_task, terminology_id, model)
-    return {"message": "SNOMED CT import started in the background"}
+    params = {
+        "terminology_id": terminology_id,
+        "terminology_name": terminology_id,
+        "model": model,
+        "storage": storage.value,
+        "rescore_limit": rescore_limit,
+        **ols_params,
+    }
+    job = await run_blocking(job_store.create, "ols", params)
+    return {"message": f"Import of {terminology_id} has been queued", "job_id": job["id"]}
 
 
-@router.put("/terminology/snomed", description="Import whole SNOMED CT from OLS.")
+@router.put("/terminology/snomed", dependencies=WEAVIATE_DEPENDENCIES, description="Import whole SNOMED CT from OLS.")
 async def import_snomed_ct(
-    background_tasks: BackgroundTasks,
     model: str = "sentence-transformers/all-mpnet-base-v2",
+    storage: VectorStorage = Query(VectorStorage.FULL, description=STORAGE_DESCRIPTION),
+    rescore_limit: int = Query(VECTOR_RESCORE_LIMIT, gt=0, description=RESCORE_DESCRIPTION),
+    ols_params: dict = Depends(_ols_import_params),
 ):
-    background_tasks.add_task(import_snomed_ct_task, model)
-    return {"message": "SNOMED CT import started in the background"}
+    params = {
+        "terminology_id": "snomed",
+        "terminology_name": "SNOMED CT",
+        "model": model,
+        "storage": storage.value,
+        "rescore_limit": rescore_limit,
+        **ols_params,
+    }
+    job = await run_blocking(job_store.create, "ols", params)
+    return {"message": "SNOMED CT import has been queued", "job_id": job["id"]}
 
 
-@router.put("/jsonl", description="Import a JSONL file following the Weaviate schema")
+@router.put(
+    "/jsonl", dependencies=WEAVIATE_DEPENDENCIES, description="Import a JSONL file following the Weaviate schema"
+)
 async def import_jsonl(
-    background_tasks: BackgroundTasks,
     object_type: ObjectSchema,
     file: UploadFile,
+    batch_size: Optional[int] = Query(None, gt=0, description="Fixed batch size, dynamic batching if omitted"),
+    concurrency: int = Query(BATCH_CONCURRENCY, gt=0, description="Concurrent batch requests"),
+    storage: VectorStorage = Query(VectorStorage.FULL, description=STORAGE_DESCRIPTION),
+    rescore_limit: int = Query(VECTOR_RESCORE_LIMIT, gt=0, description=RESCORE_DESCRIPTION),
 ):
     if not file.filename or not file.filename.endswith(".jsonl"):
         raise HTTPException(status_code=400, detail="Invalid file type. Only JSONL files are accepted.")
-    background_tasks.add_task(import_jsonl_task, file.file.read(), object_type)
-    return {"message": "JSONL import started in the background"}
+    file_path = await run_blocking(_save_upload, file)
+    params = {
+        "file_path": file_path,
+        "object_type": object_type.value,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "storage": storage.value,
+        "rescore_limit": rescore_limit,
+    }
+    job = await run_blocking(job_store.create, "jsonl", params)
+    return {"message": "JSONL import has been queued", "job_id": job["id"]}
+
+
+@router.put(
+    "/migration",
+    description="Embed the texts of the stored mappings with another model. The model is not listed by /models "
+    "until the migration has completed.",
+)
+async def migrate_model(
+    model: str,
+    client: Annotated[WeaviateClient, Depends(get_client)],
+    source_model: Optional[str] = Query(None, description="Only embed the texts of this model's mappings"),
+    embed_batch_size: int = Query(MIGRATION_EMBED_BATCH_SIZE, gt=0, description="Texts per embedding request"),
+    embed_workers: int = Query(MIGRATION_EMBED_WORKERS, gt=0, description="Concurrent embedding requests"),
+    rate_limit: float = Query(MIGRATION_RATE_LIMIT, ge=0, description="Texts embedded per second, unlimited if 0"),
+    batch_size: Optional[int] = Query(None, gt=0, description="Fixed batch size, dynamic batching if omitted"),
+    concurrency: int = Query(BATCH_CONCURRENCY, gt=0, description="Concurrent batch requests"),
+):
+    if client.use_weaviate_vectorizer:
+        raise HTTPException(status_code=400, detail="Mappings vectorized by Weaviate cannot be migrated")
+    models = await run_blocking(client.get_all_sentence_embedders)
+    # A model that is already listed stays listed while the migration adds the missing mappings
+    listed = model in models and model not in await run_blocking(migrating_models)
+    params = {
+        "model": model,
+        "source_model": source_model,
+        "embed_batch_size": embed_batch_size,
+        "embed_workers": embed_workers,
+        "rate_limit": rate_limit,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "hide_model": not listed,
+    }
+    job = await run_blocking(job_store.create, "migration", params)
+    return {"message": f"Migration to {model} has been queued", "job_id": job["id"]}
+
+
+def _save_upload(file: UploadFile) -> str:
+    # Copy in chunks so that the upload is never held in memory as a whole
+    os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=JOB_UPLOAD_DIR, suffix=".jsonl", delete=False) as upload:
+        shutil.copyfileobj(file.file, upload, UPLOAD_CHUNK_SIZE)
+    return upload.name
+
+
+@router.get("/", description="List import jobs, most recent first.")
+async def get_import_jobs(limit: int = 50, offset: int = 0):
+    return await run_blocking(job_store.list, limit, offset)
+
+
+@router.get("/{job_id}", description="Get status and progress of an import job.")
+async def get_import_job(job_id: str):
+    job = await run_blocking(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import job {job_id} not found")
+    return job
+
+
+@router.delete("/{job_id}", description="Cancel an import job.")
+async def cancel_import_job(job_id: str):
+    job = await run_blocking(job_store.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import job {job_id} not found")
+    return job
+
+
+@router.post("/{job_id}/resume", description="Resume a failed or cancelled import job from its last checkpoint.")
+async def resume_import_job(job_id: str):
+    job = await run_blocking(job_store.resume, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import job {job_id} not found")
+    return job
@@ -1,10 +1,9 @@
+import asyncio
+import contextlib
 import json
 import os
-import tempfile
-from typing import Annotated
+from typing import Annotated, BinaryIO, Optional, Sequence, Union
 
-from datastew import DataDictionarySource
-from datastew.embedding import Vectorizer
 from datastew.repository.model import Mapping
 from fastapi import (
     APIRouter,
@@ -12,28 +11,72 @@ from fastapi import (
     File,
     Form,
     HTTPException,
+    Query,
+    Request,
+    Response,
     UploadFile,
     WebSocket,
     WebSocketDisconnect,
 )
+from pydantic import BaseModel
 
-from app.dependencies import get_client, get_client_instance
-from app.models import OLLAMA_URL, WeaviateClient
+from app.bulk import create_mappings_bulk, read_mapping_csv, store_mapping
+from app.concurrency import run_blocking
+from app.cursor import AFTER_DESCRIPTION, MAPPING_REFERENCES, fetch_page, next_page_link, to_mapping
+from app.dependencies import client_pool, get_client, metadata_cache, on_mapping_stored, on_mappings_stored
+from app.dictionary import iter_dictionary_chunks, iter_dictionary_rows
+from app.metrics import stage, timed
+from app.models import BATCH_CONCURRENCY, DICTIONARY_BATCH_SIZE, SearchMode, WeaviateClient, vectorizer_registry
+from app.pipeline import stream_dictionary_mappings
+from app.responses import mapping_results_response
+from app.search import cached_closest_mappings, concept_to_dict
 
-router = APIRouter(prefix="/mappings", tags=["mappings"], dependencies=[Depends(get_client)])
+router = APIRouter(prefix="/mappings", tags=["mappings"])
+
+
+class MappingItem(BaseModel):
+    concept_id: str
+    text: str
 
 
 @router.get("/")
 async def get_all_mappings(
+    request: Request,
+    response: Response,
     client: Annotated[WeaviateClient, Depends(get_client)],
     model: str = "nomic-embed-text",
-    limit: int = 10,
+    limit: int = Query(10, gt=0),
     offset: int = 0,
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
 ):
     if client.use_weaviate_vectorizer:
         model = model.replace("-", "_").replace("/", "_")
-    mappings = client.get_mappings(sentence_embedder=model, limit=limit, offset=offset)
-    return mappings.items
+    if after is None:
+        mappings = await run_blocking(client.get_mappings, sentence_embedder=model, limit=limit, offset=offset)
+        return mappings.items
+    mappings, next_after = await run_blocking(_mappings_after, client, model, after, limit)
+    if next_after is not None:
+        response.headers["Link"] = next_page_link(request, next_after)
+    return mappings
+
+
+def _mappings_after(client: WeaviateClient, model: str, after: str, limit: int) -> tuple[list[Mapping], Optional[str]]:
+    collection = client.client.collections.get("Mapping")
+    if client.use_weaviate_vectorizer:
+        # Every mapping has a named vector per model
+        objects, next_after = fetch_page(
+            collection, after, limit, include_vector=[model], return_references=MAPPING_REFERENCES
+        )
+    else:
+        objects, next_after = fetch_page(
+            collection,
+            after,
+            limit,
+            lambda obj: obj.properties.get("hasSentenceEmbedder") == model,
+            include_vector=True,
+            return_references=MAPPING_REFERENCES,
+        )
+    return [to_mapping(obj, client.use_weaviate_vectorizer) for obj in objects], next_after
 
 
 @router.put("/")
@@ -44,75 +87,152 @@ async def create_mapping(
     model: str = "nomic-embed-text",
 ):
     try:
-        concept = client.get_concept(concept_id)
-        if client.use_weaviate_vectorizer:
-            mapping = Mapping(concept, text)
-        else:
-            embedding_model = Vectorizer(model, host=OLLAMA_URL)
-            embedding = embedding_model.get_embedding(text)
-            model_name = embedding_model.model_name
-            mapping = Mapping(concept, text, list(embedding), model_name)
-        client.store(mapping)
+        if not await run_blocking(_create_mapping, client, concept_id, text, model, limiter="write"):
+            return {"message": "A mapping for this text and model already exists"}
+        metadata_cache.invalidate("mappings:total-number", "models")
         return {"message": "Mapping created successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create mapping: {str(e)}")
 
 
-@router.post("/")
+def _create_mapping(client: WeaviateClient, concept_id: str, text: str, model: str) -> bool:
+    concept = client.get_concept(concept_id)
+    mapping = store_mapping(client, concept, text, model)
+    if mapping is not None:
+        on_mapping_stored(mapping.sentence_embedder, mapping.embedding, text, concept_to_dict(concept))
+    return mapping is not None
+
+
+@router.post(
+    "/bulk",
+    description="Create mappings for a list of concept IDs and texts. Concepts are resolved and texts embedded in "
+    "batches, and the mappings are written through the Weaviate batch API. Returns a status per item.",
+)
+async def create_mappings(
+    items: list[MappingItem],
+    client: Annotated[WeaviateClient, Depends(get_client)],
+    model: str = "nomic-embed-text",
+    batch_size: Optional[int] = Query(None, gt=0, description="Fixed batch size, dynamic batching if omitted"),
+    concurrency: int = Query(BATCH_CONCURRENCY, gt=0, description="Concurrent batch requests"),
+):
+    return await _create_mappings_bulk(
+        client, [(item.concept_id, item.text) for item in items], model, batch_size, concurrency
+    )
+
+
+@router.post("/bulk/csv", description="Create mappings from a CSV file with a concept ID and a text column.")
+async def create_mappings_from_csv(
+    client: Annotated[WeaviateClient, Depends(get_client)],
+    file: UploadFile = File(...),
+    model: str = Form("nomic-embed-text"),
+    concept_id_field: str = Form("concept_id"),
+    text_field: str = Form("text"),
+    batch_size: Optional[int] = Form(None, gt=0),
+    concurrency: int = Form(BATCH_CONCURRENCY, gt=0),
+):
+    try:
+        items = await run_blocking(read_mapping_csv, await file.read(), concept_id_field, text_field)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return await _create_mappings_bulk(client, items, model, batch_size, concurrency)
+
+
+async def _create_mappings_bulk(
+    client: WeaviateClient, items: list[tuple[str, str]], model: str, batch_size: Optional[int], concurrency: int
+) -> dict:
+    try:
+        result = await run_blocking(
+            create_mappings_bulk,
+            client,
+            items,
+            model,
+            batch_size,
+            concurrency,
+            on_mappings_stored,
+            limiter="write",
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to create mappings: {str(e)}")
+    if result["created"]:
+        metadata_cache.invalidate("mappings:total-number", "models")
+    return result
+
+
+def _embedding_models(client: WeaviateClient, models: Sequence[str]) -> dict:
+    """Vectorizers of the requested models, keyed by the name their mappings are stored under."""
+    embedding_models = {}
+    for model in dict.fromkeys(models):
+        name = model.replace("-", "_").replace("/", "_") if client.use_weaviate_vectorizer else model
+        embedding_models[name] = vectorizer_registry.get(model)
+    return embedding_models
+
+
+def _as_list(value: Union[str, list[str]]) -> list[str]:
+    return list(dict.fromkeys([value] if isinstance(value, str) else value))
+
+
+@router.post(
+    "/",
+    description="Get the closest mappings for a text. Repeat `terminology_name` and `model` to search several "
+    "terminologies with several models at once; the mappings are then merged, with the similarity per model in "
+    "`scores` and up to `limit` mappings per terminology.",
+)
 async def get_closest_mappings_for_text(
     client: Annotated[WeaviateClient, Depends(get_client)],
     text: str = Form(...),
-    terminology_name: str = Form("OHDSI"),
-    model: str = Form("nomic-embed-text"),
+    terminology_name: list[str] = Form(["OHDSI"]),
+    model: list[str] = Form(["nomic-embed-text"]),
     limit: int = Form(5),
+    mode: SearchMode = Form(SearchMode.VECTOR),
 ):
     try:
-        embedding_model = Vectorizer(model, host=OLLAMA_URL)
-        embedding = embedding_model.get_embedding(text)
-        if client.use_weaviate_vectorizer:
-            model = model.replace("-", "_").replace("/", "_")
-        closest_mappings = client.get_closest_mappings(embedding, True, terminology_name, model, limit)
-        mappings = []
-        for mapping_result in closest_mappings:
-            concept = mapping_result.mapping.concept
-            terminology = concept.terminology
-            mappings.append(
-                {
-                    "concept": {
-                        "id": concept.concept_identifier,
-                        "name": concept.pref_label,
-                        "terminology": {"id": terminology.id, "name": terminology.name},
-                    },
-                    "text": mapping_result.mapping.text,
-                    "similarity": mapping_result.similarity,
-                }
-            )
-
-        return mappings
+        return await run_blocking(
+            _closest_mappings_for_text, client, text, terminology_name, model, limit, mode, limiter="search"
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to get closest mappings: {str(e)}")
 
 
+def _closest_mappings_for_text(
+    client: WeaviateClient,
+    text: str,
+    terminology_names: list[str],
+    models: list[str],
+    limit: int,
+    mode: SearchMode,
+):
+    embedding_models = _embedding_models(client, models)
+    return cached_closest_mappings(client, embedding_models, [text], _as_list(terminology_names), limit, mode)[0]
+
+
+def _count_mappings() -> int:
+    with client_pool.connection() as client:
+        return client.count("Mapping")
+
+
 @router.get("/total-number")
-async def get_total_number_of_mappings(client: Annotated[WeaviateClient, Depends(get_client)]):
-    mapping = client.client.collections.get("Mapping")
-    return mapping.aggregate.over_all(total_count=True).total_count
+async def get_total_number_of_mappings(request: Request):
+    return await metadata_cache.response(request, "mappings:total-number", _count_mappings)
 
 
-@router.post("/dict", description="Get mappings for a data dictionary source.")
+@router.post(
+    "/dict",
+    description="Get mappings for a data dictionary source. Repeat `terminology_name` and `model` to map the "
+    "dictionary against several terminologies with several models in one pass. Send `Accept: application/x-ndjson` "
+    "or `Accept: application/msgpack` for a compact response with concepts and terminologies in lookup tables.",
+)
 async def get_closest_mappings_for_dictionary(
+    request: Request,
     client: Annotated[WeaviateClient, Depends(get_client)],
     file: UploadFile = File(...),
-    model: str = Form("nomic-embed-text"),
-    terminology_name: str = Form("OHDSI"),
+    model: list[str] = Form(["nomic-embed-text"]),
+    terminology_name: list[str] = Form(["OHDSI"]),
     variable_field: str = Form("variable"),
     description_field: str = Form("description"),
     limit: int = Form(1),
+    mode: SearchMode = Form(SearchMode.VECTOR),
 ):
     try:
-        embedding_model = Vectorizer(model, host=OLLAMA_URL)
-        if client.use_weaviate_vectorizer:
-            model = model.replace("-", "_").replace("/", "_")
         if not file or not file.filename:
             raise HTTPException(status_code=400, detail="No file was provided. Please upload a valid file.")
 
@@ -121,130 +241,114 @@ async def get_closest_mappings_for_dictionary(
         if not file_extension:
             raise HTTPException(status_code=400, detail="The uploaded file must have a valid extension.")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp_file:
-            tmp_file.write(await file.read())
-            tmp_file_path = tmp_file.name
-
-        # Initialize DataDictionarySource
-        data_dict_source = DataDictionarySource(tmp_file_path, variable_field, description_field)
-        df = data_dict_source.to_dataframe()
-
-        # Collect descriptions and their corresponding variables
-        descriptions = df["description"].to_list()
-        variables = df["variable"].to_list()
-
-        # Generate embeddings for all descriptions in batches
-        embeddings = embedding_model.get_embeddings(descriptions)
-
-        # Process embeddings to get closest mappings
-        response = []
-        for variable, description, embedding in zip(variables, descriptions, embeddings):
-            closest_mappings = client.get_closest_mappings(embedding, True, terminology_name, model, limit)
-            mappings_list = [
-                {
-                    "concept": {
-                        "id": mapping_result.mapping.concept.concept_identifier,
-                        "name": mapping_result.mapping.concept.pref_label,
-                        "terminology": {
-                            "id": mapping_result.mapping.concept.terminology.id,
-                            "name": mapping_result.mapping.concept.terminology.name,
-                        },
-                    },
-                    "text": mapping_result.mapping.text,
-                    "similarity": mapping_result.similarity,
-                }
-                for mapping_result in closest_mappings
-            ]
-
-            response.append({"variable": variable, "description": description, "mappings": mappings_list})
-
-        # Clean up temporary file
-        os.remove(tmp_file_path)
-
-        return response
+        # Parse the spooled upload in place instead of copying it to a temporary file first
+        results = await run_blocking(
+            _closest_mappings_for_dictionary,
+            client,
+            file.file,
+            file_extension,
+            model,
+            terminology_name,
+            variable_field,
+            description_field,
+            limit,
+            mode,
+            limiter="dictionary",
+        )
+        # Large responses take a while to encode, keep that off the event loop as well
+        return await run_blocking(timed, "serialize", mapping_results_response, request, results, limiter="dictionary")
     except ValueError:
         raise HTTPException(status_code=422, detail="Missing required column(s): 'description' and/or 'variable'.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _closest_mappings_for_dictionary(
+    client: WeaviateClient,
+    file: BinaryIO,
+    file_extension: str,
+    models: list[str],
+    terminology_names: list[str],
+    variable_field: str,
+    description_field: str,
+    limit: int,
+    mode: SearchMode,
+) -> list[dict]:
+    embedding_models = _embedding_models(client, models)
+
+    with stage("parse"):
+        rows = list(iter_dictionary_rows(file, file_extension, variable_field, description_field))
+    descriptions = [description for _, description in rows]
+
+    # Embed each distinct description without a cached result once per model and search it once per terminology and
+    # model, keeping the row order
+    results = cached_closest_mappings(client, embedding_models, descriptions, _as_list(terminology_names), limit, mode)
+    return [
+        {"variable": variable, "description": description, "mappings": mappings_list}
+        for (variable, description), mappings_list in zip(rows, results)
+    ]
+
+
 @router.websocket("/dict/ws")
 async def websocket_closest_mappings_for_dictionary(websocket: WebSocket):
     await websocket.accept()
+    client = None
     try:
         byte_file_data = await websocket.receive_bytes()
         meta = await websocket.receive_text()  # Metadata like model, terminology_name, etc.
 
         metadata = json.loads(meta)
-        model = metadata.get("model", "nomic-embed-text")
-        terminology_name = metadata.get("terminology_name", "OHDSI")
+        models = _as_list(metadata.get("model", "nomic-embed-text"))
+        terminology_names = _as_list(metadata.get("terminology_name", "OHDSI"))
         variable_field = metadata.get("variable_field", "variable")
         description_field = metadata.get("description_field", "description")
         limit = metadata.get("limit", 1)
         file_extension = metadata.get("file_extension", "").lower()
-
-        # Break CodeQL taint chain
-        extension_map = {
-            ".csv": ".csv",
-            ".tsv": ".tsv",
-            ".xlsx": ".xlsx",
-        }
-
-        if file_extension not in extension_map:
-            raise ValueError(f"Unsupported file extension: {file_extension}")
-
-        safe_suffix = extension_map[file_extension]
-
-        # Write file to temp
-        with tempfile.NamedTemporaryFile(delete=False, suffix=safe_suffix) as tmp_file:
-            tmp_file.write(byte_file_data)
-            tmp_file_path = tmp_file.name
-
-        # Load data and process
-        data_dict_source = DataDictionarySource(tmp_file_path, variable_field, description_field)
-        df = data_dict_source.to_dataframe()
-
-        await websocket.send_json({"type": "metadata", "expected_total": len(df)})
-
-        descriptions = df["variable"].to_list()
-        variables = df["description"].to_list()
+        mode = metadata.get("mode", SearchMode.VECTOR.value)
+        if mode not in [search_mode.value for search_mode in SearchMode]:
+            await websocket.send_json({"type": "error", "message": f"Unknown search mode: {mode}"})
+            await websocket.close()
+            return
+        mode = SearchMode(mode)
 
         # Get client (depends does not work directly in ws)
-        client = get_client_instance()
-
-        if client.use_weaviate_vectorizer:
-            model = model.replace("-", "_").replace("/", "_")
-
-        embedding_model = Vectorizer(model, host=OLLAMA_URL)
-        embeddings = embedding_model.get_embeddings(descriptions)
-
-        for variable, description, embedding in zip(variables, descriptions, embeddings):
-            closest_mappings = client.get_closest_mappings(embedding, True, terminology_name, model, limit)
-            mappings_list = [
-                {
-                    "concept": {
-                        "id": mapping_result.mapping.concept.concept_identifier,
-                        "name": mapping_result.mapping.concept.pref_label,
-                        "terminology": {
-                            "id": mapping_result.mapping.concept.terminology.id,
-                            "name": mapping_result.mapping.concept.terminology.name,
-                        },
-                    },
-                    "text": mapping_result.mapping.text,
-                    "similarity": mapping_result.similarity,
-                }
-                for mapping_result in closest_mappings
-            ]
-            await websocket.send_json(
-                {
-                    "type": "result",
-                    "variable": variable,
-                    "description": description,
-                    "mappings": mappings_list,
-                }
+        client = await run_blocking(client_pool.acquire)
+
+        embedding_models = _embedding_models(client, models)
+
+        async def send_results(rows, results):
+            for (variable, description), mappings_list in zip(rows, results):
+                await websocket.send_json(
+                    {
+                        "type": "result",
+                        "variable": variable,
+                        "description": description,
+                        "mappings": mappings_list,
+                    }
+                )
+
+        async def send_total(expected_total):
+            await websocket.send_json({"type": "metadata", "expected_total": expected_total})
+
+        chunks = iter_dictionary_chunks(
+            byte_file_data, file_extension, variable_field, description_field, DICTIONARY_BATCH_SIZE
+        )
+        pipeline = asyncio.create_task(
+            stream_dictionary_mappings(
+                chunks, client, embedding_models, terminology_names, limit, send_results, mode, on_parsed=send_total
             )
+        )
+        # The client does not send anything after the metadata, so a completed receive means it went away.
+        disconnect = asyncio.create_task(websocket.receive())
+        await asyncio.wait({pipeline, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if not pipeline.done():
+            pipeline.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await pipeline
+            raise WebSocketDisconnect()
+        disconnect.cancel()
+        pipeline.result()
 
-        os.remove(tmp_file_path)
         await websocket.close()
 
     except WebSocketDisconnect:
@@ -258,5 +362,5 @@ async def websocket_closest_mappings_for_dictionary(websocket: WebSocket):
         await websocket.send_json({"type": "error", "message": str(e)})
         await websocket.close()
     finally:
-        if tmp_file_path and os.path.exists(tmp_file_path):
-            os.remove(tmp_file_path)
+        if client:
+            client_pool.release(client)
@@ -1,14 +1,27 @@
-from typing import Annotated
+from app.dependencies import client_pool, job_store, metadata_cache
+from app.jobs import JobStatus
+from fastapi import APIRouter, Request
 
-from app.dependencies import get_client
-from app.models import WeaviateClient
-from fastapi import APIRouter, Depends
+router = APIRouter(prefix="/models", tags=["models"])
 
-router = APIRouter(prefix="/models", tags=["models"], dependencies=[Depends(get_client)])
+
+def migrating_models() -> set[str]:
+    """Models whose latest migration job has not completed yet and that were not listed before it started."""
+    latest = {job["params"]["model"]: job for job in job_store.list_kind("migration")}
+    return {
+        model
+        for model, job in latest.items()
+        if job["params"].get("hide_model", True) and job["status"] != JobStatus.COMPLETED.value
+    }
+
+
+def _load_models():
+    with client_pool.connection() as client:
+        vectorizers = client.get_all_sentence_embedders()
+    hidden = migrating_models()
+    return [v.replace("_", '-') for v in vectorizers if v not in hidden]
 
 
 @router.get("/")
-async def get_all_models(client: Annotated[WeaviateClient, Depends(get_client)]):
-    vectorizers = client.get_all_sentence_embedders()
-    vectorizers = [v.replace("_", '-') for v in vectorizers]
-    return vectorizers
+async def get_all_models(request: Request):
+    return await metadata_cache.response(request, "models", _load_models)
@@ -1,24 +1,25 @@
 from typing import Annotated
 
-from app.dependencies import get_client
+from app.concurrency import run_blocking
+from app.dependencies import get_client, load_terminologies, metadata_cache
 from app.models import WeaviateClient
 from datastew.repository.model import Terminology
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 
-router = APIRouter(prefix="/terminologies", tags=["terminologies"], dependencies=[Depends(get_client)])
+router = APIRouter(prefix="/terminologies", tags=["terminologies"])
 
 
 @router.get("/")
-async def get_all_terminologies(client: Annotated[WeaviateClient, Depends(get_client)]):
-    terminologies = client.get_all_terminologies()
-    return terminologies
+async def get_all_terminologies(request: Request):
+    return await metadata_cache.response(request, "terminologies", load_terminologies)
 
 
 @router.put("/{id}")
 async def create_terminology(id: str, name: str, client: Annotated[WeaviateClient, Depends(get_client)]):
     try:
         terminology = Terminology(name, id)
-        client.store(terminology)
+        await run_blocking(client.store, terminology, limiter="write")
+        metadata_cache.invalidate("terminologies")
         return {"message": f"Terminology {id} created successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create terminology: {str(e)}")
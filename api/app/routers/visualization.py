@@ -1,26 +1,126 @@
-from typing import Annotated
+import json
+from typing import Optional
 
-from app.dependencies import get_client
-from app.models import WeaviateClient
-from datastew.visualisation import get_plot_for_current_database_state
-from fastapi import APIRouter, Depends
-from fastapi.responses import HTMLResponse
+import numpy as np
+from app.dependencies import projection_service
+from app.models import VISUALIZATION_PLOT_POINTS, VISUALIZATION_TILE_SIZE
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, Response
 
-router = APIRouter(prefix="/visualization", tags=["visualization"], dependencies=[Depends(get_client)])
+router = APIRouter(prefix="/visualization", tags=["visualization"])
 
-db_plot_html = None
+PLOT_TEMPLATE = """<div id="kitsune-projection" style="width: 100%; height: 600px"></div>
+<script>
+(function () {
+  const pointsUrl = %(points_url)s;
+  const model = %(model)s;
+  function render() {
+    fetch(pointsUrl + "?sample=true&model=" + encodeURIComponent(model))
+      .then((response) => response.json())
+      .then((data) => {
+        const traces = data.terminologies.map((name) => ({
+          type: "scattergl", mode: "markers", name: name, x: [], y: [], text: [], marker: {size: 4}
+        }));
+        data.terminology.forEach((index, i) => {
+          traces[index].x.push(data.x[i]);
+          traces[index].y.push(data.y[i]);
+          traces[index].text.push(data.text[i]);
+        });
+        const title = data.model + " (" + data.x.length + " of " + data.mappings + " mappings)";
+        Plotly.newPlot("kitsune-projection", traces, {title: title});
+      });
+  }
+  if (window.Plotly) {
+    render();
+  } else {
+    const script = document.createElement("script");
+    script.src = "https://cdn.plot.ly/plotly-2.35.2.min.js";
+    script.onload = render;
+    document.head.appendChild(script);
+  }
+})();
+</script>
+"""
+
+
+def _get_projection(model: Optional[str]):
+    models = projection_service.models()
+    if not models:
+        raise HTTPException(status_code=404, detail="The DB visualization has not been computed yet")
+    model = model or models[0]
+    projection = projection_service.get(model)
+    if projection is None:
+        raise HTTPException(status_code=404, detail=f"No visualization for model {model}. Available: {models}")
+    return model, projection
 
 
 @router.get("/", response_class=HTMLResponse)
-def serve_visualization(client: Annotated[WeaviateClient, Depends(get_client)]):
-    global db_plot_html
-    if not db_plot_html:
-        db_plot_html = get_plot_for_current_database_state(client)
-    return db_plot_html
+def serve_visualization(request: Request, model: Optional[str] = None):
+    if not projection_service.models():
+        return "<p>The DB visualization is being computed, please check back in a moment.</p>"
+    model, _ = _get_projection(model)
+    points_url = str(request.url_for("get_visualization_points"))
+    return PLOT_TEMPLATE % {"points_url": json.dumps(points_url), "model": json.dumps(model)}
+
+
+@router.get(
+    "/points",
+    description="2D coordinates, terminology and text of the projected mappings as JSON: the `limit` points from "
+    "`offset` on, or with `sample`, at most `limit` points spread evenly over all of them.",
+)
+def get_visualization_points(
+    model: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(VISUALIZATION_PLOT_POINTS, gt=0, le=VISUALIZATION_PLOT_POINTS),
+    sample: bool = False,
+):
+    model, projection = _get_projection(model)
+    # Points added while the response is built are left out
+    count = len(projection)
+    if sample:
+        indices = np.unique(np.linspace(0, count - 1, min(limit, count), dtype=np.int64))
+    else:
+        indices = np.arange(offset, min(offset + limit, count))
+    coords = projection.coords[indices]
+    texts = projection.texts
+    return {
+        "model": model,
+        "total": count,
+        "mappings": projection.total,
+        "terminologies": projection.terminologies,
+        "x": coords[:, 0].tolist(),
+        "y": coords[:, 1].tolist(),
+        "terminology": projection.terminology_index[indices].tolist(),
+        "text": [texts[i] for i in indices],
+    }
+
+
+@router.get(
+    "/tiles/{tile}",
+    description="Binary tile of projected points: little-endian float32 (x, y) pairs followed by one uint16 "
+    "terminology index per point. Point and total counts are sent in the X-Point-Count and X-Total-Points headers.",
+)
+def get_visualization_tile(tile: int, model: Optional[str] = None):
+    model, projection = _get_projection(model)
+    start = tile * VISUALIZATION_TILE_SIZE
+    coords = projection.coords[start : start + VISUALIZATION_TILE_SIZE]
+    terminology_index = projection.terminology_index[start : start + VISUALIZATION_TILE_SIZE]
+    content = coords.astype("<f4").tobytes() + terminology_index.astype("<u2").tobytes()
+    headers = {
+        "X-Point-Count": str(len(coords)),
+        "X-Total-Points": str(len(projection)),
+        "X-Terminologies": json.dumps(projection.terminologies),
+    }
+    return Response(content, media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/status")
+def get_visualization_status():
+    return projection_service.status()
 
 
 @router.patch("/")
-def update_visualization(client: Annotated[WeaviateClient, Depends(get_client)]):
-    global db_plot_html
-    db_plot_html = get_plot_for_current_database_state(client)
-    return {"message": "DB visualization plot has been updated successfully"}
+def update_visualization():
+    if not projection_service.rebuild_in_background():
+        return {"message": "DB visualization is already being updated"}
+    return {"message": "DB visualization update has been started in the background"}
@@ -0,0 +1,317 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+
+from app.dependencies import lexical_index, local_index, result_cache
+from app.embedding_cache import normalize_text
+from app.metrics import stage
+from app.models import HYBRID_CANDIDATES, HYBRID_LEXICAL_WEIGHT, SEARCH_CONCURRENCY, SearchMode, WeaviateClient
+
+# Shared across requests so that the total number of in-flight Weaviate queries stays bounded.
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY, thread_name_prefix="search")
+
+
+def concept_to_dict(concept) -> dict:
+    terminology = concept.terminology
+    return {
+        "id": concept.concept_identifier,
+        "name": concept.pref_label,
+        "terminology": {"id": terminology.id, "name": terminology.name},
+    }
+
+
+def mapping_result_to_dict(mapping_result) -> dict:
+    return {
+        "concept": concept_to_dict(mapping_result.mapping.concept),
+        "text": mapping_result.mapping.text,
+        "similarity": mapping_result.similarity,
+    }
+
+
+def closest_mappings(
+    client: WeaviateClient, embedding: Sequence[float], terminology_name: str, model: str, limit: int
+) -> list[dict]:
+    """Search the closest mappings, in process if a local index is loaded for the terminology and model."""
+    index = local_index.get(terminology_name, model)
+    if index is not None:
+        return index.search(embedding, limit)
+    closest = client.get_closest_mappings(embedding, True, terminology_name, model, limit)
+    return [mapping_result_to_dict(mapping_result) for mapping_result in closest]
+
+
+def closest_mappings_batch(
+    client: WeaviateClient, queries: Sequence[tuple[Sequence[float], str, str, int]]
+) -> list[list[dict]]:
+    """Search the closest mappings for many ``(embedding, terminology name, model, limit)`` queries concurrently.
+
+    Queries with a local index are searched in process, the others are spread over the shared search executor. The
+    results are returned in the order of ``queries``.
+    """
+    results: list[list[dict]] = [[] for _ in queries]
+    remote = []
+    for i, (embedding, terminology_name, model, limit) in enumerate(queries):
+        index = local_index.get(terminology_name, model)
+        if index is not None:
+            results[i] = index.search(embedding, limit)
+        else:
+            remote.append(i)
+    for i, result in zip(remote, search_executor.map(lambda i: closest_mappings(client, *queries[i]), remote)):
+        results[i] = result
+    return results
+
+
+def dedupe_texts(texts: Sequence[str]) -> tuple[list[str], list[int]]:
+    """Collapse texts that are equal after normalization. Returns the unique texts and, for every text, the index of
+    its unique text."""
+    positions: dict[str, int] = {}
+    unique, indices = [], []
+    for text in texts:
+        key = normalize_text(text)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(text)
+        indices.append(positions[key])
+    return unique, indices
+
+
+def candidate_limit(limit: int, mode: SearchMode) -> int:
+    """Number of vector search results to fetch, hybrid search reranks a larger candidate set."""
+    return max(limit, HYBRID_CANDIDATES) if mode == SearchMode.HYBRID else limit
+
+
+def cache_model(model: str, mode: SearchMode) -> str:
+    """Model part of the result cache key, hybrid results are cached apart from vector results."""
+    return f"{model}|{mode.value}" if mode == SearchMode.HYBRID else model
+
+
+def search_mode(terminology_name: str, mode: SearchMode) -> SearchMode:
+    """Hybrid search falls back to vector search until the lexical index of the terminology is built, so that the
+    vector-only results are not cached as hybrid results."""
+    if mode == SearchMode.HYBRID and lexical_index.get(terminology_name) is None:
+        return SearchMode.VECTOR
+    return mode
+
+
+def exact_mappings(
+    texts: Sequence[str], terminology_name: str, limit: int, mode: SearchMode
+) -> list[Optional[list[dict]]]:
+    """Exact matches of each text in the lexical index, ``None`` for texts without one. Texts with fewer than
+    ``limit`` exact matches are searched as well, see :func:`top_up`.
+
+    Only hybrid search looks up exact matches, and only once the index of the terminology has been built.
+    """
+    index = lexical_index.get(terminology_name) if mode == SearchMode.HYBRID else None
+    if index is None:
+        return [None] * len(texts)
+    with stage("lexical"):
+        return [index.exact(text, limit) or None for text in texts]
+
+
+def _mapping_key(mapping: dict) -> tuple[str, str, str]:
+    concept = mapping["concept"]
+    return concept["terminology"]["id"], concept["id"], mapping["text"]
+
+
+def fuse(vector_results: list[dict], lexical_results: list[tuple[dict, float]], limit: int) -> list[dict]:
+    """Rank the union of vector and BM25 candidates by ``(1 - w) * similarity + w * bm25 / max(bm25)``.
+
+    Candidates found by BM25 only are outside the vector results, so their similarity is at most the lowest one among
+    them, which is used in its place.
+    """
+    weight = HYBRID_LEXICAL_WEIGHT
+    fused = {_mapping_key(mapping): (mapping, (1 - weight) * mapping["similarity"]) for mapping in vector_results}
+    floor = (1 - weight) * min((mapping["similarity"] for mapping in vector_results), default=0.0)
+    best = max((score for _, score in lexical_results), default=0.0)
+    for document, score in lexical_results:
+        key = _mapping_key(document)
+        mapping, similarity = fused.get(key, (document, floor))
+        fused[key] = (mapping, similarity + weight * score / best)
+    top = heapq.nlargest(limit, fused.values(), key=lambda item: item[1])
+    return [{**mapping, "similarity": similarity} for mapping, similarity in top]
+
+
+def rerank(
+    texts: Sequence[str], results: list[list[dict]], terminology_name: str, limit: int, mode: SearchMode
+) -> list[list[dict]]:
+    """Fuse the vector search results of each text with its BM25 results in hybrid mode. Falls back to the vector
+    ranking while the lexical index of the terminology is not built."""
+    index = lexical_index.get(terminology_name) if mode == SearchMode.HYBRID else None
+    if index is None:
+        return [result[:limit] for result in results]
+    with stage("rerank"):
+        return [
+            fuse(result, index.search(text, candidate_limit(limit, mode)), limit)
+            for text, result in zip(texts, results)
+        ]
+
+
+def top_up(exact: Optional[list[dict]], results: list[dict], limit: int) -> list[dict]:
+    """The exact matches of a text followed by the best search results of other concepts, up to ``limit``."""
+    if not exact:
+        return results
+    concepts = {(mapping["concept"]["terminology"]["id"], mapping["concept"]["id"]) for mapping in exact}
+    others = [
+        mapping
+        for mapping in results
+        if (mapping["concept"]["terminology"]["id"], mapping["concept"]["id"]) not in concepts
+    ]
+    return exact + others[: limit - len(exact)]
+
+
+def merge_mappings(mappings_by_model: dict[str, list[dict]], limit: int) -> list[dict]:
+    """Merge the mappings found for one text with several models and in several terminologies.
+
+    Every mapping appears once with the similarity per model in ``scores`` and the best of them as ``similarity``.
+    Up to ``limit`` mappings are kept per terminology, ordered by similarity.
+    """
+    merged: dict[tuple[str, str, str], dict] = {}
+    for model, mappings in mappings_by_model.items():
+        for mapping in mappings:
+            entry = merged.setdefault(
+                _mapping_key(mapping),
+                {
+                    "concept": mapping["concept"],
+                    "text": mapping["text"],
+                    "similarity": mapping["similarity"],
+                    "scores": {},
+                },
+            )
+            entry["scores"][model] = mapping["similarity"]
+            entry["similarity"] = max(entry["similarity"], mapping["similarity"])
+    kept: dict[str, int] = {}
+    results = []
+    for entry in sorted(merged.values(), key=lambda entry: entry["similarity"], reverse=True):
+        terminology_id = entry["concept"]["terminology"]["id"]
+        if kept.get(terminology_id, 0) < limit:
+            kept[terminology_id] = kept.get(terminology_id, 0) + 1
+            results.append(entry)
+    return results
+
+
+class SearchBatch:
+    """Closest mappings of many texts in one or more terminologies with one or more models.
+
+    The constructor serves what it can from the result cache and, in hybrid mode, texts with at least ``limit`` exact
+    lexical matches.
+    :meth:`embed` then embeds each distinct text that is still missing in any of the terminologies once per model, and
+    :meth:`search` runs the remaining searches of all terminologies and models concurrently. The dictionary pipeline
+    runs these steps as separate stages.
+    """
+
+    def __init__(
+        self,
+        texts: Sequence[str],
+        terminology_names: Sequence[str],
+        embedding_models: dict,
+        limit: int,
+        mode: SearchMode = SearchMode.VECTOR,
+    ):
+        self.texts = texts
+        self.embedding_models = embedding_models
+        self.limit = limit
+        self.sources = [(name, model) for model in embedding_models for name in terminology_names]
+        self.modes = {name: search_mode(name, mode) for name in terminology_names}
+        self.generations = {name: result_cache.generation(name) for name in terminology_names}
+        self.results: dict[tuple[str, str], list[Optional[list[dict]]]] = {}
+        # Per source: positions of the missing texts, their distinct texts, the index of each position among those,
+        # the results found so far for the distinct texts and their exact matches
+        self._missing: dict[tuple[str, str], tuple[list[int], list[str], list[int], list, list]] = {}
+        self._queries: dict[str, dict[str, str]] = {model: {} for model in embedding_models}
+        self._embeddings: dict[str, dict[str, Sequence[float]]] = {model: {} for model in embedding_models}
+        for name, model in self.sources:
+            results = result_cache.get_many(texts, name, cache_model(model, self.modes[name]), limit)
+            self.results[(name, model)] = results
+            missing = [i for i, result in enumerate(results) if result is None]
+            if not missing:
+                continue
+            unique, indices = dedupe_texts([texts[i] for i in missing])
+            exact = exact_mappings(unique, name, limit, self.modes[name])
+            # Texts with fewer exact matches than ``limit`` are searched to top them up
+            found = [result if result is not None and len(result) >= limit else None for result in exact]
+            self._missing[(name, model)] = (missing, unique, indices, found, exact)
+            for text, result in zip(unique, found):
+                if result is None:
+                    self._queries[model].setdefault(normalize_text(text), text)
+
+    def embed(self):
+        for model, queries in self._queries.items():
+            if not queries:
+                continue
+            keys, texts = list(queries), list(queries.values())
+            embedding_model = self.embedding_models[model]
+            with stage("embed"):
+                if len(texts) == 1:
+                    embeddings = [embedding_model.get_embedding(texts[0])]
+                else:
+                    embeddings = embedding_model.get_embeddings(texts)
+            self._embeddings[model] = dict(zip(keys, embeddings))
+
+    def search(self, client: WeaviateClient):
+        pending = [
+            (source, i, text)
+            for source, (_, unique, _, found, _) in self._missing.items()
+            for i, (text, result) in enumerate(zip(unique, found))
+            if result is None
+        ]
+        if pending:
+            queries = [
+                (
+                    self._embeddings[model][normalize_text(text)],
+                    name,
+                    model,
+                    candidate_limit(self.limit, self.modes[name]),
+                )
+                for (name, model), _, text in pending
+            ]
+            with stage("search"):
+                searched = closest_mappings_batch(client, queries)
+            by_source: dict[tuple[str, str], list] = {}
+            for (source, i, text), result in zip(pending, searched):
+                by_source.setdefault(source, []).append((i, text, result))
+            for (name, model), items in by_source.items():
+                _, _, _, found, exact = self._missing[(name, model)]
+                texts = [text for _, text, _ in items]
+                # Results of the concepts matched exactly are dropped when topping up, so rank enough to replace them
+                limit = self.limit + max((len(exact[i] or ()) for i, _, _ in items), default=0)
+                reranked = rerank(texts, [result for _, _, result in items], name, limit, self.modes[name])
+                for (i, _, _), result in zip(items, reranked):
+                    found[i] = top_up(exact[i], result, self.limit)
+        for (name, model), (missing, unique, indices, found, _) in self._missing.items():
+            key = cache_model(model, self.modes[name])
+            result_cache.put_many(unique, name, key, self.limit, found, self.generations[name])
+            results = self.results[(name, model)]
+            for i, index in zip(missing, indices):
+                results[i] = found[index]
+        self._missing.clear()
+
+    def merged(self) -> list[list[dict]]:
+        """Results per text; merged with :func:`merge_mappings` if more than one terminology or model was searched."""
+        if len(self.sources) == 1:
+            return self.results[self.sources[0]]
+        merged = []
+        for i in range(len(self.texts)):
+            mappings_by_model: dict[str, list[dict]] = {}
+            for name, model in self.sources:
+                mappings_by_model.setdefault(model, []).extend(self.results[(name, model)][i])
+            merged.append(merge_mappings(mappings_by_model, self.limit))
+        return merged
+
+
+def cached_closest_mappings(
+    client: WeaviateClient,
+    embedding_models: dict,
+    texts: Sequence[str],
+    terminology_names: Sequence[str],
+    limit: int,
+    mode: SearchMode = SearchMode.VECTOR,
+) -> list[list[dict]]:
+    """Search the closest mappings for many texts, serving repeated queries from the result cache.
+
+    ``embedding_models`` maps the model names to search with to their vectorizers. Only texts without cached results
+    are embedded and searched, each distinct text once per model; the results are returned in the order of
+    ``texts``. In hybrid mode, texts with at least ``limit`` exact lexical matches are not embedded at all.
+    """
+    batch = SearchBatch(texts, terminology_names, embedding_models, limit, mode)
+    batch.embed()
+    batch.search(client)
+    return batch.merged()
@@ -0,0 +1,39 @@
+from weaviate.classes.config import Reconfigure
+
+from app.models import VECTOR_RESCORE_LIMIT, VectorStorage, WeaviateClient, logger
+
+
+def _quantizer(storage: VectorStorage, rescore_limit: int):
+    if storage == VectorStorage.PQ:
+        return Reconfigure.VectorIndex.Quantizer.pq()
+    if storage == VectorStorage.BQ:
+        return Reconfigure.VectorIndex.Quantizer.bq(rescore_limit=rescore_limit)
+    return Reconfigure.VectorIndex.Quantizer.sq(rescore_limit=rescore_limit)
+
+
+def configure_vector_storage(
+    client: WeaviateClient, storage: VectorStorage, rescore_limit: int = VECTOR_RESCORE_LIMIT
+):
+    """Enable quantization for the Mapping collection, for every named vector if Weaviate vectorizers are used.
+
+    Quantization applies to the whole collection and cannot be switched to a different type once enabled. ``full``
+    leaves the current configuration unchanged.
+    """
+    if storage == VectorStorage.FULL:
+        return
+    collection = client.client.collections.get("Mapping")
+    index_config = Reconfigure.VectorIndex.hnsw(quantizer=_quantizer(storage, rescore_limit))
+    named_vectors = collection.config.get().vector_config
+    try:
+        if named_vectors:
+            collection.config.update(
+                vectorizer_config=[
+                    Reconfigure.NamedVectors.update(name=name, vector_index_config=index_config)
+                    for name in named_vectors
+                ]
+            )
+        else:
+            collection.config.update(vector_index_config=index_config)
+    except Exception as e:
+        raise RuntimeError(f"Failed to enable {storage.value} vector storage: {e}")
+    logger.info(f"Enabled {storage.value} vector storage for the Mapping collection")
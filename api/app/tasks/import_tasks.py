@@ -1,35 +1,311 @@
-import asyncio
+import itertools
+import json
 import os
-import tempfile
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
 
-from datastew.embedding import Vectorizer
-from datastew.process.ols import OLSTerminologyImportTask
+import httpx
+from datastew.repository.model import Terminology
+from weaviate.util import generate_uuid5
 
-from app.models import OLLAMA_URL, ObjectSchema, WeaviateClient
+from app.batch import insert_batch, vector_input
+from app.bulk import existing_uuids
+from app.concurrency import ordered_map
+from app.jobs import JobProgress
+from app.metrics import stage
+from app.models import (
+    BATCH_CONCURRENCY,
+    JSONL_CHUNK_BATCHES,
+    OLS_EMBED_BATCH_SIZE,
+    OLS_EMBED_WORKERS,
+    VECTOR_RESCORE_LIMIT,
+    ObjectSchema,
+    VectorStorage,
+    WeaviateClient,
+    logger,
+    vectorizer_registry,
+)
+from app.ols import OLSTermCache
+from app.storage import configure_vector_storage
 
 
-def import_snomed_ct_task(model: str = "sentence-transformers/all-mpnet-base-v2"):
-    with WeaviateClient() as client:
-        embedding_model = Vectorizer(model, host=OLLAMA_URL)
-        task = OLSTerminologyImportTask(embedding_model, "SNOMED CT", "snomed")
-        task.process_to_weaviate(client)
+def _configure_storage(client: WeaviateClient, progress: JobProgress):
+    storage = VectorStorage(progress.params.get("storage", VectorStorage.FULL.value))
+    configure_vector_storage(client, storage, progress.params.get("rescore_limit", VECTOR_RESCORE_LIMIT))
+
+
+def _term_text(term: dict) -> str:
+    """Text embedded for an OLS term: its first description, or its label if it has none, like datastew's
+    ``OLSTerminologyImportTask``."""
+    description = term.get("description")
+    if isinstance(description, list) and description:
+        return description[0]
+    if isinstance(description, str) and description:
+        return description
+    return term["label"]
 
 
-def import_ols_terminology_task(
+def _ols_batches(
+    pages: Iterator[tuple[int, list[dict]]], batch_size: int
+) -> Iterator[tuple[int, int, list[tuple[str, str, str]], bool]]:
+    """Split pages of OLS terms into ``(page, fetched, [(concept ID, label, text)], last batch of the page)``
+    batches."""
+    for page, terms in pages:
+        concepts = [
+            (term.get("obo_id") or term["short_form"], term["label"], _term_text(term))
+            for term in terms
+            if term.get("label")
+        ]
+        for start in range(0, max(len(concepts), 1), batch_size):
+            fetched = len(terms) if start == 0 else 0
+            yield page, fetched, concepts[start : start + batch_size], start + batch_size >= len(concepts)
+
+
+def iter_ols_import(
+    client: WeaviateClient,
+    cache: OLSTermCache,
     terminology_id: str,
-    model: str = "sentence-transformers/all-mpnet-base-v2",
-):
-    with WeaviateClient() as client:
-        embedding_model = Vectorizer(model, host=OLLAMA_URL)
-        task = OLSTerminologyImportTask(embedding_model, terminology_id, terminology_id)
-        task.process_to_weaviate(client)
+    terminology_name: str,
+    model: str,
+    page: int = 0,
+    refresh: bool = False,
+    embed_batch_size: int = OLS_EMBED_BATCH_SIZE,
+    embed_workers: int = OLS_EMBED_WORKERS,
+    batch_size: Optional[int] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> Iterator[dict]:
+    """Import a terminology from OLS as a pipeline of fetch -> embed -> write stages running concurrently.
 
+    Terms are read from the on-disk cache or fetched with concurrent paged requests, embedded in batches of
+    ``embed_batch_size`` descriptions by ``embed_workers`` threads and written through the Weaviate batcher with the same
+    UUIDs as datastew's ``store``. Each stage only runs a bounded number of batches ahead of the next one. After every
+    written batch its progress is yielded, with the page to resume from once the last batch of a page is written.
+    """
+    with httpx.Client(timeout=60) as http:
+        info = cache.load_index(http, terminology_id, refresh)
+        terminology_uuid = str(generate_uuid5({"name": terminology_name}))
+        client.store(Terminology(terminology_name, terminology_uuid))
+        embedding_model = None if client.use_weaviate_vectorizer else vectorizer_registry.get(model)
+        concept_collection = client.client.collections.get("Concept")
+        mapping_collection = client.client.collections.get("Mapping")
 
-async def import_jsonl_task(file: bytes, object_type: ObjectSchema):
+        def embed(batch):
+            page, fetched, concepts, last = batch
+            embeddings = [None] * len(concepts)
+            if embedding_model is not None and concepts:
+                with stage("import_embed"):
+                    embeddings = [list(e) for e in embedding_model.get_embeddings([text for _, _, text in concepts])]
+            return page, fetched, concepts, last, embeddings
+
+        # Closing the pages explicitly stops the fetches before the HTTP client is closed
+        with closing(cache.iter_pages(http, terminology_id, info["total_pages"], page)) as pages, ThreadPoolExecutor(
+            max_workers=embed_workers, thread_name_prefix="ols-embed"
+        ) as executor:
+            batches = ordered_map(executor, embed, _ols_batches(pages, embed_batch_size), embed_workers)
+            for page, fetched, concepts, last, embeddings in batches:
+                concept_objects, mapping_objects = {}, {}
+                for (concept_id, label, text), embedding in zip(concepts, embeddings):
+                    concept_properties = {"conceptID": concept_id, "prefLabel": label}
+                    concept_uuid = str(generate_uuid5(concept_properties))
+                    concept_objects.setdefault(
+                        concept_uuid,
+                        {
+                            "properties": concept_properties,
+                            "uuid": concept_uuid,
+                            "references": {"hasTerminology": terminology_uuid},
+                            "vector": None,
+                        },
+                    )
+                    mapping_properties = {"text": text}
+                    if embedding_model is not None:
+                        mapping_properties["hasSentenceEmbedder"] = embedding_model.model_name
+                    # A text repeated within the batch keeps the concept of its first occurrence
+                    mapping_uuid = str(generate_uuid5(mapping_properties))
+                    mapping_objects.setdefault(
+                        mapping_uuid,
+                        {
+                            "properties": mapping_properties,
+                            "uuid": mapping_uuid,
+                            "references": {"hasConcept": concept_uuid},
+                            "vector": embedding,
+                        },
+                    )
+                with stage("import_write"):
+                    # Like datastew's ``store``, stored concepts are not overwritten and stored mappings are not
+                    # re-pointed to the concepts of this terminology
+                    for uuid in existing_uuids(concept_collection, list(concept_objects)):
+                        del concept_objects[uuid]
+                    for uuid in existing_uuids(mapping_collection, list(mapping_objects)):
+                        del mapping_objects[uuid]
+                    failed_concepts = insert_batch(
+                        concept_collection, concept_objects.values(), batch_size, concurrency
+                    )
+                    failed_mappings = insert_batch(
+                        mapping_collection, mapping_objects.values(), batch_size, concurrency
+                    )
+                yield {
+                    "fetched": fetched,
+                    "embedded": len(concepts) if embedding_model is not None else 0,
+                    "written": len(mapping_objects) - len(failed_mappings),
+                    "skipped": len(concepts) - len(mapping_objects),
+                    "failed": len(failed_concepts) + len(failed_mappings),
+                    "errors": failed_concepts + failed_mappings,
+                    "total": info["total_elements"],
+                    "page": page + 1 if last else None,
+                }
+
+
+def import_ols_terminology_task(progress: JobProgress):
+    """Import a terminology from OLS, checkpointing after every page that has been written.
+
+    Terms come from the OLS term cache, so a resumed job or an import of the same terminology with another model does
+    not download them again unless ``refresh`` is set.
+    """
+    checkpoint = progress.checkpoint or {}
     with WeaviateClient() as client:
-        with tempfile.NamedTemporaryFile(delete=False, mode="wb") as temp_file:
-            temp_file.write(file)
-            file_path = temp_file.name
+        _configure_storage(client, progress)
+        chunks = iter_ols_import(
+            client,
+            OLSTermCache(),
+            progress.params["terminology_id"],
+            progress.params.get("terminology_name", progress.params["terminology_id"]),
+            progress.params["model"],
+            checkpoint.get("page", 0),
+            # A resumed job continues with the terms it has already fetched
+            progress.params.get("refresh", False) and not checkpoint,
+            progress.params.get("embed_batch_size", OLS_EMBED_BATCH_SIZE),
+            progress.params.get("embed_workers", OLS_EMBED_WORKERS),
+            progress.params.get("batch_size"),
+            progress.params.get("concurrency", BATCH_CONCURRENCY),
+        )
+        for chunk in chunks:
+            for uuid, message in chunk["errors"][:10]:
+                logger.warning(f"Failed to import {uuid} from {progress.params['terminology_id']}: {message}")
+            progress.update(
+                fetched=chunk["fetched"],
+                embedded=chunk["embedded"],
+                written=chunk["written"],
+                skipped=chunk["skipped"],
+                failed=chunk["failed"],
+                total=chunk["total"],
+                checkpoint={"page": chunk["page"]} if chunk["page"] is not None else None,
+            )
+
 
-        await asyncio.to_thread(client.import_from_jsonl, file_path, object_type.value)
-        os.remove(file_path)
+def iter_jsonl_import(
+    client: WeaviateClient,
+    file_path: str,
+    object_type: ObjectSchema,
+    batch_size: Optional[int] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    offset: int = 0,
+) -> Iterator[dict]:
+    """Import a JSONL file into Weaviate without loading it into memory.
+
+    The file is read line by line from byte ``offset`` and written in chunks through the Weaviate batcher. Mappings
+    without a precomputed ``vector`` are embedded chunk-wise with the model of their ``hasSentenceEmbedder``. After
+    each chunk has been flushed, the progress of that chunk and the offset to resume from are yielded.
+    """
+    collection_name = object_type.value.capitalize()
+    collection = client.client.collections.get(collection_name)
+    chunk_size = (batch_size or 100) * JSONL_CHUNK_BATCHES
+
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        while True:
+            with stage("import_fetch"):
+                objects, errors, lines, offset = _read_jsonl_chunk(file, chunk_size, collection_name, offset)
+            if not lines:
+                break
+
+            embedded = 0
+            if object_type == ObjectSchema.MAPPING and not client.use_weaviate_vectorizer:
+                with stage("import_embed"):
+                    objects, embedded, missing_models = _embed_missing_vectors(objects)
+                errors += missing_models
+            with stage("import_write"):
+                failed = insert_batch(collection, objects, batch_size, concurrency)
+            yield {
+                "fetched": len(objects) + len(errors),
+                "embedded": embedded,
+                "written": len(objects) - len(failed),
+                "failed": len(errors) + len(failed),
+                "errors": errors + failed,
+                "offset": offset,
+            }
+
+
+def _read_jsonl_chunk(file, chunk_size: int, collection_name: str, offset: int):
+    objects, errors = [], []
+    lines = 0
+    for line in itertools.islice(file, chunk_size):
+        lines += 1
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if item.get("class", collection_name) != collection_name:
+                raise ValueError(f"Expected a {collection_name} object but got {item.get('class')}")
+            objects.append(
+                {
+                    "properties": item["properties"],
+                    "uuid": item["id"],
+                    "references": item.get("references"),
+                    # Exports of earlier versions of the API named the vectors ``vectors``
+                    "vector": vector_input(item.get("vector", item.get("vectors"))),
+                }
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append((None, f"Invalid line at byte {offset - len(line)}: {e}"))
+    return objects, errors, lines, offset
+
+
+def _embed_missing_vectors(objects: list[dict]) -> tuple[list[dict], int, list[tuple[str, str]]]:
+    """Embed the texts of mappings without a vector with the model of their ``hasSentenceEmbedder``. Returns the
+    objects to write, the number of embedded texts and the mappings that name no model to embed them with."""
+    missing: dict[str, list[dict]] = {}
+    errors = []
+    for obj in objects:
+        if obj["vector"] is None:
+            model = obj["properties"].get("hasSentenceEmbedder")
+            if model:
+                missing.setdefault(model, []).append(obj)
+            else:
+                errors.append((obj["uuid"], "Mapping has neither a vector nor a hasSentenceEmbedder to embed it with"))
+    for model, model_objects in missing.items():
+        embeddings = vectorizer_registry.get(model).get_embeddings([obj["properties"]["text"] for obj in model_objects])
+        for obj, embedding in zip(model_objects, embeddings):
+            obj["vector"] = list(embedding)
+    if errors:
+        failed = {uuid for uuid, _ in errors}
+        objects = [obj for obj in objects if obj["uuid"] not in failed]
+    return objects, sum(len(model_objects) for model_objects in missing.values()), errors
+
+
+def import_jsonl_task(progress: JobProgress):
+    """Import an uploaded JSONL file, checkpointing the byte offset after every flushed chunk."""
+    file_path = progress.params["file_path"]
+    with WeaviateClient() as client:
+        if progress.params["object_type"] == ObjectSchema.MAPPING.value:
+            _configure_storage(client, progress)
+        chunks = iter_jsonl_import(
+            client,
+            file_path,
+            ObjectSchema(progress.params["object_type"]),
+            progress.params.get("batch_size"),
+            progress.params.get("concurrency", BATCH_CONCURRENCY),
+            (progress.checkpoint or {}).get("offset", 0),
+        )
+        for chunk in chunks:
+            for uuid, message in chunk["errors"][:10]:
+                logger.warning(f"Failed to import {uuid or 'line'} from {file_path}: {message}")
+            progress.update(
+                fetched=chunk["fetched"],
+                embedded=chunk["embedded"],
+                written=chunk["written"],
+                failed=chunk["failed"],
+                checkpoint={"offset": chunk["offset"]},
+            )
+    os.remove(file_path)
@@ -0,0 +1,167 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+from weaviate.classes.query import Filter, QueryReference
+from weaviate.util import generate_uuid5
+
+from app.batch import insert_batch
+from app.concurrency import RateLimiter, ordered_map
+from app.jobs import JobProgress
+from app.metrics import stage
+from app.models import (
+    BATCH_CONCURRENCY,
+    MIGRATION_EMBED_BATCH_SIZE,
+    MIGRATION_EMBED_WORKERS,
+    MIGRATION_RATE_LIMIT,
+    WeaviateClient,
+    logger,
+    vectorizer_registry,
+)
+
+# Scanned mappings after which a batch is handed on even if it holds fewer texts to embed, so that a long run of
+# mappings that need no new embedding still advances the checkpoint
+SCAN_BATCH_FACTOR = 10
+
+
+def _scan_batches(
+    objects: Iterable, model_name: str, source_model: Optional[str], batch_size: int
+) -> Iterator[tuple[str, int, list[tuple[str, str]]]]:
+    """Group Mapping objects into ``(UUID of the last object, fetched, [(text, concept UUID)])`` batches of the texts
+    to embed with ``model_name``. Mappings of ``model_name`` itself are not counted as fetched."""
+    last, scanned, fetched, texts = None, 0, 0, []
+    for obj in objects:
+        last = str(obj.uuid)
+        scanned += 1
+        model = obj.properties.get("hasSentenceEmbedder")
+        fetched += model != model_name
+        if model != model_name and (source_model is None or model == source_model):
+            try:
+                texts.append((str(obj.properties.get("text", "")), str(obj.references["hasConcept"].objects[0].uuid)))
+            except (KeyError, IndexError, TypeError, AttributeError):
+                # Mappings without a concept are skipped
+                pass
+        if len(texts) >= batch_size or scanned >= batch_size * SCAN_BATCH_FACTOR:
+            yield last, fetched, texts
+            scanned, fetched, texts = 0, 0, []
+    if scanned:
+        yield last, fetched, texts
+
+
+def _missing_texts(collection, batch: tuple[str, int, list[tuple[str, str]]], model_name: str) -> tuple:
+    """Drop the texts of a batch that already have a mapping for ``model_name``, keeping one mapping per text."""
+    last, fetched, texts = batch
+    mappings = {}
+    for text, concept_uuid in texts:
+        properties = {"text": text, "hasSentenceEmbedder": model_name}
+        mappings.setdefault(str(generate_uuid5(properties)), (properties, concept_uuid))
+    if mappings:
+        response = collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(list(mappings)), return_properties=[], limit=len(mappings)
+        )
+        for obj in response.objects:
+            mappings.pop(str(obj.uuid), None)
+    return last, fetched, mappings
+
+
+def _count(collection, model_name: Optional[str] = None) -> int:
+    filters = Filter.by_property("hasSentenceEmbedder").equal(model_name) if model_name else None
+    return collection.aggregate.over_all(total_count=True, filters=filters).total_count
+
+
+def iter_model_migration(
+    client: WeaviateClient,
+    model: str,
+    source_model: Optional[str] = None,
+    after: Optional[str] = None,
+    embed_batch_size: int = MIGRATION_EMBED_BATCH_SIZE,
+    embed_workers: int = MIGRATION_EMBED_WORKERS,
+    rate_limit: float = MIGRATION_RATE_LIMIT,
+    batch_size: Optional[int] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> Iterator[dict]:
+    """Embed the texts of the stored mappings with ``model``, optionally only those of ``source_model``.
+
+    The Mapping collection is read with Weaviate's cursor API in UUID order, starting after ``after``. Texts that
+    already have a mapping for ``model`` are skipped, the others are embedded in batches of ``embed_batch_size`` by
+    ``embed_workers`` threads, at most ``rate_limit`` texts per second if it is set, and written as mappings of the
+    same concepts through the Weaviate batcher. After every written batch its progress is yielded together with the
+    UUID to continue after.
+    """
+    if client.use_weaviate_vectorizer:
+        raise ValueError("Mappings vectorized by Weaviate cannot be migrated to another model")
+    # Every text is embedded once, so the embedding cache would only be flooded
+    embedding_model = vectorizer_registry.get(model, cached=False)
+    model_name = embedding_model.model_name
+    collection = client.client.collections.get("Mapping")
+    total = _count(collection) - _count(collection, model_name)
+    limiter = RateLimiter(rate_limit)
+
+    def embed(batch):
+        last, fetched, mappings = batch
+        objects = list(mappings.values())
+        embeddings = []
+        if objects:
+            limiter.acquire(len(objects))
+            with stage("import_embed"):
+                embeddings = embedding_model.get_embeddings([properties["text"] for properties, _ in objects])
+        return last, fetched, list(zip(mappings, objects, embeddings))
+
+    objects = collection.iterator(
+        return_properties=["text", "hasSentenceEmbedder"],
+        return_references=QueryReference(link_on="hasConcept", return_properties=["conceptID"]),
+        after=after,
+    )
+    with ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="migration-embed") as executor:
+        batches = (
+            _missing_texts(collection, batch, model_name)
+            for batch in _scan_batches(objects, model_name, source_model, embed_batch_size)
+        )
+        for last, fetched, embedded in ordered_map(executor, embed, batches, embed_workers):
+            mapping_objects = [
+                {
+                    "properties": properties,
+                    "uuid": uuid,
+                    "references": {"hasConcept": concept_uuid},
+                    "vector": list(embedding),
+                }
+                for uuid, (properties, concept_uuid), embedding in embedded
+            ]
+            with stage("import_write"):
+                failed = insert_batch(collection, mapping_objects, batch_size, concurrency)
+            yield {
+                "fetched": fetched,
+                "embedded": len(mapping_objects),
+                "written": len(mapping_objects) - len(failed),
+                "failed": len(failed),
+                "errors": failed,
+                "total": total,
+                "after": last,
+            }
+
+
+def migrate_model_task(progress: JobProgress):
+    """Embed all stored mappings with another model, checkpointing the cursor after every written batch."""
+    checkpoint = progress.checkpoint or {}
+    with WeaviateClient() as client:
+        chunks = iter_model_migration(
+            client,
+            progress.params["model"],
+            progress.params.get("source_model"),
+            checkpoint.get("after"),
+            progress.params.get("embed_batch_size", MIGRATION_EMBED_BATCH_SIZE),
+            progress.params.get("embed_workers", MIGRATION_EMBED_WORKERS),
+            progress.params.get("rate_limit", MIGRATION_RATE_LIMIT),
+            progress.params.get("batch_size"),
+            progress.params.get("concurrency", BATCH_CONCURRENCY),
+        )
+        for chunk in chunks:
+            for uuid, message in chunk["errors"][:10]:
+                logger.warning(f"Failed to migrate mapping {uuid} to {progress.params['model']}: {message}")
+            progress.update(
+                fetched=chunk["fetched"],
+                embedded=chunk["embedded"],
+                written=chunk["written"],
+                failed=chunk["failed"],
+                total=chunk["total"],
+                checkpoint={"after": chunk["after"]},
+            )
@@ -0,0 +1,245 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence, Union
+
+from datastew.embedding import Vectorizer
+
+from app.embedding_cache import CachedVectorizer, EmbeddingCache
+from app.metrics import EMBEDDING_BATCH_SIZE_HIST, EMBEDDING_LATENCY
+
+
+class InstrumentedVectorizer:
+    """Records batch sizes and latencies of the calls to an embedding model."""
+
+    def __init__(self, vectorizer: Vectorizer):
+        self.vectorizer = vectorizer
+
+    def get_embedding(self, text: str):
+        EMBEDDING_BATCH_SIZE_HIST.labels(self.vectorizer.model_name).observe(1)
+        with EMBEDDING_LATENCY.labels(self.vectorizer.model_name).time():
+            return self.vectorizer.get_embedding(text)
+
+    def get_embeddings(self, texts: Sequence[str], *args, **kwargs):
+        EMBEDDING_BATCH_SIZE_HIST.labels(self.vectorizer.model_name).observe(len(texts))
+        with EMBEDDING_LATENCY.labels(self.vectorizer.model_name).time():
+            return self.vectorizer.get_embeddings(texts, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.vectorizer, name)
+
+
+class _EmbeddingRequest:
+    def __init__(self, text: str):
+        self.text = text
+        self.embedding: Optional[list[float]] = None
+        self.error: Optional[Exception] = None
+        self.promoted = False
+        self.done = threading.Event()
+
+
+class EmbeddingCoalescer:
+    """Batches concurrent single-text ``get_embedding`` calls for one model into ``get_embeddings`` calls.
+
+    The first caller after an idle period is embedded right away. Callers arriving while a batch is being embedded
+    queue up; when the batch returns, one of them is promoted to send the next batch, waiting up to ``window``
+    seconds for it to fill up to ``max_batch`` texts. A single user therefore never waits for the window.
+    """
+
+    def __init__(self, vectorizer: Vectorizer, window: float = 0.005, max_batch: int = 32):
+        self.vectorizer = vectorizer
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[_EmbeddingRequest] = []
+        self._busy = False
+        self._condition = threading.Condition()
+
+    @property
+    def model_name(self) -> str:
+        return self.vectorizer.model_name
+
+    def get_embedding(self, text: str) -> list[float]:
+        request = _EmbeddingRequest(text)
+        with self._condition:
+            self._pending.append(request)
+            self._condition.notify()
+            lead = not self._busy
+            self._busy = True
+        if not lead:
+            request.done.wait()
+        if lead or request.promoted:
+            self._dispatch(wait=request.promoted)
+        if request.error is not None:
+            raise request.error
+        return request.embedding
+
+    def get_embeddings(self, texts: Sequence[str], *args, **kwargs):
+        return self.vectorizer.get_embeddings(texts, *args, **kwargs)
+
+    def _dispatch(self, wait: bool):
+        with self._condition:
+            if wait and self.window > 0:
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch and time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+        try:
+            embeddings = self.vectorizer.get_embeddings([request.text for request in batch])
+            for request, embedding in zip(batch, embeddings):
+                request.embedding = list(embedding)
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        with self._condition:
+            leader = self._pending[0] if self._pending else None
+            if leader is not None:
+                leader.promoted = True
+            else:
+                self._busy = False
+        for request in batch:
+            request.done.set()
+        if leader is not None:
+            leader.done.set()
+
+    def __getattr__(self, name):
+        return getattr(self.vectorizer, name)
+
+
+class TruncatedVectorizer:
+    """Keeps the first ``dimensions`` components of a Matryoshka model's embeddings and normalizes them again.
+
+    Embeddings of a truncated model are stored and searched under their own model name, ``<model>@<dimensions>``.
+    """
+
+    def __init__(self, vectorizer, dimensions: int):
+        self.vectorizer = vectorizer
+        self.dimensions = dimensions
+
+    @property
+    def model_name(self) -> str:
+        return f"{self.vectorizer.model_name}@{self.dimensions}"
+
+    def get_embedding(self, text: str) -> list[float]:
+        return self._truncate(self.vectorizer.get_embedding(text))
+
+    def get_embeddings(self, texts: Sequence[str], *args, **kwargs) -> list[list[float]]:
+        return [self._truncate(embedding) for embedding in self.vectorizer.get_embeddings(texts, *args, **kwargs)]
+
+    def _truncate(self, embedding) -> list[float]:
+        truncated = [float(x) for x in embedding[: self.dimensions]]
+        norm = math.sqrt(sum(x * x for x in truncated)) or 1.0
+        return [x / norm for x in truncated]
+
+    def __getattr__(self, name):
+        return getattr(self.vectorizer, name)
+
+
+class VectorizerRegistry:
+    """Process-wide, thread-safe pool of vectorizers keyed by model name.
+
+    Vectorizers are created lazily on first use and kept resident until more than ``max_size`` models are loaded,
+    at which point the least recently used one is evicted. Vectorizers are handed out behind an
+    :class:`EmbeddingCoalescer`, configured per model through ``coalescing`` (``model -> (window, max_batch)``, with
+    the ``"default"`` entry for all other models), and, if an :class:`EmbeddingCache` is configured, wrapped so that
+    repeated texts are not embedded twice. ``<model>@<dimensions>`` selects a :class:`TruncatedVectorizer` of a
+    Matryoshka model.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        max_size: int = 4,
+        cache: Optional[EmbeddingCache] = None,
+        coalescing: Optional[dict[str, tuple[float, int]]] = None,
+    ):
+        self.host = host
+        self.max_size = max_size
+        self.cache = cache
+        self.coalescing = coalescing or {}
+        self._vectorizers: OrderedDict[tuple[str, str], Vectorizer] = OrderedDict()
+        self._coalescers: dict[tuple[str, str], EmbeddingCoalescer] = {}
+        self._loading: dict[tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, model: str, host: Optional[str] = None, api_key: Optional[str] = None, cached: bool = True
+    ) -> Union[Vectorizer, EmbeddingCoalescer, TruncatedVectorizer, CachedVectorizer]:
+        """Get the vectorizer for ``model``. With ``cached=False`` the plain vectorizer is returned, without
+        coalescing or caching."""
+        model, _, dimensions = model.partition("@")
+        vectorizer = self._get(model, host, api_key)
+        if not cached:
+            return TruncatedVectorizer(vectorizer, int(dimensions)) if dimensions else vectorizer
+        vectorizer = self._coalescer(model, host, vectorizer) or vectorizer
+        if dimensions:
+            vectorizer = TruncatedVectorizer(vectorizer, int(dimensions))
+        if self.cache is not None:
+            return CachedVectorizer(vectorizer, self.cache)
+        return vectorizer
+
+    def _get(self, model: str, host: Optional[str], api_key: Optional[str]) -> Vectorizer:
+        key = (model, host or self.host)
+        with self._lock:
+            vectorizer = self._lookup(key)
+            if vectorizer is not None:
+                return vectorizer
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Build outside the registry lock so that loading one model does not block requests for another.
+        with load_lock:
+            with self._lock:
+                vectorizer = self._lookup(key)
+                if vectorizer is not None:
+                    return vectorizer
+            vectorizer = InstrumentedVectorizer(Vectorizer(model, api_key=api_key, host=key[1]))
+            with self._lock:
+                self._store(key, vectorizer)
+                self._loading.pop(key, None)
+        return vectorizer
+
+    def _coalescer(self, model: str, host: Optional[str], vectorizer: Vectorizer) -> Optional[EmbeddingCoalescer]:
+        window, max_batch = self.coalescing.get(model, self.coalescing.get("default", (0.005, 32)))
+        if max_batch <= 1:
+            return None
+        key = (model, host or self.host)
+        with self._lock:
+            coalescer = self._coalescers.get(key)
+            if coalescer is None or coalescer.vectorizer is not vectorizer:
+                coalescer = self._coalescers[key] = EmbeddingCoalescer(vectorizer, window, max_batch)
+            return coalescer
+
+    def register(self, model: str, vectorizer, host: Optional[str] = None):
+        """Serve ``model`` from an already constructed vectorizer, e.g. a local stand-in in the benchmarks."""
+        key = (model, host or self.host)
+        with self._lock:
+            self._coalescers.pop(key, None)
+            self._store(key, InstrumentedVectorizer(vectorizer))
+
+    def warm(self, models: Iterable[str]):
+        for model in models:
+            self._get(model.partition("@")[0], None, None)
+
+    def loaded_models(self) -> list[str]:
+        with self._lock:
+            return [model for model, _ in self._vectorizers]
+
+    def clear(self):
+        with self._lock:
+            self._vectorizers.clear()
+            self._coalescers.clear()
+
+    def _store(self, key: tuple[str, str], vectorizer: Vectorizer):
+        # Called with the registry lock held
+        self._vectorizers[key] = vectorizer
+        self._vectorizers.move_to_end(key)
+        while len(self._vectorizers) > self.max_size:
+            evicted, _ = self._vectorizers.popitem(last=False)
+            self._coalescers.pop(evicted, None)
+
+    def _lookup(self, key: tuple[str, str]) -> Optional[Vectorizer]:
+        vectorizer = self._vectorizers.get(key)
+        if vectorizer is not None:
+            self._vectorizers.move_to_end(key)
+        return vectorizer
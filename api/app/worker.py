@@ -0,0 +1,111 @@
+"""Import worker processes.
+
+Workers poll the job store for queued import jobs and run them outside of the API process. They are started by the
+API on startup (``IMPORT_WORKERS``) or standalone with ``python -m app.worker --workers 2``.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+from typing import Callable
+
+from app.jobs import JobCancelled, JobProgress, JobStatus, JobStore
+from app.models import JOB_DB_PATH, JOB_HEARTBEAT_INTERVAL, JOB_POLL_INTERVAL, JOB_STALE_AFTER, logger
+
+
+def _handlers() -> dict[str, Callable[[JobProgress], None]]:
+    from app.tasks.import_tasks import import_jsonl_task, import_ols_terminology_task
+    from app.tasks.migration_tasks import migrate_model_task
+
+    return {"ols": import_ols_terminology_task, "jsonl": import_jsonl_task, "migration": migrate_model_task}
+
+
+def _send_heartbeats(store: JobStore, job_id: str, interval: float, stopped: threading.Event):
+    while not stopped.wait(interval):
+        try:
+            store.heartbeat(job_id)
+        except Exception as e:
+            logger.warning(f"Failed to record the heartbeat of import job {job_id}: {e}")
+
+
+def run_job(store: JobStore, job: dict, heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL):
+    progress = JobProgress(store, job)
+    # Heartbeats keep a job that makes no progress for a while, e.g. during a long embedding call, from being requeued
+    stopped = threading.Event()
+    heartbeats = threading.Thread(
+        target=_send_heartbeats, args=(store, job["id"], heartbeat_interval, stopped), daemon=True
+    )
+    heartbeats.start()
+    try:
+        _handlers()[job["kind"]](progress)
+        store.finish(job["id"], JobStatus.COMPLETED)
+    except JobCancelled:
+        logger.info(f"Import job {job['id']} was cancelled")
+        store.finish(job["id"], JobStatus.CANCELLED)
+    except Exception as e:
+        logger.error(f"Import job {job['id']} failed: {traceback.format_exc()}")
+        store.finish(job["id"], JobStatus.FAILED, str(e))
+    finally:
+        stopped.set()
+        heartbeats.join()
+
+
+def run_worker(path: str = JOB_DB_PATH, poll_interval: float = JOB_POLL_INTERVAL):
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGTERM, stop)
+    store = JobStore(path)
+    worker = f"{os.uname().nodename}:{os.getpid()}"
+    job = None
+    try:
+        while True:
+            job = store.claim(worker)
+            if job is None:
+                # Jobs of crashed workers are resumed from their last checkpoint
+                store.requeue_stale(JOB_STALE_AFTER)
+                time.sleep(poll_interval)
+                continue
+            logger.info(f"Worker {worker} starts import job {job['id']} ({job['kind']})")
+            run_job(store, job)
+            job = None
+    except KeyboardInterrupt:
+        if job is not None:
+            store.requeue(job["id"])
+    finally:
+        store.close()
+
+
+def start_workers(count: int, path: str = JOB_DB_PATH) -> list[multiprocessing.Process]:
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(path,), daemon=True, name=f"import-worker-{i}") for i in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def stop_workers(processes: list[multiprocessing.Process], timeout: float = 10):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run import workers")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    workers = start_workers(args.workers)
+    try:
+        for worker_process in workers:
+            worker_process.join()
+    except KeyboardInterrupt:
+        stop_workers(workers)
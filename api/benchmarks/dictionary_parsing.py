@@ -0,0 +1,98 @@
+"""Time to the first chunk, total time and peak memory of parsing large data dictionaries.
+
+Compares the streaming reader used by the dictionary endpoints with loading the whole file into a DataFrame through
+datastew's ``DataDictionarySource``, and prints the results per format as JSON::
+
+    python -m benchmarks.dictionary_parsing --rows 100000 --columns 20 --formats .csv .xlsx
+
+The generated dictionaries contain ``--columns`` additional columns that the endpoints do not use.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from datastew import DataDictionarySource
+from openpyxl import Workbook
+
+from app.dictionary import iter_dictionary_chunks
+from benchmarks.load import TEXTS
+
+
+def dictionary_rows(rows: int, columns: int):
+    yield ["variable", "description"] + [f"extra_{c}" for c in range(columns)]
+    for i in range(rows):
+        yield [f"var_{i}", f"{random.choice(TEXTS)} {i}"] + [f"value {i}-{c}" for c in range(columns)]
+
+
+def dictionary_file(rows: int, columns: int, file_extension: str) -> bytes:
+    if file_extension == ".xlsx":
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        for row in dictionary_rows(rows, columns):
+            sheet.append(row)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+    separator = "\t" if file_extension == ".tsv" else ","
+    return "\n".join(separator.join(row) for row in dictionary_rows(rows, columns)).encode()
+
+
+def measure(parse) -> dict:
+    start = time.perf_counter()
+    first_chunk, rows = None, 0
+    for chunk in parse():
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        rows += len(chunk)
+    seconds = time.perf_counter() - start
+    # Memory is traced in a second pass, tracing slows down parsing considerably
+    tracemalloc.start()
+    for _ in parse():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows": rows, "first_chunk_ms": (first_chunk or 0.0) * 1000, "seconds": seconds, "peak_mb": peak / 1024**2}
+
+
+def dataframe_chunks(data: bytes, file_extension: str, chunk_size: int):
+    # The former code path: copy the upload to a temporary file and load it into a DataFrame
+    with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as file:
+        file.write(data)
+    try:
+        df = DataDictionarySource(file.name, "variable", "description").to_dataframe()
+        rows = list(zip(df["variable"].to_list(), df["description"].to_list()))
+    finally:
+        os.remove(file.name)
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start : start + chunk_size]
+
+
+def run(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    results = {}
+    for file_extension in args.formats:
+        data = dictionary_file(args.rows, args.columns, file_extension)
+        results[file_extension] = {
+            "file_mb": len(data) / 1024**2,
+            "streaming": measure(
+                lambda: iter_dictionary_chunks(data, file_extension, "variable", "description", args.chunk_size)
+            ),
+            "dataframe": measure(lambda: dataframe_chunks(data, file_extension, args.chunk_size)),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--formats", nargs="+", choices=[".csv", ".tsv", ".xlsx"], default=[".csv", ".tsv", ".xlsx"])
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
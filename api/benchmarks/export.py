@@ -0,0 +1,74 @@
+"""Throughput and peak memory of exporting all mappings.
+
+Seeds ``--concepts`` concepts with one mapping per model in the in-memory Weaviate stand-in and exports the mappings
+with their vectors, printing wall time, exported bytes and peak traced memory per run as JSON::
+
+    python -m benchmarks.export --concepts 20000 --dimensions 384
+
+- ``collected_jsonl``: all objects read into a list and serialized as one document, like paging through everything
+  before writing the response.
+- ``streamed_jsonl`` / ``streamed_parquet``: the chunked exports of ``GET /exports/mapping``, which only hold one chunk
+  at a time.
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+import orjson
+
+from app.cursor import export_records, iter_jsonl, iter_parquet
+from app.models import ObjectSchema
+from benchmarks.fan_out import seed
+from benchmarks.standins import FakeRepository, FakeVectorizer
+
+
+def collected(repository: FakeRepository) -> list[bytes]:
+    objects = list(repository.iter_objects("Mapping", include_vector=True))
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+    return [b"".join(orjson.dumps(record, option=option) for record in export_records(objects, ObjectSchema.MAPPING))]
+
+
+def streamed_jsonl(repository: FakeRepository):
+    return iter_jsonl(export_records(repository.iter_objects("Mapping", include_vector=True), ObjectSchema.MAPPING))
+
+
+def streamed_parquet(repository: FakeRepository):
+    records = export_records(repository.iter_objects("Mapping", include_vector=True), ObjectSchema.MAPPING)
+    return iter_parquet(records, ObjectSchema.MAPPING)
+
+
+def measure(export, repository: FakeRepository) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in export(repository))
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds, "mb": size / 1024**2, "peak_mb": peak / 1024**2}
+
+
+def run(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    repository = FakeRepository()
+    models = {
+        f"benchmark-{index}": FakeVectorizer(f"benchmark-{index}", args.dimensions) for index in range(args.models)
+    }
+    seed(repository, models, ["BENCHMARK"], args.concepts)
+    runs = {
+        "collected_jsonl": measure(collected, repository),
+        "streamed_jsonl": measure(streamed_jsonl, repository),
+        "streamed_parquet": measure(streamed_parquet, repository),
+    }
+    return {"mappings": repository.count("Mapping"), "runs": runs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=20_000)
+    parser.add_argument("--models", type=int, default=1)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,130 @@
+"""One fan-out data dictionary request compared with one request per terminology and model.
+
+Seeds ``--terminologies`` terminologies with ``--concepts`` concepts each and mappings for ``--models`` models in the
+in-memory Weaviate stand-in, then maps a dictionary of ``--rows`` rows against all of them, once with a separate
+``POST /mappings/dict`` request per terminology and model and once with a single request that lists them all. Prints
+wall time, embedded texts and searches of both as JSON::
+
+    python -m benchmarks.fan_out --terminologies 3 --models 2 --rows 1000 --embed-latency-per-text 0.001
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+from datastew.repository.model import Concept, Mapping, Terminology
+
+from benchmarks.hybrid_search import CountingVectorizer
+from benchmarks.load import TEXTS
+from benchmarks.standins import FakeRepository
+
+
+class CountingRepository(FakeRepository):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.searches = 0
+
+    def get_closest_mappings(self, *args, **kwargs):
+        self.searches += 1
+        return super().get_closest_mappings(*args, **kwargs)
+
+
+def seed(repository: FakeRepository, vectorizers: dict, terminologies: list[str], concepts: int):
+    for t, name in enumerate(terminologies):
+        terminology = Terminology(name, f"benchmark-terminology-{t}")
+        repository.store(terminology)
+        for i in range(concepts):
+            label = f"{random.choice(TEXTS)} {i}"
+            concept = Concept(terminology, label, f"{name}:{i}", f"benchmark-concept-{t}-{i}")
+            repository.store(concept)
+            for model, vectorizer in vectorizers.items():
+                repository.store(Mapping(concept, label, vectorizer.embed(label), model))
+
+
+def dictionary_csv(rows: int) -> bytes:
+    lines = ["variable,description"] + [f"var_{i},{random.choice(TEXTS)} {i}" for i in range(rows)]
+    return "\n".join(lines).encode()
+
+
+def run(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        # The API modules read their configuration on import
+        os.environ["JOB_DB_PATH"] = os.path.join(directory, "jobs.db")
+        os.environ["VISUALIZATION_DIR"] = os.path.join(directory, "visualization")
+        from starlette.testclient import TestClient
+
+        from app.dependencies import client_pool, result_cache
+        from app.main import app
+        from app.models import embedding_cache, vectorizer_registry
+
+        models = [f"benchmark-{m}" for m in range(args.models)]
+        terminologies = [f"BENCHMARK{t}" for t in range(args.terminologies)]
+        vectorizers = {
+            model: CountingVectorizer(model, args.dimensions, args.embed_latency, args.embed_latency_per_text)
+            for model in models
+        }
+        for model, vectorizer in vectorizers.items():
+            vectorizer_registry.register(model, vectorizer)
+        repository = CountingRepository(args.search_latency)
+        seed(repository, vectorizers, terminologies, args.concepts)
+
+        @asynccontextmanager
+        async def lifespan(_):
+            client_pool.factory = lambda: repository
+            client_pool.open()
+            yield
+            client_pool.close()
+
+        app.router.lifespan_context = lifespan
+        content = dictionary_csv(args.rows)
+
+        def measure(requests: list[dict]) -> dict:
+            result_cache.clear()
+            embedding_cache.clear()
+            repository.searches = 0
+            for vectorizer in vectorizers.values():
+                vectorizer.texts = 0
+            start = time.perf_counter()
+            for data in requests:
+                files = {"file": ("dictionary.csv", content, "text/csv")}
+                response = http.post("/mappings/dict", files=files, data={**data, "limit": args.limit})
+                response.raise_for_status()
+            return {
+                "requests": len(requests),
+                "seconds": time.perf_counter() - start,
+                "embedded_texts": sum(vectorizer.texts for vectorizer in vectorizers.values()),
+                "searches": repository.searches,
+            }
+
+        with TestClient(app) as http:
+            separate = measure(
+                [{"terminology_name": name, "model": model} for model in models for name in terminologies]
+            )
+            fan_out = measure([{"terminology_name": terminologies, "model": models}])
+    return {
+        "terminologies": args.terminologies,
+        "models": args.models,
+        "rows": args.rows,
+        "separate": separate,
+        "fan_out": fan_out,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminologies", type=int, default=3)
+    parser.add_argument("--models", type=int, default=2)
+    parser.add_argument("--concepts", type=int, default=2_000)
+    parser.add_argument("--rows", type=int, default=1_000)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.001)
+    parser.add_argument("--search-latency", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,112 @@
+"""Latency, embedding calls and top-1 accuracy of the vector and hybrid search modes.
+
+Stores ``--concepts`` concepts with one mapping each in the in-memory Weaviate stand-in, builds the lexical index and
+issues identifier queries (concept IDs with and without prefix, exact labels) and free text queries (labels with an
+extra word) in both modes, printing the results per mode and query kind as JSON::
+
+    python -m benchmarks.hybrid_search --concepts 20000 --queries 500 --embed-latency 0.02
+
+The embedding model is the deterministic stand-in of ``benchmarks.standins``, so vector search cannot match
+identifiers by meaning; the accuracy shows what the lexical index recovers, not the quality of a real model. Hybrid
+identifier queries are only answered without embedding if they have ``--limit`` exact matches, e.g. with ``--limit 1``.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from datastew.repository.model import Concept, Mapping, Terminology
+
+from app.dependencies import lexical_index, result_cache
+from app.models import SearchMode
+from app.search import cached_closest_mappings
+from benchmarks.load import TEXTS, percentile
+from benchmarks.standins import FakeRepository, FakeVectorizer
+
+MODEL = "benchmark"
+TERMINOLOGY = "BENCHMARK"
+
+
+class CountingVectorizer(FakeVectorizer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.texts = 0
+
+    def get_embedding(self, text: str) -> list[float]:
+        self.texts += 1
+        return super().get_embedding(text)
+
+    def get_embeddings(self, texts, *args, **kwargs) -> list[list[float]]:
+        self.texts += len(texts)
+        return super().get_embeddings(texts, *args, **kwargs)
+
+
+def seed(repository: FakeRepository, vectorizer: FakeVectorizer, concepts: int) -> list[Concept]:
+    terminology = Terminology(TERMINOLOGY, "benchmark-terminology")
+    repository.store(terminology)
+    stored = []
+    for i in range(concepts):
+        label = f"{random.choice(TEXTS)} {i}"
+        concept = Concept(terminology, label, f"BM:{i:07d}", f"benchmark-concept-{i}")
+        repository.store(concept)
+        repository.store(Mapping(concept, label, vectorizer.embed(label), MODEL))
+        stored.append(concept)
+    return stored
+
+
+def queries(concepts: list[Concept], count: int) -> dict[str, list[tuple[str, str]]]:
+    sample = random.sample(concepts, min(count, len(concepts)))
+    identifiers = []
+    for concept in sample:
+        query = random.choice(
+            [concept.concept_identifier, concept.concept_identifier.partition(":")[2], concept.pref_label.upper()]
+        )
+        identifiers.append((query, concept.concept_identifier))
+    free_text = [(f"{concept.pref_label} value", concept.concept_identifier) for concept in sample]
+    return {"identifier": identifiers, "free_text": free_text}
+
+
+def run(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    vectorizer = CountingVectorizer(MODEL, args.dimensions, args.embed_latency)
+    repository = FakeRepository(args.search_latency)
+    concepts = seed(repository, vectorizer, args.concepts)
+    start = time.perf_counter()
+    lexical_index.build(repository, [TERMINOLOGY])
+    build_seconds = time.perf_counter() - start
+
+    results = {}
+    for mode in SearchMode:
+        results[mode.value] = {}
+        for kind, items in queries(concepts, args.queries).items():
+            result_cache.clear()
+            vectorizer.texts = 0
+            latencies, hits = [], 0
+            for query, expected in items:
+                start = time.perf_counter()
+                found = cached_closest_mappings(
+                    repository, {MODEL: vectorizer}, [query], [TERMINOLOGY], args.limit, mode
+                )
+                latencies.append(time.perf_counter() - start)
+                hits += bool(found[0]) and found[0][0]["concept"]["id"] == expected
+            results[mode.value][kind] = {
+                "queries": len(items),
+                "embedded_texts": vectorizer.texts,
+                "top1_accuracy": hits / len(items),
+                "p50_ms": percentile(latencies, 0.5) * 1000,
+                "p99_ms": percentile(latencies, 0.99) * 1000,
+            }
+    return {"concepts": args.concepts, "lexical_build_seconds": build_seconds, "modes": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--search-latency", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,92 @@
+"""Throughput benchmark for the streaming JSONL import.
+
+Generates Terminology, Concept and Mapping JSONL files with random vectors, imports them with the same code path as
+the ``/imports/jsonl`` job and prints objects per second and peak RSS as JSON::
+
+    python -m benchmarks.jsonl_import --lines 1000000 --batch-size 500 --concurrency 4
+
+Uses the Weaviate instance from ``WEAVIATE_URL``, or an embedded instance with ``--memory``.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import uuid
+
+from datastew.repository import WeaviateRepository
+
+from app.models import MODEL_NAME, ObjectSchema, WeaviateClient, vectorizer_registry
+from app.tasks.import_tasks import iter_jsonl_import
+
+
+def write_files(directory: str, lines: int, dimensions: int) -> dict[ObjectSchema, str]:
+    terminology_id = str(uuid.uuid4())
+    paths = {schema: os.path.join(directory, f"{schema.value}.jsonl") for schema in ObjectSchema}
+    with open(paths[ObjectSchema.TERMINOLOGY], "w") as file:
+        file.write(json.dumps({"class": "Terminology", "id": terminology_id, "properties": {"name": "BENCHMARK"}}))
+    with open(paths[ObjectSchema.CONCEPT], "w") as concepts, open(paths[ObjectSchema.MAPPING], "w") as mappings:
+        for i in range(lines):
+            concept_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"benchmark/{i}"))
+            concept = {
+                "class": "Concept",
+                "id": concept_id,
+                "properties": {"conceptID": f"BM:{i}", "prefLabel": f"benchmark concept {i}"},
+                "references": {"hasTerminology": terminology_id},
+            }
+            mapping = {
+                "class": "Mapping",
+                "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"benchmark/mapping/{i}")),
+                "properties": {"text": f"benchmark concept {i}", "hasSentenceEmbedder": "benchmark"},
+                "references": {"hasConcept": concept_id},
+                "vector": {"default": [random.random() for _ in range(dimensions)]},
+            }
+            concepts.write(json.dumps(concept) + "\n")
+            mappings.write(json.dumps(mapping) + "\n")
+    return paths
+
+
+def connect(memory: bool, directory: str) -> WeaviateClient:
+    if not memory:
+        return WeaviateClient()
+    vectorizer = vectorizer_registry.get(MODEL_NAME, cached=False)
+    return WeaviateRepository(mode="memory", path=directory, vectorizer=vectorizer)
+
+
+def run(args: argparse.Namespace) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_files(directory, args.lines, args.dimensions)
+        client = connect(args.memory, os.path.join(directory, "weaviate"))
+        try:
+            for schema, path in paths.items():
+                start = time.perf_counter()
+                written = failed = 0
+                for chunk in iter_jsonl_import(client, path, schema, args.batch_size, args.concurrency):
+                    written += chunk["written"]
+                    failed += chunk["failed"]
+                elapsed = time.perf_counter() - start
+                results[schema.value] = {
+                    "objects": written,
+                    "failed": failed,
+                    "seconds": elapsed,
+                    "objects_per_second": written / elapsed if elapsed else 0.0,
+                    "file_bytes": os.path.getsize(path),
+                }
+        finally:
+            client.client.close()
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--memory", action="store_true", help="Use an embedded Weaviate instance")
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,107 @@
+"""Mixed-traffic load benchmark against a running KITSUNE API.
+
+Cheap metadata requests, single-text searches and data dictionary uploads are fired concurrently for a fixed duration
+and the latency percentiles per route are printed as JSON, e.g.::
+
+    python -m benchmarks.load --url http://localhost:5000 --duration 60 --concurrency 32 > after.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+TEXTS = ["age", "sex", "systolic blood pressure", "body mass index", "smoking status", "date of birth"]
+
+
+def dictionary_file(rows: int) -> bytes:
+    buffer = io.StringIO()
+    buffer.write("variable,description\n")
+    for i in range(rows):
+        buffer.write(f"var_{i},{random.choice(TEXTS)} {i}\n")
+    return buffer.getvalue().encode()
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def request(client: httpx.AsyncClient, route: str, args: argparse.Namespace):
+    if route == "version":
+        return await client.get("/version")
+    if route == "terminologies":
+        return await client.get("/terminologies/")
+    if route == "total-number":
+        return await client.get("/concepts/total-number")
+    if route == "search":
+        data = {"text": random.choice(TEXTS), "terminology_name": args.terminology, "model": args.model, "limit": 5}
+        return await client.post("/mappings/", data=data)
+    files = {"file": ("dictionary.csv", dictionary_file(args.dictionary_rows), "text/csv")}
+    data = {"terminology_name": args.terminology, "model": args.model, "limit": 1}
+    return await client.post("/mappings/dict", files=files, data=data)
+
+
+async def worker(client: httpx.AsyncClient, args: argparse.Namespace, deadline: float, latencies: dict, errors: dict):
+    routes, weights = zip(*args.mix.items())
+    while time.monotonic() < deadline:
+        route = random.choices(routes, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await request(client, route, args)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        latencies.setdefault(route, []).append(time.perf_counter() - start)
+        if failed:
+            errors[route] = errors.get(route, 0) + 1
+
+
+async def main(args: argparse.Namespace) -> dict:
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    deadline = time.monotonic() + args.duration
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client, args, deadline, latencies, errors) for _ in range(args.concurrency)))
+    return {
+        "url": args.url,
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "routes": {
+            route: {
+                "requests": len(values),
+                "errors": errors.get(route, 0),
+                "throughput": len(values) / args.duration,
+                "mean": statistics.fmean(values),
+                "p50": percentile(values, 0.5),
+                "p99": percentile(values, 0.99),
+            }
+            for route, values in sorted(latencies.items())
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--model", default="nomic-embed-text")
+    parser.add_argument("--terminology", default="OHDSI")
+    parser.add_argument("--dictionary-rows", type=int, default=500)
+    parser.add_argument(
+        "--mix",
+        type=json.loads,
+        default={"version": 4, "terminologies": 4, "total-number": 4, "search": 6, "dictionary": 1},
+        help="JSON object mapping route names to relative weights",
+    )
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
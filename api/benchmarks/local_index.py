@@ -0,0 +1,80 @@
+"""Recall and latency of the in-process search index compared with the remote Weaviate search.
+
+Builds the local index for one terminology, then issues the same queries against both paths and prints recall@k of
+the local results against Weaviate's and the latency percentiles of both as JSON::
+
+    python -m benchmarks.local_index --terminology OHDSI --model nomic-embed-text --queries 500 --limit 10
+
+Queries are the stored mapping vectors with Gaussian noise added, so no embedding model needs to be running.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.local_index import LocalIndexRegistry
+from app.models import WeaviateClient
+from benchmarks.load import percentile
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    return {
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    registry = LocalIndexRegistry([args.terminology])
+    with WeaviateClient() as client:
+        start = time.perf_counter()
+        registry.build(client)
+        build_seconds = time.perf_counter() - start
+        index = registry.get(args.terminology, args.model)
+        if index is None:
+            raise SystemExit(f"No mappings found for {args.terminology} and {args.model}")
+
+        rng = np.random.default_rng(args.seed)
+        sample = rng.choice(len(index.rows), size=min(args.queries, len(index.rows)), replace=False)
+        queries = np.asarray(index.vectors[sample]) + rng.normal(0, args.noise, (len(sample), index.vectors.shape[1]))
+
+        local_latencies, remote_latencies, recalls = [], [], []
+        for query in queries.astype(np.float32).tolist():
+            start = time.perf_counter()
+            local = index.search(query, args.limit)
+            local_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            remote = client.get_closest_mappings(query, True, args.terminology, args.model, args.limit)
+            remote_latencies.append(time.perf_counter() - start)
+
+            expected = {(result.mapping.concept.concept_identifier, result.mapping.text) for result in remote}
+            found = {(result["concept"]["id"], result["text"]) for result in local}
+            recalls.append(len(expected & found) / len(expected) if expected else 1.0)
+
+    return {
+        "terminology": args.terminology,
+        "model": args.model,
+        "mappings": len(index),
+        "dimensions": int(index.vectors.shape[1]),
+        "index_mb": index.vectors.nbytes / 1024**2,
+        "build_seconds": build_seconds,
+        "queries": len(recalls),
+        f"recall_at_{args.limit}": sum(recalls) / len(recalls),
+        "local": latency_summary(local_latencies),
+        "remote": latency_summary(remote_latencies),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminology", default="OHDSI")
+    parser.add_argument("--model", default="nomic-embed-text")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
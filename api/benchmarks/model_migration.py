@@ -0,0 +1,96 @@
+"""Throughput of migrating the stored mappings to another embedding model.
+
+Seeds ``--concepts`` concepts with one mapping each for a source model in the in-memory Weaviate stand-in and
+migrates them to a target model, printing wall time, embedded texts and written mappings per run as JSON::
+
+    python -m benchmarks.model_migration --concepts 20000 --embed-latency 0.05 --embed-latency-per-text 0.0005
+
+- ``small_batches``: one embedding request of ``EMBEDDING_BATCH_SIZE`` texts at a time.
+- ``batched``: large embedding batches sent by several workers while the previous batch is written.
+- ``resumed``: the same migration cancelled halfway and resumed from its checkpoint.
+- ``repeated``: the completed migration run again, which only scans and embeds nothing.
+- ``rate_limited``: the batched migration limited to ``--rate-limit`` texts per second.
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Optional
+
+from app.models import EMBEDDING_BATCH_SIZE, vectorizer_registry
+from app.tasks.migration_tasks import iter_model_migration
+from benchmarks.fan_out import seed
+from benchmarks.hybrid_search import CountingVectorizer
+from benchmarks.standins import FakeRepository
+
+SOURCE = "benchmark-source"
+TARGET = "benchmark-target"
+
+
+def migrate(
+    repository: FakeRepository, vectorizer: CountingVectorizer, stop_after: Optional[int] = None, **kwargs
+) -> dict:
+    vectorizer.texts = 0
+    start = time.perf_counter()
+    written, after = 0, kwargs.pop("after", None)
+    for chunk in iter_model_migration(repository, TARGET, SOURCE, after, **kwargs):
+        written += chunk["written"]
+        after = chunk["after"]
+        if stop_after is not None and written >= stop_after:
+            break
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "embedded_texts": vectorizer.texts,
+        "written": written,
+        "texts_per_second": vectorizer.texts / seconds,
+        "after": after,
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    source = CountingVectorizer(SOURCE, args.dimensions)
+    target = CountingVectorizer(TARGET, args.dimensions, args.embed_latency, args.embed_latency_per_text)
+    vectorizer_registry.register(TARGET, target)
+
+    def repository() -> FakeRepository:
+        seeded = FakeRepository()
+        seed(seeded, {SOURCE: source}, ["BENCHMARK"], args.concepts)
+        return seeded
+
+    batched = {"embed_batch_size": args.embed_batch_size, "embed_workers": args.embed_workers}
+    results = {
+        "small_batches": migrate(repository(), target, embed_batch_size=EMBEDDING_BATCH_SIZE, embed_workers=1),
+    }
+    migrated = repository()
+    results["batched"] = migrate(migrated, target, **batched)
+    results["repeated"] = migrate(migrated, target, **batched)
+
+    interrupted = repository()
+    first = migrate(interrupted, target, stop_after=args.concepts // 2, **batched)
+    second = migrate(interrupted, target, after=first["after"], **batched)
+    results["resumed"] = {
+        "seconds": first["seconds"] + second["seconds"],
+        "embedded_texts": first["embedded_texts"] + second["embedded_texts"],
+        "written": first["written"] + second["written"],
+    }
+    if args.rate_limit:
+        results["rate_limited"] = migrate(repository(), target, rate_limit=args.rate_limit, **batched)
+    for result in results.values():
+        result.pop("after", None)
+    return {"concepts": args.concepts, "runs": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=20_000)
+    parser.add_argument("--embed-batch-size", type=int, default=512)
+    parser.add_argument("--embed-workers", type=int, default=2)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.0005)
+    parser.add_argument("--rate-limit", type=float, default=1_000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,84 @@
+"""Throughput of the OLS terminology import against a local OLS stand-in.
+
+Imports a generated terminology of ``--terms`` terms three times and prints wall time, OLS requests and terms
+written per run as JSON::
+
+    python -m benchmarks.ols_import --terms 20000 --ols-latency 0.2 --embed-latency 0.05
+
+- ``sequential``: one fetch and one embedding request at a time, like the former fetch -> embed -> store loop.
+- ``pipelined``: concurrent fetches and embedding workers, with the stages running concurrently.
+- ``cached``: the same terminology imported with another model from the term cache, without requests to OLS.
+
+Weaviate is replaced by the in-memory stand-in, so the write stage costs next to nothing.
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from app.ols import OLSTermCache
+from app.tasks.import_tasks import iter_ols_import
+from benchmarks.standins import FakeRepository, FakeVectorizer, LocalOLS
+
+TERMINOLOGY = "bench"
+
+
+def import_terminology(ols: LocalOLS, cache: OLSTermCache, model: str, args: argparse.Namespace, workers: int) -> dict:
+    from app.models import embedding_cache
+
+    embedding_cache.clear()
+    repository = FakeRepository()
+    requests = ols.requests
+    start = time.perf_counter()
+    written = 0
+    for chunk in iter_ols_import(
+        repository,
+        cache,
+        TERMINOLOGY,
+        TERMINOLOGY,
+        model,
+        embed_batch_size=args.embed_batch_size,
+        embed_workers=workers,
+    ):
+        written += chunk["written"]
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "terms_per_second": written / seconds,
+        "written": written,
+        "ols_requests": ols.requests - requests,
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    from app.models import vectorizer_registry
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    for model in ("benchmark-a", "benchmark-b"):
+        vectorizer_registry.register(model, FakeVectorizer(model, args.dimensions, args.embed_latency))
+    results = {}
+    with LocalOLS(args.terms, args.ols_latency) as ols, tempfile.TemporaryDirectory() as directory:
+        sequential = OLSTermCache(os.path.join(directory, "sequential"), ols.url, args.page_size, concurrency=1)
+        results["sequential"] = import_terminology(ols, sequential, "benchmark-a", args, workers=1)
+        cache = OLSTermCache(os.path.join(directory, "pipelined"), ols.url, args.page_size, args.fetch_concurrency)
+        results["pipelined"] = import_terminology(ols, cache, "benchmark-a", args, args.embed_workers)
+        results["cached"] = import_terminology(ols, cache, "benchmark-b", args, args.embed_workers)
+        cache_dir = os.path.join(directory, "pipelined", TERMINOLOGY)
+        cache_bytes = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+    return {"terms": args.terms, "page_size": args.page_size, "cache_mb": cache_bytes / 1024**2, "runs": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terms", type=int, default=20_000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--ols-latency", type=float, default=0.2)
+    parser.add_argument("--fetch-concurrency", type=int, default=4)
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--embed-workers", type=int, default=2)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--dimensions", type=int, default=384)
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,159 @@
+"""Memory and recall of the vector storage modes compared with full precision float32 vectors.
+
+Simulates Weaviate's scalar (sq), binary (bq) and product (pq) quantization as well as Matryoshka truncation
+(``<model>@<dimensions>``) on a set of vectors, and prints the vector memory per million mappings and recall@k
+against an exact full precision search, with and without rescoring, as JSON::
+
+    python -m benchmarks.quantization --vectors 100000 --dimensions 768 --limit 10 --rescore-limit 200
+    python -m benchmarks.quantization --model nomic-embed-text --vectors 100000
+
+With ``--model`` the stored vectors of that model are sampled from the Weaviate Mapping collection, otherwise
+clustered random vectors are used. Truncation results are only meaningful for vectors of Matryoshka models.
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+# Weaviate's default maxConnections; layer 0 of the HNSW graph keeps twice as many links of 8 bytes per object
+HNSW_LINK_BYTES = 2 * 32 * 8
+
+
+def synthetic_vectors(count: int, dimensions: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(max(1, count // 100), dimensions))
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.5 * rng.normal(size=(count, dimensions))
+    return vectors.astype(np.float32)
+
+
+def weaviate_vectors(model: str, count: int) -> np.ndarray:
+    from app.models import WeaviateClient
+    from app.projection import mapping_vectors
+
+    vectors = []
+    with WeaviateClient() as client:
+        objects = client.client.collections.get("Mapping").iterator(
+            include_vector=True, return_properties=["hasSentenceEmbedder"]
+        )
+        for obj in objects:
+            vectors.extend(vector for name, vector in mapping_vectors(obj) if name == model)
+            if len(vectors) >= count:
+                break
+    if not vectors:
+        raise SystemExit(f"No vectors stored for model {model}")
+    return np.asarray(vectors[:count], dtype=np.float32)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)]))
+
+
+def rescored(candidates: np.ndarray, vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = np.einsum("qd,qcd->qc", queries, vectors[candidates])
+    return np.take_along_axis(candidates, np.argsort(-scores, axis=1)[:, :k], axis=1)
+
+
+def scalar_scores(vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    low, high = vectors.min(), vectors.max()
+    codes = np.round((vectors - low) / (high - low) * 255).astype(np.uint8)
+    return queries @ (codes.astype(np.float32) / 255 * (high - low) + low).T
+
+
+def binary_scores(vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    bit_counts = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.float32)
+    codes = np.packbits(vectors > 0, axis=1)
+    # Negative Hamming distance, one query at a time to keep the XOR matrix small
+    return np.stack([-bit_counts[query ^ codes].sum(axis=1) for query in np.packbits(queries > 0, axis=1)])
+
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.argmin((centroids**2).sum(axis=1) - 2 * vectors @ centroids.T, axis=1)
+
+
+def product_scores(
+    vectors: np.ndarray, queries: np.ndarray, segments: int, rng: np.random.Generator, iterations: int = 10
+) -> np.ndarray:
+    scores = np.zeros((len(queries), len(vectors)), dtype=np.float32)
+    training = vectors[rng.choice(len(vectors), min(len(vectors), 20_000), replace=False)]
+    for segment in np.array_split(np.arange(vectors.shape[1]), segments):
+        sub = training[:, segment]
+        centroids = sub[rng.choice(len(sub), min(256, len(sub)), replace=False)]
+        for _ in range(iterations):
+            assignment = nearest(sub, centroids)
+            for c in range(len(centroids)):
+                members = sub[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+        codes = nearest(vectors[:, segment], centroids)
+        scores += (queries[:, segment] @ centroids.T)[:, codes]
+    return scores
+
+
+def run(args: argparse.Namespace) -> dict:
+    rng = np.random.default_rng(args.seed)
+    if args.model:
+        vectors = normalize(weaviate_vectors(args.model, args.vectors))
+    else:
+        vectors = normalize(synthetic_vectors(args.vectors, args.dimensions, rng))
+    dimensions = vectors.shape[1]
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = normalize(queries + 0.05 * rng.normal(size=queries.shape))
+    k, rescore_limit = args.limit, min(args.rescore_limit, len(vectors))
+    expected = top_k(queries @ vectors.T, k)
+
+    segments = args.segments or max(1, dimensions // 4)
+    modes = {
+        "sq": (dimensions, lambda: scalar_scores(vectors, queries)),
+        "bq": (dimensions / 8, lambda: binary_scores(vectors, queries)),
+        "pq": (segments, lambda: product_scores(vectors, queries, segments, rng)),
+    }
+    for truncated in args.truncate:
+        if truncated < dimensions:
+            modes[f"@{truncated}"] = (
+                truncated * 4,
+                lambda truncated=truncated: normalize(queries[:, :truncated]) @ normalize(vectors[:, :truncated]).T,
+            )
+
+    million = 1_000_000 / 1024**2
+    results = {
+        "vectors": len(vectors),
+        "dimensions": dimensions,
+        "limit": k,
+        "rescore_limit": rescore_limit,
+        "full": {"vector_mb_per_million": dimensions * 4 * million, "recall": 1.0},
+        "hnsw_graph_mb_per_million": HNSW_LINK_BYTES * million,
+    }
+    for mode, (bytes_per_vector, scores) in modes.items():
+        scores = scores()
+        results[mode] = {
+            "vector_mb_per_million": bytes_per_vector * million,
+            "recall": recall(top_k(scores, k), expected),
+            "recall_rescored": recall(rescored(top_k(scores, rescore_limit), vectors, queries, k), expected),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--model", default=None, help="Sample the stored vectors of this model from Weaviate")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rescore-limit", type=int, default=200)
+    parser.add_argument("--segments", type=int, default=None, help="PQ segments, dimensions / 4 by default")
+    parser.add_argument("--truncate", type=int, nargs="*", default=[256, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,79 @@
+"""Payload size and serialization time of the data dictionary response formats.
+
+Builds synthetic mapping results for ``--rows`` rows with ``--limit`` matches each, drawn from ``--concepts``
+concepts, and prints bytes, gzipped bytes and the best serialization time out of ``--repeat`` runs as JSON::
+
+    python -m benchmarks.response_formats --rows 10000 --limit 10
+
+``json`` is the former encoder (Starlette's ``JSONResponse``), ``orjson`` the nested default format and ``ndjson`` and
+``msgpack`` the compact formats selected through the ``Accept`` header.
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+
+import msgpack
+import orjson
+
+from app.responses import compact_mapping_results, iter_compact_records
+from benchmarks.load import TEXTS
+
+
+def mapping_results(rows: int, limit: int, concepts: int) -> list[dict]:
+    terminologies = [{"id": f"terminology-{t}", "name": f"TERMINOLOGY {t}"} for t in range(3)]
+    pool = [
+        {"id": f"C{c:07d}", "name": f"{random.choice(TEXTS)} concept {c}", "terminology": random.choice(terminologies)}
+        for c in range(concepts)
+    ]
+    results = []
+    for i in range(rows):
+        matches = random.sample(pool, limit)
+        results.append(
+            {
+                "variable": f"var_{i}",
+                "description": f"{random.choice(TEXTS)} {i}",
+                "mappings": [
+                    {"concept": concept, "text": concept["name"], "similarity": random.random()} for concept in matches
+                ],
+            }
+        )
+    return results
+
+
+FORMATS = {
+    "json": lambda rows: json.dumps(rows, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode(),
+    "orjson": orjson.dumps,
+    "ndjson": lambda rows: b"".join(orjson.dumps(record) + b"\n" for record in iter_compact_records(rows)),
+    "msgpack": lambda rows: msgpack.packb(compact_mapping_results(rows)),
+}
+
+
+def run(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    rows = mapping_results(args.rows, args.limit, args.concepts)
+    results = {}
+    for name, serialize in FORMATS.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            payload = serialize(rows)
+            timings.append(time.perf_counter() - start)
+        results[name] = {
+            "bytes": len(payload),
+            "gzip_bytes": len(gzip.compress(payload, compresslevel=6)),
+            "serialize_ms": min(timings) * 1000,
+        }
+    return {"rows": args.rows, "limit": args.limit, "concepts": args.concepts, "formats": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--concepts", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,390 @@
+"""Local stand-ins for the embedding model, Weaviate and OLS, so that benchmarks run without external services."""
+
+import hashlib
+import itertools
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from datastew.repository import WeaviateRepository
+from datastew.repository.model import Concept, Mapping, MappingResult, Terminology
+from weaviate.util import generate_uuid5
+
+from app.models import WeaviateClient
+
+
+class FakeVectorizer:
+    """Deterministic embeddings derived from a hash of the text, returned after a configurable latency.
+
+    Every call sleeps ``latency`` seconds plus ``latency_per_text`` seconds per text, approximating a model server
+    that has a fixed overhead per request and a cost per embedded text.
+    """
+
+    def __init__(self, model_name: str, dimensions: int = 384, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+
+    def embed(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def get_embedding(self, text: str) -> list[float]:
+        time.sleep(self.latency + self.latency_per_text)
+        return self.embed(text)
+
+    def get_embeddings(self, texts: Sequence[str], *args, **kwargs) -> list[list[float]]:
+        time.sleep(self.latency + self.latency_per_text * len(texts))
+        return [self.embed(text) for text in texts]
+
+
+class _FakeBatch:
+    def __init__(self, collection: "_FakeCollection"):
+        self.collection = collection
+        self.failed_objects: list = []
+
+    @contextmanager
+    def _batcher(self):
+        yield self
+
+    def dynamic(self):
+        return self._batcher()
+
+    def fixed_size(self, batch_size: int = 100, concurrent_requests: int = 2):
+        return self._batcher()
+
+    def add_object(self, properties: dict, uuid: Optional[str] = None, references=None, vector=None):
+        self.collection.repository.add_object(self.collection.name, properties, str(uuid), references or {}, vector)
+
+
+class _FakeCollection:
+    def __init__(self, repository: "FakeRepository", name: str):
+        self.repository = repository
+        self.name = name
+        self.batch = _FakeBatch(self)
+
+        self.query = SimpleNamespace(fetch_objects=self._fetch_objects)
+        self.aggregate = SimpleNamespace(over_all=self._over_all)
+
+    def iterator(self, include_vector: bool = False, after: Optional[str] = None, **kwargs):
+        return self.repository.iter_objects(self.name, after, include_vector)
+
+    def _fetch_objects(
+        self, filters=None, limit: Optional[int] = None, after: Optional[str] = None, include_vector=False, **kwargs
+    ):
+        if filters is None:
+            objects = itertools.islice(self.repository.iter_objects(self.name, after, include_vector), limit)
+            return SimpleNamespace(objects=list(objects))
+        # Of the filters, only the lookup of concepts and mappings by ID is supported
+        existing = self.repository.object_ids(self.name) if filters.target == "_id" else set()
+        return SimpleNamespace(objects=[SimpleNamespace(uuid=uuid) for uuid in filters.value if uuid in existing])
+
+    def _over_all(self, total_count: bool = True, filters=None):
+        # Counts of all objects or of the mappings of one model
+        if filters is not None:
+            return SimpleNamespace(total_count=self.repository.count_mappings(filters.value))
+        return SimpleNamespace(total_count=self.repository.count(self.name))
+
+
+class _FakeCollections:
+    def __init__(self, repository: "FakeRepository"):
+        self.repository = repository
+
+    def get(self, name: str) -> _FakeCollection:
+        return _FakeCollection(self.repository, name)
+
+
+class _FakeWeaviate:
+    def __init__(self, repository: "FakeRepository"):
+        self.collections = _FakeCollections(repository)
+
+    def close(self):
+        pass
+
+
+class FakeRepository:
+    """In-memory replacement for the parts of :class:`WeaviateClient` used by the API.
+
+    Closest mappings are found by an exact search over the vectors of the requested terminology and model; every
+    query sleeps ``search_latency`` seconds to stand in for the network round trip to Weaviate. The batch interface of
+    ``client.collections`` is supported, so that the JSONL import and bulk creation paths can write to it.
+    """
+
+    use_weaviate_vectorizer = False
+
+    def __init__(self, search_latency: float = 0.0):
+        self.search_latency = search_latency
+        self.client = _FakeWeaviate(self)
+        self._terminologies: dict[str, Terminology] = {}
+        self._concepts: dict[str, Concept] = {}
+        self._concepts_by_id: dict[str, Concept] = {}
+        self._mappings: dict[tuple[str, str], list[tuple[Concept, str, list[float]]]] = {}
+        self._matrices: dict[tuple[str, str], np.ndarray] = {}
+        self._mapping_ids: set[str] = set()
+        self._lock = threading.Lock()
+
+    def is_ready(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            if collection == "Terminology":
+                return len(self._terminologies)
+            if collection == "Concept":
+                return len(self._concepts)
+            return sum(len(mappings) for mappings in self._mappings.values())
+
+    def count_mappings(self, model: str) -> int:
+        with self._lock:
+            return sum(
+                len(mappings) for (_, mapping_model), mappings in self._mappings.items() if mapping_model == model
+            )
+
+    def object_ids(self, collection: str) -> set[str]:
+        with self._lock:
+            if collection == "Concept":
+                return set(self._concepts)
+            return set(self._mapping_ids) if collection == "Mapping" else set()
+
+    def add_object(self, collection: str, properties: dict, uuid: str, references: dict, vector):
+        with self._lock:
+            if collection == "Terminology":
+                self._terminologies[uuid] = Terminology(properties["name"], uuid)
+            elif collection == "Concept":
+                terminology = self._terminologies[references["hasTerminology"]]
+                concept = Concept(terminology, properties["prefLabel"], properties["conceptID"], uuid)
+                self._concepts[uuid] = concept
+                self._concepts_by_id[concept.concept_identifier] = concept
+            else:
+                if isinstance(vector, dict):
+                    vector = next(iter(vector.values()))
+                concept = self._concepts[references["hasConcept"]]
+                self._add_mapping(concept, properties["text"], vector, properties["hasSentenceEmbedder"])
+
+    def store(self, obj):
+        with self._lock:
+            if isinstance(obj, Terminology):
+                self._terminologies[obj.id] = obj
+            elif isinstance(obj, Concept):
+                self._terminologies.setdefault(obj.terminology.id, obj.terminology)
+                self._concepts[obj.id] = obj
+                self._concepts_by_id[obj.concept_identifier] = obj
+            else:
+                self._add_mapping(obj.concept, obj.text, obj.embedding, obj.sentence_embedder)
+
+    def _add_mapping(self, concept: Concept, text: str, vector: Sequence[float], model: str):
+        key = (concept.terminology.name, model)
+        self._mappings.setdefault(key, []).append((concept, text, list(vector)))
+        self._matrices.pop(key, None)
+        self._mapping_ids.add(self._mapping_uuid(text, model))
+
+    @staticmethod
+    def _mapping_uuid(text: str, model: str) -> str:
+        # The UUID datastew's ``store`` assigns to a mapping
+        return str(generate_uuid5({"text": text, "hasSentenceEmbedder": model}))
+
+    @staticmethod
+    def _terminology_object(terminology: Terminology) -> SimpleNamespace:
+        return SimpleNamespace(uuid=terminology.id, properties={"name": terminology.name}, references=None, vector={})
+
+    def _concept_object(self, concept: Concept) -> SimpleNamespace:
+        return SimpleNamespace(
+            uuid=concept.id,
+            properties={"conceptID": concept.concept_identifier, "prefLabel": concept.pref_label},
+            references={"hasTerminology": SimpleNamespace(objects=[self._terminology_object(concept.terminology)])},
+            vector={},
+        )
+
+    def iter_objects(self, collection: str, after: Optional[str] = None, include_vector: bool = False):
+        """Objects shaped like those of the Weaviate iterator, with their references, in UUID order starting after
+        ``after``."""
+        with self._lock:
+            if collection == "Terminology":
+                items = [(str(uuid), terminology) for uuid, terminology in self._terminologies.items()]
+            elif collection == "Concept":
+                items = [(str(uuid), concept) for uuid, concept in self._concepts.items()]
+            else:
+                items = [
+                    (self._mapping_uuid(mapping[1], model), (model, mapping))
+                    for (_, model), mappings in self._mappings.items()
+                    for mapping in mappings
+                ]
+        items.sort(key=lambda item: item[0])
+        for uuid, item in items:
+            if after is not None and uuid <= after:
+                continue
+            if collection == "Terminology":
+                yield self._terminology_object(item)
+            elif collection == "Concept":
+                yield self._concept_object(item)
+            else:
+                model, (concept, text, vector) = item
+                yield SimpleNamespace(
+                    uuid=uuid,
+                    properties={"text": text, "hasSentenceEmbedder": model},
+                    references={"hasConcept": SimpleNamespace(objects=[self._concept_object(concept)])},
+                    vector={"default": vector} if include_vector else {},
+                )
+
+    def get_concept(self, concept_id: str) -> Concept:
+        with self._lock:
+            concept = self._concepts_by_id.get(concept_id)
+        if concept is None:
+            raise RuntimeError(f"Failed to fetch concept {concept_id}: Concept {concept_id} does not exists")
+        return concept
+
+    def get_terminology(self, terminology_name: str) -> Terminology:
+        with self._lock:
+            for terminology in self._terminologies.values():
+                if terminology.name == terminology_name:
+                    return terminology
+        raise RuntimeError(f"Terminology {terminology_name} does not exists")
+
+    def get_all_terminologies(self) -> list[Terminology]:
+        with self._lock:
+            return list(self._terminologies.values())
+
+    def get_all_sentence_embedders(self) -> list[str]:
+        with self._lock:
+            return sorted({model for _, model in self._mappings})
+
+    def get_closest_mappings(
+        self,
+        embedding: Sequence[float],
+        similarities: bool = False,
+        terminology_name: Optional[str] = None,
+        sentence_embedder: Optional[str] = None,
+        limit: int = 5,
+    ):
+        time.sleep(self.search_latency)
+        key = (terminology_name, sentence_embedder)
+        with self._lock:
+            if not any(terminology.name == terminology_name for terminology in self._terminologies.values()):
+                raise ValueError(f"Terminology '{terminology_name}' not found in available terminologies.")
+            mappings = self._mappings.get(key, [])
+            matrix = self._matrices.get(key)
+            if matrix is None and mappings:
+                matrix = np.asarray([vector for _, _, vector in mappings], dtype=np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                self._matrices[key] = matrix
+        if not mappings:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        top = np.argsort(-scores)[:limit]
+        results = []
+        for i in top:
+            concept, text, _ = mappings[i]
+            mapping = Mapping(concept, text, sentence_embedder=sentence_embedder)
+            results.append(MappingResult(mapping, float(scores[i])) if similarities else mapping)
+        return results
+
+
+class EmbeddedWeaviateClient(WeaviateClient):
+    """A :class:`WeaviateClient` backed by an embedded Weaviate instance instead of ``WEAVIATE_URL``.
+
+    The instance is shared by all connections of the pool, so ``close`` is a no-op and ``stop`` shuts it down.
+    """
+
+    def __init__(self, path: str, vectorizer):
+        WeaviateRepository.__init__(self, mode="memory", path=path, vectorizer=vectorizer)
+
+    def close(self):
+        pass
+
+    def stop(self):
+        WeaviateClient.close(self)
+
+
+class LocalOLS:
+    """Local HTTP stand-in for the paged ``/ontologies/{id}/terms`` endpoint of OLS.
+
+    Every ontology has ``terms`` generated terms, every ``unlabeled_every``-th of them without a label and every other
+    one with a description. Responses are delayed by ``latency`` seconds, concurrent requests are served in parallel.
+    Point ``OLS_API_URL`` or :class:`app.ols.OLSTermCache` at :attr:`url`.
+    """
+
+    def __init__(self, terms: int = 10_000, latency: float = 0.0, unlabeled_every: int = 50):
+        self.terms = terms
+        self.latency = latency
+        self.unlabeled_every = unlabeled_every
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-ols", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "LocalOLS":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def term(self, ontology: str, i: int) -> dict:
+        prefix = ontology.upper()
+        term = {"iri": f"http://purl.obolibrary.org/obo/{prefix}_{i:07d}", "short_form": f"{prefix}_{i:07d}"}
+        if i % self.unlabeled_every:
+            term.update(label=f"{ontology} term {i}", obo_id=f"{prefix}:{i:07d}")
+            if i % 2:
+                term["description"] = [f"Description of {ontology} term {i}"]
+        return term
+
+    def page(self, ontology: str, page: int, size: int) -> dict:
+        start = page * size
+        terms = [self.term(ontology, i) for i in range(start, min(start + size, self.terms))]
+        return {
+            "_embedded": {"terms": terms},
+            "page": {
+                "size": size,
+                "totalElements": self.terms,
+                "totalPages": math.ceil(self.terms / size),
+                "number": page,
+            },
+        }
+
+    def _handler(self):
+        ols = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = url.path.strip("/").split("/")
+                if len(parts) != 3 or parts[0] != "ontologies" or parts[2] != "terms":
+                    self.send_error(404)
+                    return
+                query = parse_qs(url.query)
+                with ols._lock:
+                    ols.requests += 1
+                time.sleep(ols.latency)
+                body = json.dumps(
+                    ols.page(parts[1], int(query.get("page", ["0"])[0]), int(query.get("size", ["20"])[0]))
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
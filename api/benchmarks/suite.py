@@ -0,0 +1,295 @@
+"""Offline benchmark suite for the search, data dictionary and import code paths.
+
+Runs the API in process against local stand-ins for the embedding model and Weaviate and prints throughput, latency
+percentiles and peak RSS per scenario as JSON, so that results of different revisions can be compared::
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --scenarios search dictionary --embed-latency 0.02 --search-latency 0.005
+    python -m benchmarks.suite --repository memory --mappings 100000
+
+Scenarios:
+
+- ``search``: single-text searches (``POST /mappings/``) from ``--concurrency`` concurrent clients.
+- ``dictionary``: data dictionary uploads (``POST /mappings/dict``) with ``--dictionary-rows`` rows.
+- ``websocket``: the same dictionaries streamed through ``/mappings/dict/ws``.
+- ``jsonl_import``: the JSONL import of the seeded terminology, concepts and mappings.
+- ``mixed``: concurrent metadata, search and dictionary requests for ``--duration`` seconds.
+
+Embeddings come from a deterministic fake model whose latency is set with ``--embed-latency`` (per call) and
+``--embed-latency-per-text``. ``--repository fake`` (default) searches in process with ``--search-latency`` added per
+query, ``--repository memory`` starts an embedded Weaviate instance instead. Every scenario runs in a fresh process,
+so caches start cold and the reported peak RSS belongs to that scenario alone.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from benchmarks.load import TEXTS, percentile
+
+MODEL = "benchmark"
+TERMINOLOGY = "BENCHMARK"
+SCENARIOS = ["search", "dictionary", "websocket", "jsonl_import", "mixed"]
+
+
+def summary(latencies: list[float], seconds: float, items: int, errors: int = 0) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": seconds,
+        "throughput": items / seconds if seconds else 0.0,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def dictionary_csv(rows: int, prefix: str) -> bytes:
+    lines = ["variable,description"]
+    lines.extend(f"var_{i},{random.choice(TEXTS)} {prefix}-{i}" for i in range(rows))
+    return "\n".join(lines).encode()
+
+
+def timed_request(func, *args, **kwargs) -> tuple[float, bool]:
+    start = time.perf_counter()
+    try:
+        failed = func(*args, **kwargs).status_code >= 400
+    except Exception:
+        failed = True
+    return time.perf_counter() - start, failed
+
+
+def search_form(i: int) -> dict:
+    return {"text": f"{random.choice(TEXTS)} {i}", "terminology_name": TERMINOLOGY, "model": MODEL, "limit": 5}
+
+
+def bench_search(http, args: argparse.Namespace) -> dict:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        results = list(
+            executor.map(lambda i: timed_request(http.post, "/mappings/", data=search_form(i)), range(args.requests))
+        )
+    seconds = time.perf_counter() - start
+    return summary([latency for latency, _ in results], seconds, len(results), sum(failed for _, failed in results))
+
+
+def bench_dictionary(http, args: argparse.Namespace) -> dict:
+    results = {}
+    for rows in args.dictionary_rows:
+        latencies, errors = [], 0
+        for repeat in range(args.repeat):
+            files = {"file": ("dictionary.csv", dictionary_csv(rows, f"dict-{repeat}"), "text/csv")}
+            data = {"terminology_name": TERMINOLOGY, "model": MODEL, "limit": 1}
+            latency, failed = timed_request(http.post, "/mappings/dict", files=files, data=data)
+            latencies.append(latency)
+            errors += failed
+        results[str(rows)] = summary(latencies, sum(latencies), rows * args.repeat, errors)
+    return results
+
+
+def stream_dictionary(http, rows: int, prefix: str) -> tuple[float, float, bool]:
+    start = time.perf_counter()
+    first_result, received = 0.0, 0
+    with http.websocket_connect("/mappings/dict/ws") as websocket:
+        websocket.send_bytes(dictionary_csv(rows, prefix))
+        websocket.send_text(
+            json.dumps({"model": MODEL, "terminology_name": TERMINOLOGY, "limit": 1, "file_extension": ".csv"})
+        )
+        while received < rows:
+            message = websocket.receive_json()
+            if message["type"] == "error":
+                return time.perf_counter() - start, first_result, True
+            if message["type"] == "result":
+                received += 1
+                if received == 1:
+                    first_result = time.perf_counter() - start
+    return time.perf_counter() - start, first_result, False
+
+
+def bench_websocket(http, args: argparse.Namespace) -> dict:
+    results = {}
+    for rows in args.dictionary_rows:
+        latencies, first_results, errors = [], [], 0
+        for repeat in range(args.repeat):
+            latency, first_result, failed = stream_dictionary(http, rows, f"ws-{repeat}")
+            latencies.append(latency)
+            first_results.append(first_result)
+            errors += failed
+        results[str(rows)] = {
+            **summary(latencies, sum(latencies), rows * args.repeat, errors),
+            "first_result_p50_ms": percentile(first_results, 0.5) * 1000,
+        }
+    return results
+
+
+def bench_mixed(http, args: argparse.Namespace) -> dict:
+    requests = {
+        "version": lambda i: http.get("/version"),
+        "terminologies": lambda i: http.get("/terminologies/"),
+        "search": lambda i: http.post("/mappings/", data=search_form(i)),
+        "dictionary": lambda i: http.post(
+            "/mappings/dict",
+            files={"file": ("dictionary.csv", dictionary_csv(args.mixed_dictionary_rows, f"mixed-{i}"), "text/csv")},
+            data={"terminology_name": TERMINOLOGY, "model": MODEL, "limit": 1},
+        ),
+    }
+    routes, weights = zip(*args.mix.items())
+    deadline = time.monotonic() + args.duration
+
+    def worker(seed: int) -> list[tuple[str, float, bool]]:
+        rng, results = random.Random(seed), []
+        while time.monotonic() < deadline:
+            route = rng.choices(routes, weights)[0]
+            results.append((route, *timed_request(requests[route], seed * 1_000_000 + len(results))))
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        results = [
+            result for worker_results in executor.map(worker, range(args.concurrency)) for result in worker_results
+        ]
+    seconds = time.perf_counter() - start
+    return {
+        route: summary(
+            [latency for name, latency, _ in results if name == route],
+            seconds,
+            sum(name == route for name, _, _ in results),
+            sum(failed for name, _, failed in results if name == route),
+        )
+        for route in routes
+    }
+
+
+def seed_repository(client, directory: str, args: argparse.Namespace) -> dict:
+    """Import ``--mappings`` concepts and mappings with random vectors through the JSONL import."""
+    from app.tasks.import_tasks import iter_jsonl_import
+    from benchmarks.jsonl_import import write_files
+
+    results = {}
+    for schema, path in write_files(directory, args.mappings, args.dimensions).items():
+        start = time.perf_counter()
+        written = failed = 0
+        for chunk in iter_jsonl_import(client, path, schema, args.batch_size, args.batch_concurrency):
+            written += chunk["written"]
+            failed += chunk["failed"]
+        seconds = time.perf_counter() - start
+        results[schema.value] = {
+            "objects": written,
+            "failed": failed,
+            "seconds": seconds,
+            "throughput": written / seconds if seconds else 0.0,
+        }
+    return results
+
+
+def run_scenario(name: str, args: argparse.Namespace) -> dict:
+    """Run one scenario against freshly seeded stand-ins. Meant to be called in a process of its own."""
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        # The API modules read their configuration on import
+        os.environ.pop("EMBEDDING_CACHE_PATH", None)
+        os.environ.pop("LOCAL_INDEX_DIR", None)
+        os.environ["JOB_DB_PATH"] = os.path.join(directory, "jobs.db")
+        os.environ["JOB_UPLOAD_DIR"] = os.path.join(directory, "uploads")
+        os.environ["VISUALIZATION_DIR"] = os.path.join(directory, "visualization")
+        from starlette.testclient import TestClient
+
+        from app.dependencies import client_pool
+        from app.main import app
+        from app.models import vectorizer_registry
+        from benchmarks.standins import EmbeddedWeaviateClient, FakeRepository, FakeVectorizer
+
+        vectorizer = FakeVectorizer(MODEL, args.dimensions, args.embed_latency, args.embed_latency_per_text)
+        vectorizer_registry.register(MODEL, vectorizer)
+        if args.repository == "memory":
+            repository = EmbeddedWeaviateClient(os.path.join(directory, "weaviate"), vectorizer)
+        else:
+            repository = FakeRepository(args.search_latency)
+
+        @asynccontextmanager
+        async def lifespan(_):
+            client_pool.factory = lambda: repository
+            client_pool.open()
+            yield
+            client_pool.close()
+
+        try:
+            imported = seed_repository(repository, directory, args)
+            if name == "jsonl_import":
+                result = imported
+            else:
+                app.router.lifespan_context = lifespan
+                with TestClient(app) as http:
+                    result = globals()[f"bench_{name}"](http, args)
+        finally:
+            if args.repository == "memory":
+                repository.stop()
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(args: argparse.Namespace) -> dict:
+    results = {
+        "timestamp": time.time(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": vars(args),
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results["scenarios"][name] = executor.submit(run_scenario, name, args).result()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--repository", choices=["fake", "memory"], default="fake")
+    parser.add_argument("--mappings", type=int, default=10_000, help="Number of seeded concepts and mappings")
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.0005)
+    parser.add_argument("--search-latency", type=float, default=0.002)
+    parser.add_argument("--requests", type=int, default=500, help="Number of single-text searches")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--dictionary-rows", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=3, help="Uploads per dictionary size")
+    parser.add_argument("--duration", type=float, default=30, help="Duration of the mixed scenario")
+    parser.add_argument("--mixed-dictionary-rows", type=int, default=100)
+    parser.add_argument(
+        "--mix",
+        type=json.loads,
+        default={"version": 4, "terminologies": 4, "search": 6, "dictionary": 1},
+        help="JSON object mapping the routes of the mixed scenario to relative weights",
+    )
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--batch-concurrency", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the results to this file instead of stdout")
+    arguments = parser.parse_args()
+    output = json.dumps(main(arguments), indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# The job store and the OLS term cache are created on import, keep them out of the working directory
+_directory = tempfile.mkdtemp(prefix="kitsune-tests-")
+os.environ.setdefault("JOB_DB_PATH", os.path.join(_directory, "jobs.db"))
+os.environ.setdefault("OLS_CACHE_DIR", os.path.join(_directory, "ols_cache"))
@@ -0,0 +1,41 @@
+import pytest
+from app.models import vectorizer_registry
+from app.routers import concepts, mappings
+from benchmarks.standins import FakeRepository, FakeVectorizer
+from datastew.repository.model import Concept, Terminology
+
+MODEL = "test-create"
+
+
+@pytest.fixture
+def repository():
+    vectorizer_registry.register(MODEL, FakeVectorizer(MODEL, 8))
+    repository = FakeRepository()
+    terminology = Terminology("Test", "00000000-0000-0000-0000-000000000001")
+    repository.store(terminology)
+    repository.store(Concept(terminology, "test concept", "TEST:1", "00000000-0000-0000-0000-000000000002"))
+    return repository
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    calls = []
+    for router in (mappings, concepts):
+        monkeypatch.setattr(router, "on_mapping_stored", lambda *args: calls.append(args))
+    return calls
+
+
+def test_repeated_mapping_is_stored_and_indexed_once(repository, stored):
+    assert mappings._create_mapping(repository, "TEST:1", "some text", MODEL)
+    assert not mappings._create_mapping(repository, "TEST:1", "some text", MODEL)
+
+    assert repository.count("Mapping") == 1
+    assert [(model, text) for model, _, text, _ in stored] == [(MODEL, "some text")]
+
+
+def test_repeated_concept_mapping_is_indexed_once(repository, stored):
+    for _ in range(2):
+        concepts._create_concept_and_attach_mapping(repository, "TEST:2", "other concept", "Test", "other text", MODEL)
+
+    assert repository.count("Mapping") == 1
+    assert len(stored) == 1
@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+from app.embedding_cache import EmbeddingCache, MemoryEmbeddingStore, SQLiteEmbeddingStore
+
+
+def embedding(seed: int, dimensions: int = 16) -> list[float]:
+    return [seed + i / dimensions for i in range(dimensions)]
+
+
+def test_memory_store_evicts_least_recently_used_by_bytes():
+    entry_bytes = 16 * 4 + MemoryEmbeddingStore.ENTRY_OVERHEAD
+    store = MemoryEmbeddingStore(3 * entry_bytes)
+    for key in "abc":
+        store.put(key, embedding(ord(key)))
+    store.get("a")
+    store.put("d", embedding(ord("d")))
+
+    assert store.get("b") is None
+    assert [key for key in "acd" if store.get(key) is not None] == ["a", "c", "d"]
+    assert store.size_bytes == 3 * entry_bytes
+    store.put("d", embedding(0))
+    assert store.size_bytes == 3 * entry_bytes
+    assert store.get("a") == pytest.approx(embedding(ord("a")))
+
+
+def test_disk_hits_are_promoted(tmp_path):
+    disk = SQLiteEmbeddingStore(str(tmp_path / "embeddings.db"), 100)
+    EmbeddingCache(disk=disk).put_many("model", ["Some  Text"], [embedding(1)])
+    cache = EmbeddingCache(disk=disk)
+
+    assert cache.get_many("model", ["some text", "other"]) == [pytest.approx(embedding(1)), None]
+    assert len(cache.memory) == 1
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_memory_hits_do_not_wait_for_disk(tmp_path):
+    disk = SQLiteEmbeddingStore(str(tmp_path / "embeddings.db"), 100)
+    cache = EmbeddingCache(disk=disk)
+    cache.put_many("model", ["cached"], [embedding(1)])
+    results = []
+
+    with disk._lock:
+        thread = threading.Thread(target=lambda: results.append(cache.get_many("model", ["cached"])))
+        thread.start()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+    assert results == [[pytest.approx(embedding(1))]]
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import time
+
+from app import worker
+from app.jobs import JobStatus, JobStore
+
+
+def _claim_with_old_heartbeat(store: JobStore, pid: int) -> str:
+    job = store.create("ols", {"terminology_name": "T"})
+    store.claim("worker")
+    old = time.time() - 3600
+    store._connection.execute(
+        "UPDATE jobs SET worker_pid = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?", (pid, old, old, job["id"])
+    )
+    return job["id"]
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def test_jobs_of_gone_workers_are_requeued(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = _claim_with_old_heartbeat(store, _dead_pid())
+
+    assert store.requeue_stale(60) == 1
+    assert store.get(job_id)["status"] == JobStatus.QUEUED.value
+    assert store.claim("other")["id"] == job_id
+
+
+def test_jobs_of_live_workers_are_kept(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = _claim_with_old_heartbeat(store, os.getpid())
+
+    assert store.requeue_stale(60) == 0
+    assert store.get(job_id)["status"] == JobStatus.RUNNING.value
+
+
+def test_recent_heartbeats_keep_jobs(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = _claim_with_old_heartbeat(store, _dead_pid())
+    store.heartbeat(job_id)
+
+    assert store.requeue_stale(60) == 0
+    assert store.get(job_id)["status"] == JobStatus.RUNNING.value
+
+
+def test_running_jobs_send_heartbeats(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    heartbeats = []
+
+    def slow_import(progress):
+        claimed = store.get(progress.job["id"])["heartbeat_at"]
+        time.sleep(0.3)
+        heartbeats.extend([claimed, store.get(progress.job["id"])["heartbeat_at"]])
+
+    monkeypatch.setattr(worker, "_handlers", lambda: {"ols": slow_import})
+    store.create("ols", {})
+    job = store.claim("worker")
+    worker.run_job(store, job, heartbeat_interval=0.05)
+
+    assert heartbeats[1] > heartbeats[0]
+    assert store.get(job["id"])["status"] == JobStatus.COMPLETED.value
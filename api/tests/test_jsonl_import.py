@@ -0,0 +1,121 @@
+import json
+
+import pytest
+from app.cursor import export_records, iter_jsonl
+from app.models import ObjectSchema, vectorizer_registry
+from app.tasks.import_tasks import iter_jsonl_import
+from benchmarks.standins import FakeRepository, FakeVectorizer
+
+MODEL = "test-jsonl"
+TERMINOLOGY_UUID = "00000000-0000-0000-0000-000000000001"
+CONCEPT_UUID = "00000000-0000-0000-0000-000000000002"
+
+
+class CountingVectorizer(FakeVectorizer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.embedded = []
+
+    def get_embeddings(self, texts, *args, **kwargs):
+        self.embedded.extend(texts)
+        return super().get_embeddings(texts)
+
+
+@pytest.fixture
+def vectorizer():
+    vectorizer = CountingVectorizer(MODEL, 4)
+    vectorizer_registry.register(MODEL, vectorizer)
+    return vectorizer
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = FakeRepository()
+    lines = {
+        ObjectSchema.TERMINOLOGY: {"class": "Terminology", "id": TERMINOLOGY_UUID, "properties": {"name": "Test"}},
+        ObjectSchema.CONCEPT: {
+            "class": "Concept",
+            "id": CONCEPT_UUID,
+            "properties": {"conceptID": "TEST:1", "prefLabel": "test concept"},
+            "references": {"hasTerminology": TERMINOLOGY_UUID},
+        },
+    }
+    for object_type, line in lines.items():
+        list(iter_jsonl_import(repository, write_lines(tmp_path / f"{object_type.value}.jsonl", [line]), object_type))
+    return repository
+
+
+def write_lines(path, lines: list[dict]) -> str:
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    return str(path)
+
+
+def mapping(index: int, **fields) -> dict:
+    properties = {"text": f"text {index}"}
+    if fields.pop("embedder", True):
+        properties["hasSentenceEmbedder"] = MODEL
+    return {
+        "class": "Mapping",
+        "id": f"00000000-0000-0000-0001-{index:012d}",
+        "properties": properties,
+        "references": {"hasConcept": CONCEPT_UUID},
+        **fields,
+    }
+
+
+def import_mappings(repository: FakeRepository, path: str) -> dict:
+    chunks = list(iter_jsonl_import(repository, path, ObjectSchema.MAPPING))
+    return {key: sum(chunk[key] for chunk in chunks) for key in ("fetched", "embedded", "written", "failed")}
+
+
+def stored_vectors(repository: FakeRepository) -> dict[str, list[float]]:
+    mappings = repository.iter_objects("Mapping", include_vector=True)
+    return {mapping.properties["text"]: mapping.vector["default"] for mapping in mappings}
+
+
+def test_precomputed_vectors_are_not_embedded_again(repository, vectorizer, tmp_path):
+    lines = [
+        mapping(0, vector={"default": [1.0, 0.0, 0.0, 0.0]}),
+        # Written by earlier versions of the export
+        mapping(1, vectors={"default": [0.0, 1.0, 0.0, 0.0]}),
+        mapping(2),
+    ]
+
+    progress = import_mappings(repository, write_lines(tmp_path / "mappings.jsonl", lines))
+
+    assert progress == {"fetched": 3, "embedded": 1, "written": 3, "failed": 0}
+    assert vectorizer.embedded == ["text 2"]
+    vectors = stored_vectors(repository)
+    assert vectors["text 0"] == [1.0, 0.0, 0.0, 0.0]
+    assert vectors["text 1"] == [0.0, 1.0, 0.0, 0.0]
+
+
+def test_mappings_without_vector_or_model_fail(repository, vectorizer, tmp_path):
+    lines = [mapping(0, embedder=False), mapping(1)]
+
+    chunks = list(iter_jsonl_import(repository, write_lines(tmp_path / "mappings.jsonl", lines), ObjectSchema.MAPPING))
+
+    assert [chunk["written"] for chunk in chunks] == [1]
+    assert [uuid for chunk in chunks for uuid, _ in chunk["errors"]] == [lines[0]["id"]]
+    assert list(stored_vectors(repository)) == ["text 1"]
+
+
+def test_exported_mappings_import_without_embedding(repository, vectorizer, tmp_path):
+    lines = [mapping(index, vector={"default": [float(index), 0.0, 0.0, 1.0]}) for index in range(5)]
+    import_mappings(repository, write_lines(tmp_path / "mappings.jsonl", lines))
+    exported = b"".join(
+        iter_jsonl(export_records(repository.iter_objects("Mapping", include_vector=True), ObjectSchema.MAPPING))
+    )
+    records = [json.loads(line) for line in exported.splitlines()]
+    assert all("vector" in record and "vectors" not in record for record in records)
+
+    target = FakeRepository()
+    for collection in ("Terminology", "Concept"):
+        for obj in repository.iter_objects(collection):
+            references = {name: str(ref.objects[0].uuid) for name, ref in (obj.references or {}).items()}
+            target.add_object(collection, obj.properties, str(obj.uuid), references, None)
+    path = tmp_path / "export.jsonl"
+    path.write_bytes(exported)
+
+    assert import_mappings(target, str(path)) == {"fetched": 5, "embedded": 0, "written": 5, "failed": 0}
+    assert stored_vectors(target) == stored_vectors(repository)
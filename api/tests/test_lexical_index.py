@@ -0,0 +1,80 @@
+import sys
+import threading
+
+import pytest
+from app.lexical_index import LexicalIndex, LexicalIndexRegistry
+from benchmarks.standins import FakeRepository
+from datastew.repository.model import Concept, Mapping, Terminology
+
+terminology = Terminology("Test", "00000000-0000-0000-0000-000000000001")
+
+
+def concept(index: int) -> dict:
+    return {"id": f"TEST:{index}", "name": f"concept {index}", "terminology": {"id": terminology.id, "name": "Test"}}
+
+
+class ScanHookRepository(FakeRepository):
+    """Calls ``during_scan`` after the first mapping has been read by the iterator."""
+
+    during_scan = None
+
+    def iter_objects(self, collection, after=None, include_vector=False):
+        for i, obj in enumerate(super().iter_objects(collection, after, include_vector)):
+            yield obj
+            if collection == "Mapping" and i == 0 and self.during_scan is not None:
+                self.during_scan()
+
+
+@pytest.fixture
+def switch_often():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_search_during_adds(switch_often):
+    index = LexicalIndex()
+    errors = []
+    done = threading.Event()
+
+    def search():
+        try:
+            while not done.is_set():
+                index.search("blood pressure measurement", 5)
+                index.exact("blood pressure", 5)
+        except Exception as e:
+            errors.append(e)
+
+    searchers = [threading.Thread(target=search) for _ in range(2)]
+    for thread in searchers:
+        thread.start()
+    try:
+        for i in range(20_000):
+            index.add(f"blood pressure measurement {i} " + "word " * (i % 7), concept(i))
+    finally:
+        done.set()
+        for thread in searchers:
+            thread.join()
+
+    assert errors == []
+    assert len(index) == 20_000
+    assert len(index.search("blood pressure measurement 19999", 1)) == 1
+
+
+def test_mappings_added_during_build_are_kept():
+    repository = ScanHookRepository()
+    repository.store(terminology)
+    for index in range(10):
+        stored = Concept(terminology, f"concept {index}", f"TEST:{index}", f"00000000-0000-0000-0001-{index:012d}")
+        repository.store(stored)
+        repository.store(Mapping(stored, f"text {index}", [1.0, 0.0], "test"))
+    registry = LexicalIndexRegistry(["Test"])
+    repository.during_scan = lambda: (registry.add("late text", concept(99)), registry.add("text 3", concept(3)))
+
+    registry.build(repository, ["Test"])
+
+    index = registry.get("Test")
+    assert len(index) == 11
+    assert index.exact("late text", 1)[0]["concept"]["id"] == "TEST:99"
+    assert registry._building == set() and registry._added == []
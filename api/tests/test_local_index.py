@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from app.local_index import LocalIndexRegistry
+from benchmarks.standins import FakeRepository, FakeVectorizer
+from datastew.repository.model import Concept, Mapping, Terminology
+
+MODEL = "test-local"
+vectorizer = FakeVectorizer(MODEL, 8)
+terminology = Terminology("Test", "00000000-0000-0000-0000-000000000001")
+
+
+def concept(index: int) -> Concept:
+    return Concept(terminology, f"concept {index}", f"TEST:{index}", f"00000000-0000-0000-0001-{index:012d}")
+
+
+def concept_dict(concept: Concept) -> dict:
+    return {
+        "id": concept.concept_identifier,
+        "name": concept.pref_label,
+        "terminology": {"id": terminology.id, "name": terminology.name},
+    }
+
+
+class ScanHookRepository(FakeRepository):
+    """Calls ``during_scan`` after the first mapping has been read by the iterator."""
+
+    during_scan = None
+
+    def iter_objects(self, collection, after=None, include_vector=False):
+        for i, obj in enumerate(super().iter_objects(collection, after, include_vector)):
+            yield obj
+            if collection == "Mapping" and i == 0 and self.during_scan is not None:
+                self.during_scan()
+
+
+@pytest.fixture
+def repository():
+    repository = ScanHookRepository()
+    repository.store(terminology)
+    for index in range(20):
+        repository.store(concept(index))
+        repository.store(Mapping(concept(index), f"text {index}", vectorizer.embed(f"text {index}"), MODEL))
+    return repository
+
+
+@pytest.mark.parametrize("stored", [False, True])
+def test_mappings_added_during_build_are_kept(repository, tmp_path, stored):
+    registry = LocalIndexRegistry(["Test"], str(tmp_path) if stored else None)
+    late = concept(99)
+    # Written after the cursor passed its UUID, so the scan does not see it
+    repository.during_scan = lambda: registry.add(MODEL, vectorizer.embed("late text"), "late text", concept_dict(late))
+
+    registry.build(repository)
+
+    index = registry.get("Test", MODEL)
+    assert len(index) == 21
+    assert index.search(vectorizer.embed("late text"), 1)[0]["text"] == "late text"
+    assert registry._pending is None
+
+
+def test_texts_read_by_the_build_are_not_added_twice(repository):
+    registry = LocalIndexRegistry(["Test"])
+    repository.during_scan = lambda: registry.add(MODEL, vectorizer.embed("text 5"), "text 5", concept_dict(concept(5)))
+
+    registry.build(repository)
+
+    results = registry.get("Test", MODEL).search(vectorizer.embed("text 5"), 2)
+    assert [result["text"] for result in results].count("text 5") == 1
+    assert np.isclose(results[0]["similarity"], 1.0)
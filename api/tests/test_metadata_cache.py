@@ -0,0 +1,46 @@
+import threading
+
+from app.metadata_cache import MetadataCache
+
+
+def _load_racing(cache: MetadataCache, invalidate) -> tuple:
+    """Load the ``count`` key, running ``invalidate`` after the loader has read the old value."""
+    read, written = threading.Event(), threading.Event()
+    results = []
+
+    def stale_loader():
+        read.set()
+        written.wait(5)
+        return {"count": 1}
+
+    thread = threading.Thread(target=lambda: results.append(cache.get_or_load("count", stale_loader)))
+    thread.start()
+    read.wait(5)
+    invalidate()
+    written.set()
+    thread.join(5)
+    return results[0], cache.get_or_load("count", lambda: {"count": 2})
+
+
+def test_loads_racing_an_invalidation_are_not_stored():
+    cache = MetadataCache(ttl=60)
+    (racing, _), (after, _) = _load_racing(cache, lambda: cache.invalidate("count"))
+
+    assert racing == {"count": 1}
+    assert after == {"count": 2}
+
+
+def test_loads_racing_a_clear_are_not_stored():
+    cache = MetadataCache(ttl=60)
+    _, (after, _) = _load_racing(cache, cache.clear)
+
+    assert after == {"count": 2}
+
+
+def test_loaded_values_are_cached_with_an_etag():
+    cache = MetadataCache(ttl=60)
+    value, etag = cache.get_or_load("count", lambda: {"count": 1})
+
+    assert cache.get_or_load("count", lambda: {"count": 2}) == (value, etag)
+    cache.invalidate("count")
+    assert cache.get_or_load("count", lambda: {"count": 2})[0] == {"count": 2}
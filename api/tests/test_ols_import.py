@@ -0,0 +1,182 @@
+import os
+
+import httpx
+import pytest
+from app.dependencies import get_client
+from app.models import vectorizer_registry
+from app.ols import OLSTermCache
+from app.routers import imports
+from app.tasks.import_tasks import iter_ols_import
+from benchmarks.standins import FakeRepository, FakeVectorizer, LocalOLS
+from datastew.repository.model import Concept, Mapping, Terminology
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+TERMS = 95
+PAGE_SIZE = 10
+MODELS = ("test-a", "test-b")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def models():
+    for model in MODELS:
+        vectorizer_registry.register(model, FakeVectorizer(model, 8))
+
+
+@pytest.fixture
+def ols():
+    with LocalOLS(TERMS, latency=0.01, unlabeled_every=7) as ols:
+        yield ols
+
+
+class RepeatingOLS(LocalOLS):
+    """Every fifth term has the text of the term before it, which is on the same page or on the one before."""
+
+    def term(self, ontology: str, i: int) -> dict:
+        term = super().term(ontology, i)
+        previous = super().term(ontology, i - 1)
+        if i % 5 == 0 and "label" in term and "label" in previous:
+            term["description"] = previous.get("description", [previous["label"]])
+        return term
+
+
+def run_import(ols: LocalOLS, cache: OLSTermCache, model: str = MODELS[0], repository=None, name="Test", **kwargs):
+    repository = repository or FakeRepository()
+    chunks = list(iter_ols_import(repository, cache, "test", name, model, embed_batch_size=4, **kwargs))
+    return repository, chunks
+
+
+def mapped_concepts(repository: FakeRepository) -> dict[str, tuple[str, str]]:
+    """Concept ID and terminology of the concept of every mapping, by mapping text."""
+    mappings = {}
+    for mapping in repository.iter_objects("Mapping"):
+        concept = mapping.references["hasConcept"].objects[0]
+        terminology = concept.references["hasTerminology"].objects[0].properties["name"]
+        mappings.setdefault(mapping.properties["text"], []).append((concept.properties["conceptID"], terminology))
+    return mappings
+
+
+def labeled(ols: LocalOLS, start: int = 0) -> list[dict]:
+    terms = (ols.term("test", i) for i in range(start, TERMS))
+    return [term for term in terms if "label" in term]
+
+
+def test_import_writes_labeled_terms_in_page_order(ols, tmp_path):
+    cache = OLSTermCache(str(tmp_path), ols.url, PAGE_SIZE, concurrency=4)
+    repository, chunks = run_import(ols, cache, embed_workers=3)
+
+    assert sum(chunk["written"] for chunk in chunks) == len(labeled(ols))
+    assert sum(chunk["fetched"] for chunk in chunks) == TERMS
+    assert not any(chunk["failed"] for chunk in chunks)
+    pages = [chunk["page"] for chunk in chunks if chunk.get("page") is not None]
+    assert pages == sorted(pages) and pages[-1] == -(-TERMS // PAGE_SIZE)
+
+    mappings = {
+        mapping.references["hasConcept"].objects[0].properties["conceptID"]: mapping.properties["text"]
+        for mapping in repository.iter_objects("Mapping")
+    }
+    expected = {term["obo_id"]: term.get("description", [term["label"]])[0] for term in labeled(ols)}
+    assert mappings == expected
+
+
+def test_import_resumes_from_page(ols, tmp_path):
+    cache = OLSTermCache(str(tmp_path), ols.url, PAGE_SIZE, concurrency=4)
+    _, chunks = run_import(ols, cache, page=5)
+
+    assert sum(chunk["written"] for chunk in chunks) == len(labeled(ols, 5 * PAGE_SIZE))
+
+
+def test_iter_pages_yields_pages_in_order(ols, tmp_path):
+    cache = OLSTermCache(str(tmp_path), ols.url, PAGE_SIZE, concurrency=8)
+    with httpx.Client() as http:
+        info = cache.load_index(http, "test")
+        pages = list(cache.iter_pages(http, "test", info["total_pages"]))
+
+    assert [page for page, _ in pages] == list(range(info["total_pages"]))
+    assert [term["iri"] for _, terms in pages for term in terms] == [ols.term("test", i)["iri"] for i in range(TERMS)]
+
+
+def test_cached_terms_are_reused_by_other_models(ols, tmp_path):
+    cache = OLSTermCache(str(tmp_path), ols.url, PAGE_SIZE, concurrency=4)
+    run_import(ols, cache, MODELS[0])
+    requests = ols.requests
+    _, chunks = run_import(ols, cache, MODELS[1])
+
+    assert ols.requests == requests
+    assert sum(chunk["written"] for chunk in chunks) == len(labeled(ols))
+
+
+def test_refresh_downloads_terms_again(ols, tmp_path):
+    cache = OLSTermCache(str(tmp_path), ols.url, PAGE_SIZE, concurrency=4)
+    run_import(ols, cache)
+    requests = ols.requests
+    _, chunks = run_import(ols, cache, refresh=True)
+
+    assert ols.requests - requests == -(-TERMS // PAGE_SIZE)
+    assert sum(chunk["written"] for chunk in chunks) == len(labeled(ols))
+
+
+def test_import_keeps_stored_concepts_and_mappings(ols, tmp_path):
+    repository = FakeRepository()
+    prior = Terminology("Prior", "00000000-0000-0000-0000-000000000001")
+    concept = Concept(prior, "prior term", "PRIOR:1", "00000000-0000-0000-0000-000000000002")
+    overlapping = ols.term("test", 1)["description"][0]
+    repository.store(prior)
+    repository.store(concept)
+    repository.store(Mapping(concept, overlapping, [0.0] * 8, MODELS[0]))
+    cache = OLSTermCache(str(tmp_path), ols.url, PAGE_SIZE, concurrency=4)
+
+    _, chunks = run_import(ols, cache, repository=repository)
+
+    assert sum(chunk["written"] for chunk in chunks) == len(labeled(ols)) - 1
+    assert sum(chunk["skipped"] for chunk in chunks) == 1
+    assert mapped_concepts(repository)[overlapping] == [("PRIOR:1", "Prior")]
+
+    # Importing the same terms again, e.g. under another terminology name, writes nothing
+    concepts = repository.count("Concept")
+    _, chunks = run_import(ols, cache, repository=repository, name="Other")
+
+    assert sum(chunk["written"] for chunk in chunks) == 0
+    assert sum(chunk["skipped"] for chunk in chunks) == len(labeled(ols))
+    assert repository.count("Concept") == concepts
+    assert all(len(concepts) == 1 for concepts in mapped_concepts(repository).values())
+    assert all(terminology != "Other" for (_, terminology), in mapped_concepts(repository).values())
+
+
+def test_import_writes_repeated_texts_once(tmp_path):
+    with RepeatingOLS(TERMS, unlabeled_every=7) as ols:
+        cache = OLSTermCache(str(tmp_path), ols.url, PAGE_SIZE, concurrency=4)
+        repository, chunks = run_import(ols, cache)
+        texts = [term.get("description", [term["label"]])[0] for term in labeled(ols)]
+
+    written = sum(chunk["written"] for chunk in chunks)
+    assert written == len(set(texts)) < len(texts)
+    assert sum(chunk["skipped"] for chunk in chunks) == len(texts) - written
+    assert repository.count("Mapping") == written
+
+
+@pytest.mark.parametrize("terminology_id", ["", ".", "..", "../test", "a/b", "/tmp", "-x"])
+def test_cache_rejects_invalid_terminology_ids(tmp_path, terminology_id):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (tmp_path / "keep").mkdir()
+    cache = OLSTermCache(str(cache_dir))
+
+    with pytest.raises(ValueError):
+        cache.clear(terminology_id)
+    with pytest.raises(ValueError):
+        cache.load_index(httpx.Client(), terminology_id)
+    assert os.path.isdir(cache_dir) and os.path.isdir(tmp_path / "keep")
+
+
+@pytest.mark.parametrize("terminology_id", ["..", ".", "a/b", "-x"])
+def test_import_endpoint_rejects_invalid_terminology_ids(terminology_id):
+    app = FastAPI()
+    app.include_router(imports.router)
+    app.dependency_overrides[get_client] = FakeRepository
+
+    response = TestClient(app).put(
+        "/imports/terminology", params={"terminology_id": terminology_id, "model": MODELS[0]}
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import pipeline
+from app.pipeline import stream_dictionary_mappings
+
+
+class EchoBatch:
+    """Returns each description as its only mapping."""
+
+    searching = threading.Event()
+    search_seconds = 0.0
+    searches_done = 0
+
+    def __init__(self, texts, terminology_names, embedding_models, limit, mode):
+        self.texts = texts
+
+    def embed(self):
+        pass
+
+    def search(self, client):
+        EchoBatch.searching.set()
+        time.sleep(EchoBatch.search_seconds)
+        EchoBatch.searches_done += 1
+
+    def merged(self):
+        return [[{"text": text}] for text in self.texts]
+
+
+@pytest.fixture(autouse=True)
+def echo_batch(monkeypatch):
+    monkeypatch.setattr(pipeline, "SearchBatch", EchoBatch)
+    EchoBatch.searching = threading.Event()
+    EchoBatch.search_seconds = 0.0
+    EchoBatch.searches_done = 0
+
+
+def _chunks(count, size):
+    rows = [(f"v{i}", f"description {i}") for i in range(count)]
+    return iter([rows[i : i + size] for i in range(0, count, size)])
+
+
+def test_rows_are_counted_while_parsing():
+    emitted, totals = [], []
+
+    async def emit(rows, results):
+        emitted.extend((variable, mappings[0]["text"]) for (variable, _), mappings in zip(rows, results))
+
+    async def on_parsed(total):
+        totals.append(total)
+
+    asyncio.run(stream_dictionary_mappings(_chunks(10, 3), None, {"model": None}, ["t"], 1, emit, on_parsed=on_parsed))
+    assert totals == [10]
+    assert emitted == [(f"v{i}", f"description {i}") for i in range(10)]
+
+
+def test_cancelling_waits_for_running_stages():
+    EchoBatch.search_seconds = 0.3
+
+    async def emit(rows, results):
+        pass
+
+    async def run():
+        task = asyncio.create_task(stream_dictionary_mappings(_chunks(1, 1), None, {"model": None}, ["t"], 1, emit))
+        while not EchoBatch.searching.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The client may be handed to the next request now, so nothing may still be searching with it
+        assert EchoBatch.searches_done == 1
+
+    asyncio.run(run())
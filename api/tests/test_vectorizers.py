@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+from app.vectorizers import EmbeddingCoalescer, VectorizerRegistry
+from benchmarks.standins import FakeVectorizer
+
+
+class GatedVectorizer(FakeVectorizer):
+    """Records the batch sizes; the first batch is held until ``release`` is set."""
+
+    def __init__(self, model_name: str = "model", fail: bool = False):
+        super().__init__(model_name, dimensions=8)
+        self.fail = fail
+        self.batches: list[int] = []
+        self.release = threading.Event()
+
+    def get_embeddings(self, texts, *args, **kwargs):
+        if not self.batches:
+            self.release.wait(5)
+        self.batches.append(len(texts))
+        if self.fail:
+            raise RuntimeError("model server unavailable")
+        return super().get_embeddings(texts)
+
+
+def _embed_concurrently(coalescer: EmbeddingCoalescer, vectorizer: GatedVectorizer, texts: list[str]) -> list:
+    results = [None] * len(texts)
+
+    def embed(position: int):
+        try:
+            results[position] = coalescer.get_embedding(texts[position])
+        except Exception as e:
+            results[position] = e
+
+    threads = [threading.Thread(target=embed, args=(position,)) for position in range(len(texts))]
+    threads[0].start()
+    while not coalescer._busy:
+        time.sleep(0.001)
+    for thread in threads[1:]:
+        thread.start()
+    # Let the other callers queue up behind the first batch before it returns
+    while len(coalescer._pending) < len(texts) - 1:
+        time.sleep(0.001)
+    vectorizer.release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+
+def test_coalescer_batches_waiting_callers():
+    vectorizer = GatedVectorizer()
+    coalescer = EmbeddingCoalescer(vectorizer, window=0.01, max_batch=32)
+    texts = [f"text {i}" for i in range(9)]
+
+    results = _embed_concurrently(coalescer, vectorizer, texts)
+
+    assert vectorizer.batches == [1, 8]
+    assert results == [pytest.approx(vectorizer.embed(text)) for text in texts]
+    assert coalescer.get_embedding("alone") == pytest.approx(vectorizer.embed("alone"))
+    assert vectorizer.batches == [1, 8, 1]
+
+
+def test_coalescer_raises_batch_errors_in_every_caller():
+    vectorizer = GatedVectorizer(fail=True)
+    coalescer = EmbeddingCoalescer(vectorizer, window=0.01, max_batch=4)
+
+    results = _embed_concurrently(coalescer, vectorizer, [f"text {i}" for i in range(7)])
+
+    assert vectorizer.batches == [1, 4, 2]
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not coalescer._busy
+
+
+def test_registry_evicts_least_recently_used_models():
+    registry = VectorizerRegistry("http://localhost", max_size=2)
+    registry.register("a", FakeVectorizer("a"))
+    registry.register("b", FakeVectorizer("b"))
+    first = registry.get("a")
+    registry.register("c", FakeVectorizer("c"))
+
+    assert registry.loaded_models() == ["a", "c"]
+    assert registry.get("a") is first
+    registry.register("a", FakeVectorizer("a"))
+    registry.register("d", FakeVectorizer("d"))
+    assert registry.loaded_models() == ["a", "d"]
+    assert registry.get("a") is not first
@@ -0,0 +1,82 @@
+import pytest
+from app.projection import ProjectionService
+from app.routers import visualization
+from benchmarks.standins import FakeRepository, FakeVectorizer
+from datastew.repository.model import Concept, Mapping, Terminology
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+MODEL = "test-projection"
+vectorizer = FakeVectorizer(MODEL, 8)
+
+
+@pytest.fixture
+def service(tmp_path):
+    repository = FakeRepository()
+    terminology = Terminology("Test", "00000000-0000-0000-0000-000000000001")
+    repository.store(terminology)
+    for index in range(300):
+        concept = Concept(terminology, f"concept {index}", f"TEST:{index}", f"00000000-0000-0000-0001-{index:012d}")
+        repository.store(concept)
+        repository.store(Mapping(concept, f"text {index}", vectorizer.embed(f"text {index}"), MODEL))
+    service = ProjectionService(str(tmp_path), fit_sample=50, max_points=250)
+    service.rebuild(repository)
+    return service
+
+
+@pytest.fixture
+def client(service, monkeypatch):
+    monkeypatch.setattr(visualization, "projection_service", service)
+    app = FastAPI()
+    app.include_router(visualization.router)
+    return TestClient(app)
+
+
+def test_incremental_adds_stop_at_max_points(service, tmp_path):
+    projection = service.get(MODEL)
+    assert (len(projection), projection.total) == (250, 300)
+
+    service.add_many(MODEL, [vectorizer.embed("new text")] * 3, ["new text"] * 3, ["Test"] * 3)
+
+    assert (len(projection), projection.total) == (250, 303)
+    service.save()
+    reloaded = ProjectionService(str(tmp_path))
+    reloaded.load()
+    assert (len(reloaded.get(MODEL)), reloaded.get(MODEL).total) == (250, 303)
+
+
+def test_incremental_adds_fill_up_to_max_points(service):
+    service.max_points = 252
+    service.add_many(MODEL, [vectorizer.embed(f"new {i}") for i in range(5)], [f"new {i}" for i in range(5)], ["T"] * 5)
+
+    projection = service.get(MODEL)
+    assert len(projection) == len(projection.texts) == len(projection.terminology_index) == 252
+    assert projection.texts[-2:] == ["new 0", "new 1"]
+    assert projection.terminologies == ["Test", "T"]
+
+
+def test_points_are_sampled_over_the_whole_projection(client, service):
+    data = client.get("/visualization/points", params={"sample": True, "limit": 10}).json()
+
+    projection = service.get(MODEL)
+    assert (data["total"], data["mappings"]) == (250, 300)
+    assert len(data["x"]) == len(data["text"]) == len(data["terminology"]) == 10
+    assert data["text"][0] == projection.texts[0] and data["text"][-1] == projection.texts[-1]
+    index = projection.texts.index(data["text"][5])
+    assert data["x"][5] == pytest.approx(float(projection.coords[index, 0]))
+
+
+def test_points_are_paged(client, service):
+    pages = [
+        client.get("/visualization/points", params={"offset": offset, "limit": 100}).json()
+        for offset in range(0, 300, 100)
+    ]
+
+    assert [len(page["text"]) for page in pages] == [100, 100, 50]
+    assert [text for page in pages for text in page["text"]] == service.get(MODEL).texts
+
+
+def test_points_limit_is_bounded(client):
+    response = client.get("/visualization/points", params={"limit": visualization.VISUALIZATION_PLOT_POINTS + 1})
+
+    assert response.status_code == 422